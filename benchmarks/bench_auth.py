@@ -0,0 +1,66 @@
+'''
+로그인/권한 검사에 드는 시간 측정.
+
+- lookup : SessionTable.lookup (key cookie 검증) 한 번의 시간. --tokens개가 발급된 상태에서 측정
+- kdf : PasswordHasher.hash 한 번의 시간(n별)과, --threads개 thread가 동시에 hash할 때의 초당 처리 수.
+        pool의 worker 수(--kdf-workers)만큼만 동시에 계산함
+
+사용법 :
+    python bench_auth.py [--tokens 100000] [--lookups 200000] [--n 4096 16384 65536] [--threads 8] [--kdf-workers 1 4]
+'''
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+from password import PasswordHasher
+from session import SessionTable
+
+
+def bench_lookup(tokens : int, lookups : int) -> None:
+    sessions = SessionTable()
+    issued = [sessions.issue(f"user{i}", "key", 3600) for i in range(tokens)]
+    start = time.perf_counter()
+    for i in range(lookups):
+        sessions.lookup(issued[i % tokens], "key")
+    elapsed = time.perf_counter() - start
+    print(f"lookup  tokens={tokens:7d} {elapsed / lookups * 1e6:8.2f} us/lookup")
+
+
+def bench_kdf(n : int, threads : int, kdf_workers : int, rounds : int=4) -> None:
+    hasher = PasswordHasher(n=n, workers=kdf_workers)
+    start = time.perf_counter()
+    hasher.hash("password")
+    single = time.perf_counter() - start
+
+    def worker() -> None:
+        for _ in range(rounds):
+            hasher.hash("password")
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    hasher.close()
+    print(f"kdf     n={n:6d} kdf_workers={kdf_workers:2d} {single * 1e3:8.1f} ms/hash "
+          f"{threads * rounds / elapsed:8.1f} hash/s ({threads} threads)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=100000)
+    parser.add_argument("--lookups", type=int, default=200000)
+    parser.add_argument("--n", nargs="+", type=int, default=[4096, 16384, 65536])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--kdf-workers", nargs="+", type=int, default=[1, 4])
+    args = parser.parse_args()
+
+    bench_lookup(args.tokens, args.lookups)
+    for n in args.n:
+        for kdf_workers in args.kdf_workers:
+            bench_kdf(n, args.threads, kdf_workers)
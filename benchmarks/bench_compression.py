@@ -0,0 +1,63 @@
+'''
+response body 압축의 압축률과 시간 측정.
+
+- body : /metrics 형식의 텍스트, JSON, BMP(압축하지 않은 이미지), JPEG(이미 압축됨)
+- coding/level별 압축 시간(ms)과 압축 후 크기 비율
+- static : Compressor가 ETag별로 cache한 body를 다시 요청할 때의 시간 (us)
+
+사용법 :
+    python bench_compression.py [--rounds 20]
+'''
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+from content_encoding import Compressor, compress, CODINGS, DYNAMIC_LEVELS, STATIC_LEVELS
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server")
+
+
+def sample_bodies() -> dict:
+    metrics = "".join(f'http_request_duration_seconds_bucket{{route="/images",le="{le}"}} {i}\n'
+                      for i in range(40) for le in (0.001, 0.01, 0.1, 1.0))
+    users = json.dumps({f"user{i}" : {"password" : "scrypt$16384$8$1$" + "A" * 44, "key" : {"value" : "0"}}
+                        for i in range(200)})
+    bmp = b"BM" + bytes(range(256)) * 4096 # 단순한 pattern의 비압축 이미지
+    with open(os.path.join(SERVER_DIR, "image.jpg"), "rb") as f:
+        jpeg = f.read()
+    return {"metrics" : metrics.encode(), "json" : users.encode(), "bmp" : bmp, "jpeg" : jpeg}
+
+
+def bench_coding(name : str, data : bytes, coding : str, level : int, rounds : int) -> None:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        encoded = compress(data, coding, level)
+    elapsed = (time.perf_counter() - start) / rounds
+    print(f"{name:>8s} {len(data):9d} {coding:>8s} {level:3d} {elapsed * 1e3:9.2f} ms {len(encoded) / len(data):7.1%}")
+
+
+def bench_static(data : bytes, lookups : int=100000) -> None:
+    compressor = Compressor()
+    coding = compressor.choose("gzip, deflate, br, zstd", len(data))
+    compressor.encode(coding, data, '"bench"')
+    start = time.perf_counter()
+    for _ in range(lookups):
+        compressor.encode(coding, data, '"bench"')
+    print(f"static cache hit ({coding}) {(time.perf_counter() - start) / lookups * 1e6:.2f} us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    bodies = sample_bodies()
+    print(f"{'body':>8s} {'bytes':>9s} {'coding':>8s} {'lvl':>3s} {'time':>12s} {'ratio':>7s}")
+    for (name, data) in bodies.items():
+        for coding in CODINGS:
+            for level in sorted({DYNAMIC_LEVELS[coding], STATIC_LEVELS[coding]}):
+                bench_coding(name, data, coding, level, args.rounds)
+    bench_static(bodies["bmp"])
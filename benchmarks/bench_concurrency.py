@@ -0,0 +1,120 @@
+'''
+server.py의 concurrency mode(thread/process/asyncio/prefork)별 처리량 측정.
+
+임시 디렉터리에서 server.py를 실행한 뒤, 여러 client thread가 keep-alive 연결로
+POST /login을 반복 전송하고 requests/sec을 출력함.
+client마다 think time을 두어 느린 client(keep-alive로 연결을 잡고 있는 client)를 흉내냄.
+prefork mode의 --workers는 worker process 수 (process마다 thread는 server.py 기본값).
+
+사용법 :
+    python bench_concurrency.py [--modes thread process asyncio prefork] [--clients 32] [--duration 5] [--think 0.01]
+                                [--workers 1 2 4 8 16]
+'''
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+SERVER_PY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server", "server.py")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workdir : str, port : int, args : list, server : str=SERVER_PY) -> subprocess.Popen:
+    '''
+    workdir에서 server.py를 실행하고 port가 열릴 때까지 대기'''
+    proc = subprocess.Popen([sys.executable, server, str(port)] + args, cwd=workdir,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.05)
+    stop_server(proc)
+    raise RuntimeError("server did not start")
+
+
+def stop_server(proc : subprocess.Popen) -> None:
+    '''
+    server와 worker process(process mode)를 process group 단위로 종료'''
+    proc.kill()
+    proc.wait()
+    while True: # kill 도중 fork된 worker가 남지 않도록 group이 빌 때까지 반복
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            break
+        time.sleep(0.05)
+
+
+def login_request() -> bytes:
+    body = json.dumps({"username": "bench", "password": "bench"})
+    return ("POST /login HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n{body}").encode()
+
+
+def client_loop(port : int, stop : threading.Event, think : float, counts : list, idx : int) -> None:
+    request = login_request()
+    sock = socket.create_connection(("127.0.0.1", port))
+    try:
+        while not stop.is_set():
+            sock.sendall(request)
+            if not sock.recv(4096):
+                break
+            counts[idx] += 1
+            if think:
+                time.sleep(think)
+    except OSError:
+        pass
+    finally:
+        sock.close()
+
+
+def run(mode : str, workers : int, clients : int, duration : float, think : float) -> float:
+    with tempfile.TemporaryDirectory() as workdir:
+        with open(os.path.join(workdir, "users.json"), "w") as f:
+            json.dump({"bench": {"pw": "bench", "key": {"value": "0", "expiry_time": 0}}}, f)
+        port = free_port()
+        proc = start_server(workdir, port, ["--mode", mode, "--workers", str(workers),
+                                            "--max-connections", str(clients), "--no-rate-limit"])
+        try:
+            stop = threading.Event()
+            counts = [0] * clients
+            threads = [threading.Thread(target=client_loop, args=(port, stop, think, counts, i), daemon=True)
+                       for i in range(clients)]
+            for t in threads:
+                t.start()
+            time.sleep(duration)
+            stop.set()
+            total = sum(counts)
+        finally:
+            stop_server(proc)
+    return total / duration
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modes", nargs="+", default=["thread", "process", "asyncio", "prefork"])
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 2, 4, 8, 16])
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--think", type=float, default=0.01)
+    args = parser.parse_args()
+
+    print(f"clients={args.clients} duration={args.duration}s think={args.think}s")
+    for mode in args.modes:
+        for workers in args.workers:
+            rps = run(mode, workers, args.clients, args.duration, args.think)
+            print(f"{mode:8s} workers={workers:3d} {rps:10.1f} req/s")
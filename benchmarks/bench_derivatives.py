@@ -0,0 +1,70 @@
+'''
+DerivativeCache의 변환/조회 시간 측정 (pillow 필요).
+
+- cold : cache에 없는 variant를 변환하여 저장하는 시간 (render process pool 사용)
+- warm : 이미 변환한 variant를 조회하는 시간
+- stampede : --threads개 thread가 같은 새 variant를 동시에 요청했을 때 걸린 시간과 저장된 파일 수.
+             한 번만 변환하므로 파일 수는 1, 시간은 cold 한 번과 비슷해야 함
+
+사용법 :
+    python bench_derivatives.py [--source ../server/image.jpg] [--sizes 64 320 1024] [--fmt jpeg webp] [--threads 16]
+'''
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+from derivatives import DerivativeCache, Variant, DEFAULT_QUALITY, PILLOW_AVAILABLE
+
+
+def bench_variant(cache : DerivativeCache, source : str, size : int, fmt : str, lookups : int=10000) -> None:
+    variant = Variant(size, size, fmt, DEFAULT_QUALITY)
+    start = time.perf_counter()
+    path = cache.get(source, '"bench"', variant)
+    cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(lookups):
+        cache.get(source, '"bench"', variant)
+    warm = (time.perf_counter() - start) / lookups
+    print(f"{fmt:>5s} {size:5d}px {cold * 1e3:9.1f} ms cold {warm * 1e6:8.2f} us warm {os.path.getsize(path):9d} bytes")
+
+
+def bench_stampede(cache : DerivativeCache, source : str, threads : int) -> None:
+    variant = Variant(200, 200, "jpeg", DEFAULT_QUALITY - 1) # 아직 변환하지 않은 variant
+    before = len(os.listdir(cache.directory))
+    pool = [threading.Thread(target=cache.get, args=(source, '"bench"', variant)) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    rendered = len(os.listdir(cache.directory)) - before
+    print(f"stampede threads={threads:3d} {elapsed * 1e3:9.1f} ms rendered={rendered}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--source", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server", "image.jpg"))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[64, 320, 1024])
+    parser.add_argument("--fmt", nargs="+", default=["jpeg", "webp"])
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args()
+
+    if not PILLOW_AVAILABLE:
+        sys.exit("pillow가 필요합니다: pip install pillow")
+    directory = tempfile.mkdtemp(prefix="bench-derivatives-")
+    cache = DerivativeCache(directory)
+    try:
+        for fmt in args.fmt:
+            for size in args.sizes:
+                bench_variant(cache, args.source, size, fmt)
+        bench_stampede(cache, args.source, args.threads)
+    finally:
+        cache.close()
+        shutil.rmtree(directory)
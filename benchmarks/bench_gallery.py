@@ -0,0 +1,71 @@
+'''
+갤러리 미리 받기(Client.download_images) 시간 측정 : 이미지마다 GET /images와 POST /images/batch bundle 비교.
+
+임시 디렉터리에 server/image.jpg를 --images개 복사하고 server.py를 실행한 뒤,
+매번 비어 있는 web_cash로 전체 이미지를 받는 시간과 초당 이미지 수를 출력함.
+- get x N : 이미지마다 조건부 GET을 N개의 연결로 동시에 보냄
+- bundle x N : 최대 64개씩 묶은 bundle을 N개의 연결로 동시에 받음
+
+사용법 :
+    python bench_gallery.py [--images 500] [--concurrency 1 8] [--mode thread]
+'''
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from bench_concurrency import free_port, start_server, stop_server
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "client"))
+from client import Client
+from web_cache import WebCache
+
+IMAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server", "image.jpg")
+
+
+def measure(client : Client, urls : list, concurrency : int, bundle : bool, workdir : str) -> tuple:
+    '''
+    return : (걸린 시간, download_images 결과)'''
+    directory = tempfile.mkdtemp(prefix="web_cash-", dir=workdir)
+    client.web_cache = WebCache(directory)
+    start = time.perf_counter()
+    result = client.download_images(urls, concurrency=concurrency, bundle=bundle)
+    elapsed = time.perf_counter() - start
+    shutil.rmtree(directory)
+    return (elapsed, result)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--mode", default="thread")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-gallery-")
+    urls = [f"gallery_{i}.jpg" for i in range(args.images)]
+    for url in urls:
+        shutil.copyfile(IMAGE, os.path.join(workdir, url))
+    port = free_port()
+    proc = start_server(workdir, port, ["--mode", args.mode, "--quiet", "--no-rate-limit"])
+    os.chdir(workdir) # cookies.json
+    try:
+        with contextlib.redirect_stdout(io.StringIO()): # Client의 안내 메세지
+            client = Client("127.0.0.1", port, web_cache=WebCache(os.path.join(workdir, "web_cash")))
+            client.register("bench", "bench")
+            client.login("bench", "bench")
+            client.upgrade_privilege()
+        print(f"{'':>12s} {'seconds':>8s} {'images/s':>9s} {'downloaded':>10s}")
+        for bundle in (False, True):
+            for concurrency in args.concurrency:
+                (elapsed, result) = measure(client, urls, concurrency, bundle, workdir)
+                name = f"{'bundle' if bundle else 'get'} x {concurrency}"
+                print(f"{name:>12s} {elapsed:8.3f} {len(urls) / elapsed:9.1f} {result['downloaded']:10d}")
+        client.pool.close()
+    finally:
+        stop_server(proc)
+        shutil.rmtree(workdir)
@@ -0,0 +1,102 @@
+'''
+GET /images 전송 속도(MB/s)와 server peak RSS 측정.
+
+임시 디렉터리에 --size MB짜리 이미지를 만들고 server.py를 실행한 뒤,
+--clients개의 client가 keep-alive 연결로 --downloads번씩 동시에 다운로드함.
+server의 peak RSS는 /proc/<pid>/status의 VmHWM으로 측정 (Linux).
+
+--server로 다른 버전의 server.py를 지정하면 변경 전/후를 비교할 수 있음.
+
+사용법 :
+    python bench_images.py [--size 20] [--clients 8] [--downloads 10] [--mode thread] [--server ../server/server.py]
+'''
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+from bench_concurrency import SERVER_PY, free_port, start_server, stop_server
+
+
+def image_request(url : str) -> bytes:
+    body = json.dumps({"url": url})
+    return (f"GET /images HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: image/jpg\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n{body}").encode()
+
+
+def read_response(sock, buffer : memoryview) -> int:
+    '''
+    header를 읽고 Content-Length만큼 body를 buffer에 받음. return : body 크기'''
+    head = b""
+    while b"\r\n\r\n" not in head:
+        chunk = sock.recv(4096)
+        if not chunk:
+            raise ConnectionError("closed")
+        head += chunk
+    head, rest = head.split(b"\r\n\r\n", 1)
+    length = 0
+    for line in head.split(b"\r\n"):
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":", 1)[1])
+    received = len(rest)
+    while received < length:
+        received += sock.recv_into(buffer[:length - received])
+    return length
+
+
+def client_loop(port : int, url : str, downloads : int, totals : list, idx : int, size : int) -> None:
+    import socket
+    request = image_request(url)
+    buffer = memoryview(bytearray(size + 4096))
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        for _ in range(downloads):
+            sock.sendall(request)
+            totals[idx] += read_response(sock, buffer)
+
+
+def peak_rss_mb(pid : int) -> float:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=float, default=20.0, help="image size in MB")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--downloads", type=int, default=10)
+    parser.add_argument("--server", default=SERVER_PY)
+    parser.add_argument("--mode", choices=["thread", "process", "asyncio"], default="thread")
+    args = parser.parse_args()
+
+    size = int(args.size * 1024 * 1024)
+    with tempfile.TemporaryDirectory() as workdir:
+        with open(os.path.join(workdir, "users.json"), "w") as f:
+            f.write("{}")
+        with open(os.path.join(workdir, "bench.jpg"), "wb") as f:
+            f.write(os.urandom(size))
+
+        port = free_port()
+        proc = start_server(workdir, port, ["--mode", args.mode], args.server)
+        try:
+            totals = [0] * args.clients
+            threads = [threading.Thread(target=client_loop, args=(port, "bench.jpg", args.downloads, totals, i, size))
+                       for i in range(args.clients)]
+            start = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - start
+            rss = peak_rss_mb(proc.pid)
+        finally:
+            stop_server(proc)
+
+    mb = sum(totals) / (1024 * 1024)
+    print(f"server={args.server}")
+    print(f"mode={args.mode} image={args.size}MB clients={args.clients} downloads={args.downloads}")
+    print(f"{mb / elapsed:10.1f} MB/s, server peak RSS {rss:.1f} MB")
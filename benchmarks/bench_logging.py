@@ -0,0 +1,105 @@
+'''
+request 하나를 처리할 때 로그 기록에 드는 시간(요청 thread 기준 latency) 측정.
+
+- legacy : 이전 Server.log_message 방식. request마다 raw request 전체를 포함한 메세지를
+           open/append/close하고 print (요청 thread에서 동기 처리)
+- writer : LogWriter (INFO level, 요청 요약 한 줄만 대기열에 추가, 쓰기는 background thread)
+- writer-debug : LogWriter (DEBUG level, raw request도 대기열에 추가, --sample 비율)
+
+client_handler/request_handler가 request 하나에 남기는 로그(accept, request, 연결 종료)를 흉내 냄.
+--threads개 thread가 동시에 기록하며, print 출력은 --stdout 파일(기본 /dev/null)로 보냄.
+출력 : request당 로그 시간 평균, p50, p99 (us)
+
+사용법 :
+    python bench_logging.py [--requests 20000] [--threads 1 8] [--sample 0.01] [--stdout /dev/null]
+'''
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+from http_parser import RequestParser
+from log_writer import LogWriter, DEBUG, INFO
+
+
+def make_request():
+    body = json.dumps({"username": "bench", "password": "bench"})
+    raw = ("POST /login HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\n"
+           f"Content-Length: {len(body.encode())}\r\n\r\n{body}").encode()
+    return RequestParser().feed(raw)[0]
+
+
+def legacy_log(path : str):
+    def log_message(message):
+        timestamp = datetime.now().strftime("[%Y-%m-%d %H:%M:%S]")
+        log_entry = f"{timestamp} {message}\n"
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(log_entry)
+        print(message)
+
+    def handle(request):
+        log_message("[127.0.0.1] is accept.")
+        log_message(request)
+        log_message("[127.0.0.1] 연결 종료.")
+    return handle
+
+
+def writer_log(writer : LogWriter):
+    def handle(request):
+        writer.log("[127.0.0.1] is accept.")
+        writer.log(f"{request.method} {request.path}")
+        writer.log(request, DEBUG)
+        writer.log("[127.0.0.1] 연결 종료.")
+    return handle
+
+
+def run(handle, request, requests : int, threads : int) -> list:
+    latencies = [[] for _ in range(threads)]
+
+    def worker(idx : int) -> None:
+        samples = latencies[idx]
+        for _ in range(requests // threads):
+            start = time.perf_counter()
+            handle(request)
+            samples.append(time.perf_counter() - start)
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return sorted(x for samples in latencies for x in samples)
+
+
+def report(name : str, threads : int, latencies : list) -> None:
+    mean = sum(latencies) / len(latencies)
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[int(len(latencies) * 0.99)]
+    print(f"{name:>13s} {threads:8d} {mean * 1e6:10.1f} {p50 * 1e6:10.1f} {p99 * 1e6:10.1f}", file=sys.__stdout__)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--threads", nargs="+", type=int, default=[1, 8])
+    parser.add_argument("--sample", type=float, default=0.01)
+    parser.add_argument("--stdout", default=os.devnull)
+    args = parser.parse_args()
+
+    request = make_request()
+    sys.stdout = open(args.stdout, "w")
+    print(f"{'method':>13s} {'threads':>8s} {'mean us':>10s} {'p50 us':>10s} {'p99 us':>10s}", file=sys.__stdout__)
+    with tempfile.TemporaryDirectory() as workdir:
+        for threads in args.threads:
+            report("legacy", threads, run(legacy_log(os.path.join(workdir, "legacy.txt")), request, args.requests, threads))
+
+            for (name, level) in (("writer", INFO), ("writer-debug", DEBUG)):
+                writer = LogWriter(os.path.join(workdir, f"{name}.txt"), level=level, sample_rate=args.sample)
+                latencies = run(writer_log(writer), request, args.requests, threads)
+                writer.close()
+                report(name, threads, latencies)
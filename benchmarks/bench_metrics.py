@@ -0,0 +1,91 @@
+'''
+/metrics 지표 수집이 request 처리 시간에 더하는 overhead 측정.
+
+Server.request_handler로 POST /login과 GET /images(작은 이미지)를 반복 처리하여
+- metrics : Metrics 기록 포함 (기본 동작)
+- off : Metrics의 기록 method를 아무 것도 하지 않는 객체로 바꾼 경우
+의 request당 시간(us)을 비교하고, 마지막에 /metrics 출력 하나를 만드는 시간을 출력함.
+
+사용법 :
+    python bench_metrics.py [--requests 50000] [--threads 1 4]
+'''
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+from catalog import ImageCatalog
+from http_parser import RequestParser
+from log_writer import LogWriter, ERROR
+from rate_limit import AdmissionControl
+from server import Server
+from user_store import JsonUserStore
+
+
+class NullMetrics:
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+def make_requests(image : str) -> list:
+    login = json.dumps({"username": "bench", "password": "bench"})
+    url = json.dumps({"url": image})
+    raw = ("POST /login HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\n"
+           f"Content-Length: {len(login)}\r\n\r\n{login}"
+           "GET /images HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\n"
+           f"Content-Length: {len(url)}\r\n\r\n{url}").encode()
+    return RequestParser().feed(raw)
+
+
+def run(server : Server, requests : list, count : int, threads : int) -> float:
+    def worker() -> None:
+        for i in range(count // threads):
+            server.request_handler(requests[i % len(requests)])
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return (time.perf_counter() - start) / count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=50000)
+    parser.add_argument("--threads", nargs="+", type=int, default=[1, 4])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        image = os.path.join(workdir, "bench.png")
+        with open(image, "wb") as f:
+            f.write(b"\x89PNG\r\n\x1a\n" + os.urandom(4096))
+        users = JsonUserStore(os.path.join(workdir, "users.json"))
+        users.create("bench", {"pw": "bench", "key": {"value": "0", "expiry_time": 0}})
+        logger = LogWriter(os.path.join(workdir, "log.txt"), level=ERROR, echo=False)
+        requests = make_requests(os.path.basename(image)) # catalog 이름 (workdir 기준)
+        catalog = ImageCatalog(workdir)
+
+        print(f"{'threads':>8s} {'off us':>10s} {'metrics us':>11s} {'overhead':>9s}")
+        for threads in args.threads:
+            server = Server(users=users, logger=logger, catalog=catalog, admission=AdmissionControl.disabled())
+            with_metrics = run(server, requests, args.requests, threads)
+
+            bare = Server(users=users, logger=logger, metrics=NullMetrics(), catalog=catalog,
+                          admission=AdmissionControl.disabled())
+            bare.users = users # TimedStore 없이
+            without = run(bare, requests, args.requests, threads)
+            print(f"{threads:8d} {without * 1e6:10.2f} {with_metrics * 1e6:11.2f} {(with_metrics / without - 1) * 100:8.1f}%")
+            bare.close()
+
+        start = time.perf_counter()
+        text = server.metrics.render()
+        print(f"/metrics render: {(time.perf_counter() - start) * 1000:.2f} ms, {len(text)} bytes")
+        server.close()
+        logger.close()
+        users.close()
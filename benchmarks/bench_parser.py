@@ -0,0 +1,78 @@
+'''
+server/http_parser.py의 RequestParser 처리량(requests/sec) 측정.
+
+- single : recv 한 번에 request 하나
+- pipelined : recv 한 번에 request 여러 개 (--pipeline 개)
+- fragmented : request 하나를 --fragment 바이트씩 나누어 feed
+- legacy : 이전 request_handler 방식(decode 후 "\\r\\n"으로 split, 마지막 줄을 body로 사용)
+
+사용법 :
+    python bench_parser.py [--count 200000] [--pipeline 16] [--fragment 64]
+'''
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+from http_parser import RequestParser
+
+
+def make_request() -> bytes:
+    body = json.dumps({"username": "bench", "password": "bench"})
+    return ("POST /login HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body.encode())}\r\n\r\n{body}").encode()
+
+
+def bench_single(request : bytes, count : int) -> float:
+    parser = RequestParser()
+    start = time.perf_counter()
+    for _ in range(count):
+        parser.feed(request)
+    return count / (time.perf_counter() - start)
+
+
+def bench_pipelined(request : bytes, count : int, pipeline : int) -> float:
+    parser = RequestParser()
+    batch = request * pipeline
+    rounds = count // pipeline
+    start = time.perf_counter()
+    for _ in range(rounds):
+        parser.feed(batch)
+    return rounds * pipeline / (time.perf_counter() - start)
+
+
+def bench_fragmented(request : bytes, count : int, fragment : int) -> float:
+    parser = RequestParser()
+    view = memoryview(request)
+    pieces = [view[i:i + fragment] for i in range(0, len(request), fragment)]
+    start = time.perf_counter()
+    for _ in range(count):
+        for piece in pieces:
+            parser.feed(piece)
+    return count / (time.perf_counter() - start)
+
+
+def bench_legacy(request : bytes, count : int) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        lines = request.decode().split("\r\n")
+        method, path, _ = lines[0].split(" ")
+        body = lines[-1]
+    return count / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=200000)
+    parser.add_argument("--pipeline", type=int, default=16)
+    parser.add_argument("--fragment", type=int, default=64)
+    args = parser.parse_args()
+
+    request = make_request()
+    print(f"request size={len(request)} bytes, count={args.count}")
+    print(f"legacy     {bench_legacy(request, args.count):12.0f} req/s (no framing)")
+    print(f"single     {bench_single(request, args.count):12.0f} req/s")
+    print(f"pipelined  {bench_pipelined(request, args.count, args.pipeline):12.0f} req/s (x{args.pipeline} per feed)")
+    print(f"fragmented {bench_fragmented(request, args.count, args.fragment):12.0f} req/s ({args.fragment} bytes per feed)")
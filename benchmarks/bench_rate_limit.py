@@ -0,0 +1,68 @@
+'''
+rate_limit.TokenBuckets 조회 시간과 과부하에서의 공정성 측정.
+
+- cost : key(IP) 수(--keys)를 늘려도 acquire 한 번의 시간이 일정한 지(O(1)),
+         가득 찬 bucket이 lazy expiry로 지워져 table이 key 수만큼만 커지는 지 확인함
+- fairness : client 하나가 허용량의 --flood배를 보내는 동안 다른 client들(허용량의 절반)이 거절되지 않는 지 확인.
+             시간은 가상으로 진행하므로 측정이 실제 시간에 의존하지 않음
+
+사용법 :
+    python bench_rate_limit.py [--keys 1 1000 100000] [--acquires 200000] [--flood 20]
+'''
+import argparse
+import os
+import random
+import sys
+import time
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+import rate_limit
+from rate_limit import TokenBuckets, IP_RATE, IP_BURST
+
+
+def measure(keys : int, acquires : int) -> tuple:
+    '''
+    return : (acquire 한 번의 시간(초), 측정 후 table 크기)'''
+    buckets = TokenBuckets(IP_RATE, IP_BURST, max_keys=max(keys, 1))
+    addresses = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(keys)]
+    order = [random.choice(addresses) for _ in range(acquires)]
+    start = time.perf_counter()
+    for address in order:
+        buckets.acquire(address)
+    return ((time.perf_counter() - start) / acquires, len(buckets))
+
+
+def fairness(flood : int, clients : int=10, seconds : int=10, rate : float=IP_RATE) -> tuple:
+    '''
+    return : (flood client가 허용된 비율, 다른 client들이 허용된 비율)'''
+    clock = [0.0]
+    buckets = TokenBuckets(rate, IP_BURST)
+    (sent, allowed) = ([0, 0], [0, 0])
+    step = 1 / (rate * flood)
+    with mock.patch.object(rate_limit.time, "monotonic", lambda: clock[0]):
+        while clock[0] < seconds:
+            for i in range(clients + 1):
+                if i and random.random() > 1 / (2 * flood): # 다른 client : 초당 rate / 2
+                    continue
+                key = "flood" if i == 0 else f"client{i}"
+                sent[i > 0] += 1
+                allowed[i > 0] += buckets.acquire(key) == 0
+            clock[0] += step
+    return (allowed[0] / sent[0], allowed[1] / sent[1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keys", type=int, nargs="+", default=[1, 1000, 100000])
+    parser.add_argument("--acquires", type=int, default=200000)
+    parser.add_argument("--flood", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'keys':>8s} {'us/acquire':>11s} {'table':>8s}")
+    for keys in args.keys:
+        (seconds, size) = measure(keys, args.acquires)
+        print(f"{keys:8d} {seconds * 1e6:11.3f} {size:8d}")
+
+    (flooder, others) = fairness(args.flood)
+    print(f"flood x{args.flood}: flood client allowed {flooder * 100:.1f}%, other clients allowed {others * 100:.1f}%")
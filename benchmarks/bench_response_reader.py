@@ -0,0 +1,129 @@
+'''
+client의 binary response 읽기 비교 (multi-MB 이미지).
+
+- legacy : 이전 Client._response_handler 방식 (bytes += chunk, 4096보다 짧은 chunk가 오면 종료)
+- concat : legacy와 같이 bytes += chunk로 모으되 Content-Length까지 읽음 (잘림 없이 복사 비용만 비교)
+- reader : response_reader.read_response (Content-Length framing, recv_into)
+- sink : read_response(sink=파일)로 디스크에 바로 기록
+
+loopback으로 --sizes MB 크기의 response를 받아 시간, 받은 바이트 수, tracemalloc peak 메모리를 출력함.
+--slow를 주면 서버가 작은 조각으로 나누어 천천히 보냄 (느린 링크 흉내).
+
+사용법 :
+    python bench_response_reader.py [--sizes 1 4 16] [--slow]
+'''
+import argparse
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "client"))
+from response_reader import read_response
+
+
+class BenchSocket(socket.socket):
+    '''
+    read_response가 남은 data를 저장할 수 있는 socket'''
+    buffered = b""
+
+
+def serve_once(listener : socket.socket, payload : bytes, slow : bool) -> None:
+    conn, _ = listener.accept()
+    with conn:
+        try:
+            send_payload(conn, payload, slow)
+        except OSError: # legacy가 중간에 읽기를 멈추고 연결을 닫은 경우
+            pass
+
+
+def send_payload(conn : socket.socket, payload : bytes, slow : bool) -> None:
+    conn.sendall(f"HTTP/1.1 200 OK\r\nContent-Type: image/jpg\r\nContent-Length: {len(payload)}\r\n\r\n".encode())
+    if slow:
+        view = memoryview(payload)
+        for i in range(0, len(view), 1000):
+            conn.sendall(view[i:i + 1000])
+            if i % 100000 == 0:
+                time.sleep(0.001)
+    else:
+        conn.sendall(payload)
+    conn.recv(1) # client가 닫을 때까지 대기
+
+
+def legacy_read(conn : socket.socket) -> int:
+    _b_response = b""
+    while True:
+        chunk = conn.recv(4 * 1024)
+        if not chunk:
+            break
+        _b_response += chunk
+        if b"\r\n\r\n" in _b_response:
+            (header, image_data) = _b_response.split(b"\r\n\r\n", 1)
+            break
+    while True:
+        chunk = conn.recv(4096)
+        if not chunk:
+            break
+        image_data += chunk
+        if len(chunk) < 4096:
+            break
+    return len(image_data)
+
+
+def concat_read(conn : socket.socket) -> int:
+    data = b""
+    while b"\r\n\r\n" not in data:
+        data += conn.recv(4096)
+    (header, image_data) = data.split(b"\r\n\r\n", 1)
+    length = int(header.lower().split(b"content-length:", 1)[1].split(b"\r\n", 1)[0])
+    while len(image_data) < length:
+        image_data += conn.recv(4096)
+    return len(image_data)
+
+
+def reader_read(conn : socket.socket) -> int:
+    return len(read_response(conn).body)
+
+
+def sink_read(conn : socket.socket) -> int:
+    with tempfile.TemporaryFile() as f:
+        read_response(conn, sink=f)
+        return f.tell()
+
+
+def run(method, payload : bytes, slow : bool) -> tuple:
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(1)
+    server = threading.Thread(target=serve_once, args=(listener, payload, slow))
+    server.start()
+
+    conn = BenchSocket(socket.AF_INET, socket.SOCK_STREAM)
+    conn.connect(listener.getsockname())
+    tracemalloc.start()
+    start = time.perf_counter()
+    received = method(conn)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    conn.close()
+    server.join()
+    listener.close()
+    return (elapsed, received, peak)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", nargs="+", type=float, default=[1, 4, 16]) # concat은 크기의 제곱에 비례하여 64MB에서는 수 분이 걸림
+    parser.add_argument("--slow", action="store_true")
+    args = parser.parse_args()
+
+    print(f"{'size MB':>8s} {'method':>8s} {'time s':>8s} {'received':>10s} {'peak MB':>8s}")
+    for size in args.sizes:
+        payload = os.urandom(int(size * 1024 * 1024))
+        for name, method in (("legacy", legacy_read), ("concat", concat_read), ("reader", reader_read), ("sink", sink_read)):
+            (elapsed, received, peak) = run(method, payload, args.slow)
+            print(f"{size:8.0f} {name:>8s} {elapsed:8.3f} {received:10d} {peak / 1024 / 1024:8.1f}")
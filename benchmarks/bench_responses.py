@@ -0,0 +1,186 @@
+'''
+response를 만들어 보내는 처리량(responses/sec) 측정.
+
+loopback TCP 연결 하나로 response를 반복해서 보내고, 다른 process(client)가 받아서 버림.
+보내는 process의 CPU 시간(user + sys)으로 CPU 1초당 response 수를 계산함 (다른 process의 영향을 덜 받도록).
+legacy와 fast를 번갈아 --repeat번 측정하여 가장 좋은 값을 출력.
+- legacy : 이전 Server의 방식. response를 str list로 만들어 join, encode하고 header와 body를 sendall 두 번으로 보냄 (Date header 없음)
+- fast : Server._create_response_str/_create_response_byte(header 없는 응답은 미리 직렬화한 bytes)와
+         Server._send_response(작은 body는 header에 이어붙여, 큰 body는 sendmsg로 send 한 번)
+
+case :
+- static : header 없는 짧은 응답 ("200 OK" + "LOGIN_SUCCESS")
+- headers : Set-Cookie header가 있는 응답 (로그인 성공)
+- image : cache된 작은 이미지 (--image-size bytes body)
+- route : Server.request_handler(router, middleware 포함)로 HEAD /images(key 없음 -> 401)를 처리해서 보냄 (fast만)
+- download : Server.request_handler로 GET /images(cache된 --image-size bytes 이미지)를 처리해서 보냄 (fast만. 권한 확인은 생략)
+
+사용법 :
+    python bench_responses.py [--responses 50000] [--image-size 16384] [--repeat 5]
+'''
+import argparse
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import tempfile
+import time
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+from catalog import ImageCatalog
+from file_cache import FileBody, BundleBody
+from http_parser import RequestParser
+from log_writer import LogWriter, ERROR
+from rate_limit import AdmissionControl
+from server import Server
+from user_store import JsonUserStore
+
+COOKIES = ["Set-Cookie: session=0123456789abcdef0123456789abcdef; HttpOnly; SameSite=Strict; Path=/",
+           "Set-Cookie: key=fedcba9876543210fedcba9876543210; HttpOnly; SameSite=Strict; Path=/"]
+IMAGE_HEADERS = ["Content-Type: image/png", 'Content-Disposition: attachment; filename="bench.png"',
+                 "Accept-Ranges: bytes", 'ETag: "0123456789abcdef0123456789abcdef"',
+                 "Last-Modified: Thu, 01 Jan 2026 00:00:00 GMT", "Cache-Control: max-age=60"]
+
+
+def legacy_response(status : str, headers : list=None, body : str=None) -> tuple:
+    '''
+    이전 Server._create_response_str'''
+    response = [f"HTTP/1.1 {status}"]
+    if headers:
+        response.extend(headers)
+    if body:
+        response.append(f"Content-Length: {len(body.encode())}")
+        response.append("")
+        response.append(body)
+    return ("\r\n".join(response), None)
+
+
+def legacy_response_byte(status : str, headers : list, body : bytes) -> tuple:
+    '''
+    이전 Server._create_response_byte'''
+    response = [f"HTTP/1.1 {status}"]
+    response.extend(headers)
+    response.append(f"Content-Length: {len(body)}")
+    response.append("\r\n")
+    return ("\r\n".join(response), body)
+
+
+def legacy_send(client_socket : socket.socket, response : str, bin_file) -> None:
+    '''
+    이전 Server._send_response'''
+    if isinstance(bin_file, FileBody):
+        try:
+            client_socket.sendall(response.encode())
+            client_socket.sendfile(bin_file.file, bin_file.offset, bin_file.length)
+        finally:
+            bin_file.close()
+    elif isinstance(bin_file, BundleBody):
+        client_socket.sendall(response.encode())
+        for part in bin_file:
+            client_socket.sendall(part)
+    elif bin_file is not None:
+        client_socket.sendall(response.encode())
+        client_socket.sendall(bin_file)
+    else:
+        client_socket.sendall(response.encode())
+
+
+def connection_pair() -> tuple:
+    '''
+    return : (보내는 socket (서버처럼 TCP_NODELAY), 받는 socket)'''
+    with socket.create_server(("127.0.0.1", 0)) as listener:
+        receiver = socket.create_connection(listener.getsockname())
+        (sender, _) = listener.accept()
+    sender.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return (sender, receiver)
+
+
+def drain(receiver : socket.socket) -> None:
+    while receiver.recv(1024 * 1024):
+        pass
+
+
+def measure(send_one, count : int) -> float:
+    '''
+    send_one(socket)을 count번 호출. 받는 쪽은 fork한 process (thread이면 GIL을 두고 보내는 쪽과 경쟁함)
+
+    return : CPU 1초당 response 수'''
+    (sender, receiver) = connection_pair()
+    reader = multiprocessing.get_context("fork").Process(target=drain, args=(receiver,))
+    reader.start()
+    receiver.close()
+    start = time.process_time()
+    for _ in range(count):
+        send_one(sender)
+    elapsed = time.process_time() - start
+    sender.shutdown(socket.SHUT_WR)
+    reader.join()
+    sender.close()
+    return count / elapsed
+
+
+def make_cases(server : Server, image : bytes) -> dict:
+    '''
+    return : case 이름 -> (legacy send_one 또는 None, fast send_one)'''
+    def fast(build):
+        def send_one(client_socket):
+            (response, bin_file) = build()
+            server._send_response(client_socket, response, bin_file)
+        return send_one
+
+    def legacy(build):
+        def send_one(client_socket):
+            (response, bin_file) = build()
+            legacy_send(client_socket, response, bin_file)
+        return send_one
+
+    url = json.dumps({"url": "bench.png"})
+    (check, download) = RequestParser().feed(("HEAD /images HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n"
+                                              "GET /images HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\n"
+                                              f"Content-Length: {len(url)}\r\n\r\n{url}").encode())
+    return {
+        "static" : (legacy(lambda: legacy_response("200 OK", body="LOGIN_SUCCESS")),
+                    fast(lambda: server._create_response_str("200 OK", body="LOGIN_SUCCESS"))),
+        "headers" : (legacy(lambda: legacy_response("200 OK", COOKIES, body="LOGIN_SUCCESS")),
+                     fast(lambda: server._create_response_str("200 OK", COOKIES, body="LOGIN_SUCCESS"))),
+        "image" : (legacy(lambda: legacy_response_byte("200 OK", IMAGE_HEADERS, image)),
+                   fast(lambda: server._create_response_byte("200 OK", IMAGE_HEADERS, image))),
+        "route" : (None, fast(lambda: server.request_handler(check))),
+        "download" : (None, fast(lambda: server.request_handler(download))),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--responses", type=int, default=50000)
+    parser.add_argument("--image-size", type=int, default=16384)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        users = JsonUserStore(os.path.join(workdir, "users.json"))
+        logger = LogWriter(os.path.join(workdir, "log.txt"), level=ERROR, echo=False)
+        image = b"\x89PNG\r\n\x1a\n" + os.urandom(args.image_size - 8)
+        with open(os.path.join(workdir, "bench.png"), "wb") as f:
+            f.write(image)
+        server = Server(users=users, logger=logger, catalog=ImageCatalog(workdir), admission=AdmissionControl.disabled())
+        authorize = mock.patch.object(server, "_authorize_images", lambda request, download: "bench")
+        authorize.start()
+
+        print(f"{'case':>8s} {'legacy/s':>10s} {'fast/s':>10s} {'speedup':>8s}")
+        for (name, (legacy, fast)) in make_cases(server, image).items():
+            (legacy_rate, fast_rate) = (0, 0)
+            for _ in range(args.repeat):
+                if legacy is not None:
+                    legacy_rate = max(legacy_rate, measure(legacy, args.responses))
+                fast_rate = max(fast_rate, measure(fast, args.responses))
+            if legacy is None:
+                print(f"{name:>8s} {'-':>10s} {fast_rate:10.0f} {'-':>8s}")
+                continue
+            print(f"{name:>8s} {legacy_rate:10.0f} {fast_rate:10.0f} {fast_rate / legacy_rate:7.2f}x")
+        authorize.stop()
+        server.close()
+        logger.close()
+        users.close()
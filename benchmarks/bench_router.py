@@ -0,0 +1,52 @@
+'''
+Router의 route 조회 시간 측정.
+
+route 수(--routes)를 늘려도 param이 없는 route는 dict 조회 한 번으로 찾는 지,
+param route("/r<n>/{name}")는 첫 path 구간이 같은 pattern만 비교하는 지 확인함.
+출력 : route 수별 조회 한 번의 시간 (us)
+
+사용법 :
+    python bench_router.py [--routes 5 50 500] [--lookups 200000]
+'''
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+from router import Router
+
+
+def handler(target, request, **params):
+    return params
+
+
+def make_router(routes : int) -> Router:
+    router = Router(lambda target, error: error)
+    for i in range(routes):
+        router.add("POST", f"/r{i}", handler)
+        router.add("GET", f"/r{i}/{{name}}", handler)
+    router.compile()
+    return router
+
+
+def measure(router : Router, method : str, path : str, lookups : int) -> float:
+    start = time.perf_counter()
+    for _ in range(lookups):
+        router.resolve(method, path)
+    return (time.perf_counter() - start) / lookups
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--routes", nargs="+", type=int, default=[5, 50, 500])
+    parser.add_argument("--lookups", type=int, default=200000)
+    args = parser.parse_args()
+
+    print(f"{'routes':>8s} {'exact us':>10s} {'param us':>10s}")
+    for routes in args.routes:
+        router = make_router(routes)
+        last = routes - 1
+        exact = measure(router, "POST", f"/r{last}", args.lookups)
+        param = measure(router, "GET", f"/r{last}/image.png", args.lookups)
+        print(f"{routes:8d} {exact * 1e6:10.3f} {param * 1e6:10.3f}")
@@ -0,0 +1,105 @@
+'''
+server.py를 로컬에서 실행하고 loadgen.py로 전체 route에 부하를 주는 harness.
+
+임시 디렉터리에 아래를 준비한 뒤 mode(thread/process/asyncio)마다 server.py를 실행함 :
+- users.json : seed 사용자 --seed-users명 (<SEED_PREFIX><n> / SEED_PASSWORD, 유효한 권한 key 포함).
+               password는 평문(이전 형식)으로 넣으며 서버가 첫 로그인 때 hash로 바꿔 저장함.
+               --store sqlite이면 users.db로 옮김
+- images/ : 저장소의 src/*.png, server/image.jpg, --image-kb 크기의 임의 data 파일 (catalog에 등록되도록 .jpg)
+
+loadgen.run의 결과(단계별 처리량, latency percentile, 오류율)를 mode마다 출력하고,
+--json을 주면 {mode : 결과}를 저장하여 이전 결과와 비교할 수 있게 함.
+
+사용법 :
+    python bench_routes.py [--modes thread process asyncio] [--workers 8] [--store json]
+                           [--concurrency 8] [--duration 10] [--rate 0] [--processes 1]
+                           [--steps register login privilege head get] [--seed-users 1000]
+                           [--image-kb 256 4096] [--kdf-n 16384] [--json result.json]
+'''
+import argparse
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+from bench_concurrency import free_port, start_server, stop_server
+import loadgen
+
+REPO_DIR = os.path.join(BENCH_DIR, "..")
+SQLITE_STORE_PY = os.path.join(REPO_DIR, "server", "sqlite_store.py")
+
+
+def seed_users(workdir : str, count : int, store : str) -> None:
+    '''
+    권한 key가 이미 발급된 seed 사용자를 users.json(또는 users.db)에 넣음'''
+    expiry = time.time() + 24 * 3600
+    users = {f"{loadgen.SEED_PREFIX}{i}" : {"pw" : loadgen.SEED_PASSWORD,
+                                            "key" : {"value" : "ABCD", "expiry_time" : expiry}}
+             for i in range(count)}
+    with open(os.path.join(workdir, "users.json"), "w") as f:
+        json.dump(users, f)
+    if store == "sqlite":
+        subprocess.run([sys.executable, SQLITE_STORE_PY, "users.json", "users.db"], cwd=workdir,
+                       check=True, stdout=subprocess.DEVNULL)
+
+
+def seed_images(workdir : str, sizes_kb : list) -> list:
+    '''
+    images/ 디렉터리에 이미지 corpus를 만듦
+
+    return : GET /images에 보낼 url 목록 (server 실행 디렉터리 기준)'''
+    image_dir = os.path.join(workdir, "images")
+    os.makedirs(image_dir)
+    for path in sorted(glob.glob(os.path.join(REPO_DIR, "src", "*.png"))) + [os.path.join(REPO_DIR, "server", "image.jpg")]:
+        shutil.copy(path, image_dir)
+    for size in sizes_kb:
+        with open(os.path.join(image_dir, f"random_{size}kb.jpg"), "wb") as f:
+            f.write(os.urandom(size * 1024))
+    return [f"images/{name}" for name in sorted(os.listdir(image_dir))]
+
+
+def run(mode : str, workers : int, store : str, users : int, image_kb : list, kdf_n : int, load : dict) -> dict:
+    with tempfile.TemporaryDirectory() as workdir:
+        seed_users(workdir, users, store)
+        images = seed_images(workdir, image_kb)
+        port = free_port()
+        args = ["--mode", mode, "--workers", str(workers), "--store", store, "--quiet", "--no-rate-limit",
+                "--max-connections", str(max(64, load["concurrency"] * load["processes"]))]
+        if kdf_n:
+            args += ["--kdf-n", str(kdf_n)]
+        proc = start_server(workdir, port, args)
+        try:
+            return loadgen.run("127.0.0.1", port, images=images, seed_users=users, **load)
+        finally:
+            stop_server(proc)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modes", nargs="+", default=["thread", "process", "asyncio"])
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--store", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--seed-users", type=int, default=1000)
+    parser.add_argument("--image-kb", nargs="*", type=int, default=[256, 4096])
+    parser.add_argument("--kdf-n", type=int, default=None, help="server.py --kdf-n (password hash cost)")
+    loadgen.add_load_arguments(parser)
+    args = parser.parse_args()
+
+    load = {"concurrency" : args.concurrency, "duration" : args.duration, "rate" : args.rate, "flows" : args.flows,
+            "steps" : args.steps, "processes" : args.processes, "timeout" : args.timeout}
+    results = {}
+    print(f"workers={args.workers} store={args.store} concurrency={args.concurrency} processes={args.processes} "
+          f"rate={args.rate or 'max'} steps={' '.join(args.steps)}")
+    for mode in args.modes:
+        results[mode] = run(mode, args.workers, args.store, args.seed_users, args.image_kb, args.kdf_n, load)
+        print(f"\n[{mode}] elapsed={results[mode]['elapsed']:.1f}s")
+        loadgen.report(results[mode])
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=4)
@@ -0,0 +1,118 @@
+'''
+TLS handshake 비용 측정 : 전체 handshake와 session 재개(resumption) handshake 비교.
+
+tls.server_context로 연 작은 서버(별도 process)에 --connections번 새로 연결하여
+connect + handshake 시간과 초당 연결 수를 출력함. 비교를 위해 평문 TCP 연결도 측정.
+- full : 매번 session 없이 연결 (인증서 검증 + key 교환)
+- resumed : 직전 연결의 session으로 재개 (ConnectionPool이 새 연결에 사용하는 방식)
+TLS 1.2(session id/ticket)와 TLS 1.3(session ticket)을 각각 측정. 인증서는 임시 self-signed(EC P-256).
+
+사용법 :
+    python bench_tls.py [--connections 500] [--versions 1.2 1.3]
+'''
+import argparse
+import multiprocessing
+import os
+import shutil
+import socket
+import ssl
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "client"))
+from tls import server_context, generate_self_signed
+from connection_pool import client_context
+
+VERSIONS = {"1.2" : ssl.TLSVersion.TLSv1_2, "1.3" : ssl.TLSVersion.TLSv1_3}
+RESPONSE = b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok"
+
+
+def serve(listener : socket.socket, certfile : str, keyfile : str) -> None:
+    '''
+    연결마다 thread에서 handshake 후 요청 하나에 응답하고 닫는 서버 (bench process와 CPU를 나누도록 별도 process)'''
+    context = server_context(certfile, keyfile) if certfile else None
+
+    def handle(conn : socket.socket) -> None:
+        try:
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            if context is not None:
+                conn = context.wrap_socket(conn, server_side=True)
+            conn.recv(1024)
+            conn.sendall(RESPONSE)
+        except OSError:
+            pass
+        finally:
+            conn.close()
+
+    while True:
+        (conn, _) = listener.accept()
+        threading.Thread(target=handle, args=(conn,), daemon=True).start()
+
+
+def measure(port : int, context : ssl.SSLContext, connections : int, resume : bool) -> tuple:
+    '''
+    return : (handshake 시간 목록(초), 재개된 연결 수, 전체 시간)'''
+    session = None
+    (times, resumed) = ([], 0)
+    start = time.perf_counter()
+    for _ in range(connections):
+        began = time.perf_counter()
+        conn = socket.create_connection(("127.0.0.1", port))
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1) # handshake 메세지가 Nagle로 지연되지 않도록
+        if context is not None:
+            conn = context.wrap_socket(conn, server_hostname="127.0.0.1", session=session if resume else None)
+            resumed += conn.session_reused
+        times.append(time.perf_counter() - began)
+        conn.sendall(b"GET / HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n")
+        conn.recv(1024) # TLS 1.3 session ticket도 여기서 받음
+        if context is not None:
+            session = conn.session
+        conn.close()
+    return (times, resumed, time.perf_counter() - start)
+
+
+def report(name : str, times : list, resumed : int, elapsed : float) -> None:
+    times.sort()
+    mean = sum(times) / len(times)
+    p99 = times[min(len(times) - 1, int(len(times) * 0.99))]
+    print(f"{name:>14s} {mean * 1e3:8.3f} {times[len(times) // 2] * 1e3:8.3f} {p99 * 1e3:8.3f} "
+          f"{len(times) / elapsed:9.1f} {resumed:8d}")
+
+
+def start_server(certfile : str, keyfile : str) -> tuple:
+    listener = socket.create_server(("127.0.0.1", 0), backlog=128)
+    proc = multiprocessing.Process(target=serve, args=(listener, certfile, keyfile), daemon=True)
+    proc.start()
+    return (proc, listener.getsockname()[1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--connections", type=int, default=500)
+    parser.add_argument("--versions", nargs="+", choices=list(VERSIONS), default=list(VERSIONS))
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-tls-")
+    (certfile, keyfile) = (os.path.join(workdir, "cert.pem"), os.path.join(workdir, "key.pem"))
+    generate_self_signed(certfile, keyfile, "127.0.0.1")
+    servers = []
+    try:
+        print(f"{'':>14s} {'mean ms':>8s} {'p50 ms':>8s} {'p99 ms':>8s} {'conn/s':>9s} {'resumed':>8s}")
+        (proc, port) = start_server(None, None)
+        servers.append(proc)
+        report("plain", *measure(port, None, args.connections, False))
+
+        (proc, port) = start_server(certfile, keyfile)
+        servers.append(proc)
+        for version in args.versions:
+            context = client_context(certfile)
+            (context.minimum_version, context.maximum_version) = (VERSIONS[version], VERSIONS[version])
+            report(f"TLS{version} full", *measure(port, context, args.connections, False))
+            report(f"TLS{version} resumed", *measure(port, context, args.connections, True))
+    finally:
+        for proc in servers:
+            proc.terminate()
+        shutil.rmtree(workdir)
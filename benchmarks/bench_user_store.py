@@ -0,0 +1,99 @@
+'''
+사용자 수에 따른 login 처리량(logins/sec) 측정.
+
+- legacy : 이전 Server.load_users 방식 (login마다 users.json 전체를 읽고 파싱)
+- store : JsonUserStore (메모리 lookup)
+- register : JsonUserStore.create (journal write-behind 포함)
+- sqlite : SqliteUserStore (WAL) login, register, 그리고 --threads개 thread의 동시 login
+
+사용법 :
+    python bench_user_store.py [--users 1000 10000 100000] [--logins 2000] [--threads 4]
+'''
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+from user_store import JsonUserStore
+from sqlite_store import SqliteUserStore, migrate_json
+
+
+def seed(path : str, count : int) -> None:
+    users = {f"user{i}": {"pw": f"pw{i}", "key": {"value": "0", "expiry_time": 0}} for i in range(count)}
+    with open(path, "w") as f:
+        json.dump(users, f, indent=4)
+
+
+def bench_legacy(path : str, count : int, logins : int) -> float:
+    start = time.perf_counter()
+    for i in range(logins):
+        with open(path, "r") as f:
+            users = json.load(f)
+        assert users.get(f"user{i % count}")["pw"] == f"pw{i % count}"
+    return logins / (time.perf_counter() - start)
+
+
+def bench_store(store, count : int, logins : int) -> float:
+    start = time.perf_counter()
+    for i in range(logins):
+        assert store.get(f"user{i % count}")["pw"] == f"pw{i % count}"
+    return logins / (time.perf_counter() - start)
+
+
+def bench_register(store, registers : int) -> float:
+    start = time.perf_counter()
+    for i in range(registers):
+        store.create(f"new{i}", {"pw": "pw", "key": {"value": "0", "expiry_time": 0}})
+    return registers / (time.perf_counter() - start)
+
+
+def bench_concurrent(store, count : int, logins : int, threads : int) -> float:
+    '''
+    threads개의 thread가 동시에 logins번씩 login'''
+    workers = [threading.Thread(target=bench_store, args=(store, count, logins)) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return logins * threads / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", nargs="+", type=int, default=[1000, 10000, 100000])
+    parser.add_argument("--logins", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{'users':>8s} {'legacy login/s':>16s} {'store login/s':>16s} {'store register/s':>18s}"
+          f" {'sqlite login/s':>16s} {'sqlite register/s':>18s} {'sqlite x' + str(args.threads) + ' login/s':>20s}")
+    for count in args.users:
+        with tempfile.TemporaryDirectory() as workdir:
+            path = os.path.join(workdir, "users.json")
+            seed(path, count)
+            legacy_logins = max(10, args.logins * 1000 // count)
+            legacy = bench_legacy(path, count, legacy_logins)
+
+            store = JsonUserStore(path)
+            try:
+                stored = bench_store(store, count, args.logins * 100)
+                register = bench_register(store, args.logins)
+            finally:
+                store.close()
+
+            db_path = os.path.join(workdir, "users.db")
+            migrate_json(path, db_path)
+            store = SqliteUserStore(db_path)
+            try:
+                sqlite_login = bench_store(store, count, args.logins * 10)
+                sqlite_register = bench_register(store, args.logins)
+                sqlite_concurrent = bench_concurrent(store, count, args.logins * 10, args.threads)
+            finally:
+                store.close()
+        print(f"{count:8d} {legacy:16.1f} {stored:16.0f} {register:18.0f}"
+              f" {sqlite_login:16.0f} {sqlite_register:18.0f} {sqlite_concurrent:20.0f}")
@@ -0,0 +1,316 @@
+'''
+실제 client 흐름을 재현하는 load generator.
+
+virtual user마다 client.Client를 하나씩 두고, Client._create_request로 만든 request를
+keep-alive 연결(ConnectionPool)로 보내며 아래 단계를 반복함 (--steps로 일부만 선택 가능) :
+    register (POST /register) -> login (POST /login) -> privilege (PUT /privilege)
+    -> head (HEAD /images) -> get (GET /images)
+
+register 단계가 있으면 반복마다 새 사용자를 만들고, 없으면 미리 넣어둔(seed) 사용자
+<SEED_PREFIX><n> 중 하나로 로그인함 (bench_routes.py가 users.json에 넣어 줌).
+privilege, head, get은 login이 발급한 session/key cookie를 사용하므로 login 단계와 함께 실행해야 함.
+
+--concurrency개 virtual user(thread)가 동시에 흐름을 반복함. --processes를 주면 process마다
+--concurrency개씩 실행하여 client 쪽 GIL이 병목이 되지 않도록 함.
+--rate를 주면 전체 흐름 시작 속도를 초당 rate개로 맞춤(open loop). 이때 flow latency는
+예정된 시작 시각부터 측정하므로 서버가 밀려 늦게 시작한 시간도 포함됨.
+thread/process mode에서는 keep-alive 연결 하나가 worker 하나를 차지하므로 concurrency가
+서버의 --workers보다 크면 남는 연결은 응답을 받지 못하고 --timeout 오류로 기록됨.
+
+출력 : 단계별 요청 수, 처리량(req/s), latency 평균/p50/p90/p99/max (ms), 오류율, 응답 status 분포
+
+사용법 (이미 실행 중인 서버에 대해) :
+    python loadgen.py <host> <port> [--concurrency 8] [--duration 10] [--rate 0]
+                      [--steps register login privilege head get] [--images image.jpg] [--json result.json]
+'''
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "client"))
+from client import Client
+from connection_pool import ConnectionPool
+from web_cache import WebCache
+
+STEPS = ("register", "login", "privilege", "head", "get")
+EXPECTED_STATUS = { # 이 status가 아니면 오류로 셈
+    "register" : {"200"},
+    "login" : {"200"},
+    "privilege" : {"200", "409"}, # 이미 권한이 있으면 409
+    "head" : {"200"},
+    "get" : {"200", "304"},
+}
+SEED_PREFIX = "seed"
+SEED_PASSWORD = "seed-password"
+PERCENTILES = (50, 90, 99)
+REQUEST_TIMEOUT = 10.0
+
+
+class StepStats:
+    '''
+    한 단계(또는 흐름 전체)의 latency, 오류, status 분포, 받은 byte 수'''
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.statuses = Counter()
+        self.bytes = 0
+
+    def record(self, seconds : float, status : str, size : int, ok : bool) -> None:
+        self.latencies.append(seconds)
+        self.statuses[status] += 1
+        self.bytes += size
+        if not ok:
+            self.errors += 1
+
+    def merge(self, other : "StepStats") -> None:
+        self.latencies.extend(other.latencies)
+        self.errors += other.errors
+        self.statuses.update(other.statuses)
+        self.bytes += other.bytes
+
+    def summary(self, elapsed : float) -> dict:
+        '''
+        elapsed : 측정 시간(초). 처리량 계산에 사용'''
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+        result = {"count" : count, "errors" : self.errors,
+                  "error_rate" : self.errors / count if count else 0.0,
+                  "rps" : count / elapsed if elapsed else 0.0,
+                  "mb_per_sec" : self.bytes / elapsed / 1e6 if elapsed else 0.0,
+                  "statuses" : dict(self.statuses)}
+        if count:
+            result["mean_ms"] = sum(latencies) / count * 1e3
+            for p in PERCENTILES:
+                result[f"p{p}_ms"] = latencies[min(count - 1, count * p // 100)] * 1e3
+            result["max_ms"] = latencies[-1] * 1e3
+        return result
+
+
+class VirtualUser:
+    '''
+    Client 하나로 흐름(steps)을 반복하는 가상 사용자'''
+    def __init__(self, host : str, port : int, pool : ConnectionPool, web_cache : WebCache,
+                 steps : list, images : list, name : str, seed_users : int, timeout : float):
+        self.client = Client(host, port, pool, web_cache)
+        self.timeout = timeout
+        self.steps = steps
+        self.images = images
+        self.name = name
+        self.seed_users = seed_users
+        self.iteration = 0
+
+    def run_flow(self, stats : dict) -> bool:
+        '''
+        흐름을 한 번 실행하고 단계별 결과를 stats에 기록.
+        한 단계가 실패하면 나머지 단계는 건너뜀
+
+        return : 모든 단계가 성공했는 지'''
+        if "register" in self.steps:
+            username = f"{self.name}-{self.iteration}"
+            password = "load-password"
+        else:
+            username = f"{SEED_PREFIX}{random.randrange(self.seed_users)}"
+            password = SEED_PASSWORD
+        self.iteration += 1
+        self.client.session_cookie = {} # 반복마다 새 사용자처럼 시작
+
+        for step in self.steps:
+            if step in ("register", "login"):
+                (method, url) = ("POST", f"/{step}")
+                body = {"username" : username, "password" : password}
+            elif step == "privilege":
+                (method, url, body) = ("PUT", "/privilege", {"username" : username})
+            elif step == "head":
+                (method, url, body) = ("HEAD", "/images", {"username" : username})
+            else:
+                (method, url, body) = ("GET", "/images", {"url" : random.choice(self.images)})
+            request = self.client._create_request(method, url, headers=["Content-Type: application/json"],
+                                                  body=json.dumps(body))
+            if not self._send(request, stats[step], EXPECTED_STATUS[step]):
+                return False
+        return True
+
+    def _send(self, request : str, stats : StepStats, expected : set) -> bool:
+        '''
+        request를 보내고 response를 끝까지 읽은 뒤 latency와 status를 기록'''
+        client = self.client
+        start = time.perf_counter()
+        try:
+            conn = client.pool.acquire(client.host, client.port)
+        except OSError:
+            stats.record(time.perf_counter() - start, "connect-error", 0, False)
+            return False
+        try:
+            conn.settimeout(self.timeout)
+            client._send_request(conn, request)
+            (head, body) = client._response_handler(conn, bin_data=True)
+        except (OSError, ValueError) as e: # 응답이 없거나 연결이 끊기거나 잘못된 response
+            client.pool.discard(conn)
+            stats.record(time.perf_counter() - start, "timeout" if isinstance(e, TimeoutError) else "io-error", 0, False)
+            return False
+        elapsed = time.perf_counter() - start
+        client.pool.release(client.host, client.port, conn)
+
+        status = head.split(" ", 2)[1]
+        ok = status in expected
+        stats.record(elapsed, status, len(head) + len(body or b""), ok)
+        return ok
+
+
+def _run_threads(host : str, port : int, concurrency : int, duration : float, rate : float, flows : int,
+                 steps : list, images : list, seed_users : int, timeout : float, start_at : float, process_index : int,
+                 processes : int) -> dict:
+    '''
+    process 하나에서 concurrency개 virtual user를 실행.
+    rate와 flows는 전체 process에 대한 값이며 process_index번째 slot들만 맡음
+
+    return : {단계 이름 또는 "flow" : StepStats}'''
+    pool = ConnectionPool(max_idle_per_host=concurrency)
+    cache_dir = tempfile.mkdtemp(prefix="loadgen-cache-")
+    web_cache = WebCache(cache_dir) # 사용하지 않지만 Client가 web_cash 디렉터리를 만들지 않도록
+    tag = f"load{os.getpid()}-{int(start_at * 1000) % 1000000}"
+    users = [VirtualUser(host, port, pool, web_cache, steps, images, f"{tag}-{i}", seed_users, timeout)
+             for i in range(concurrency)]
+
+    per_user = [{name : StepStats() for name in list(steps) + ["flow"]} for _ in range(concurrency)]
+    slots = iter(range(process_index, flows or sys.maxsize, processes))
+    slots_lock = threading.Lock()
+    deadline = start_at + duration if duration else None
+
+    def worker(idx : int) -> None:
+        (user, stats) = (users[idx], per_user[idx])
+        while True:
+            with slots_lock:
+                slot = next(slots, None)
+            if slot is None:
+                return
+            scheduled = start_at + slot / rate if rate else time.perf_counter()
+            if deadline is not None and scheduled >= deadline:
+                return
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            ok = user.run_flow(stats)
+            stats["flow"].record(time.perf_counter() - scheduled, "ok" if ok else "failed", 0, ok)
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+
+    delay = start_at - time.perf_counter()
+    if delay > 0:
+        time.sleep(delay)
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    pool.close()
+    web_cache.close()
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+    merged = per_user[0]
+    for stats in per_user[1:]:
+        for (name, step_stats) in stats.items():
+            merged[name].merge(step_stats)
+    return merged
+
+
+def run(host : str, port : int, concurrency : int=8, duration : float=10.0, rate : float=0.0, flows : int=0,
+        steps : list=STEPS, images : list=("image.jpg",), seed_users : int=0, processes : int=1,
+        timeout : float=REQUEST_TIMEOUT) -> dict:
+    '''
+    load를 발생시키고 단계별 결과를 반환
+
+    concurrency : process마다 동시에 흐름을 실행하는 virtual user 수
+    duration : 실행 시간(초). 0이면 flows개를 모두 실행할 때까지
+    rate : 전체 흐름 시작 속도(초당). 0이면 제한 없음(closed loop)
+    flows : 실행할 흐름 수. 0이면 duration 동안 계속
+    steps : 실행할 단계 (STEPS 중 일부, 순서 유지)
+    images : GET /images에 보낼 url 목록 (서버 실행 디렉터리 기준)
+    seed_users : register 단계가 없을 때 사용할 seed 사용자 수
+    processes : load를 발생시키는 process 수
+    timeout : 응답을 기다리는 최대 시간(초). 넘으면 "timeout" 오류로 기록하고 연결을 버림
+
+    return : {"elapsed" : 측정 시간, "steps" : {단계 이름 또는 "flow" : StepStats.summary()}}'''
+    steps = [step for step in STEPS if step in steps]
+    if "register" not in steps and seed_users <= 0:
+        raise ValueError("seed_users is required when the register step is skipped")
+    if not duration and not flows:
+        raise ValueError("duration or flows is required")
+
+    args = (host, port, concurrency, duration, rate, flows, steps, list(images), seed_users, timeout)
+    if processes <= 1:
+        start_at = time.perf_counter() + 0.1
+        results = [_run_threads(*args, start_at, 0, 1)]
+        elapsed = time.perf_counter() - start_at
+    else:
+        # perf_counter는 process 사이에 공유되지 않으므로 시작 시각을 time.time 기준으로 넘김.
+        # 모든 process가 준비된 뒤 함께 시작
+        start_wall = time.time() + 0.5 + 0.1 * processes
+        with ProcessPoolExecutor(processes) as executor:
+            futures = [executor.submit(_run_in_process, args, start_wall, i, processes) for i in range(processes)]
+            results = [future.result() for future in futures]
+        elapsed = time.time() - start_wall
+
+    merged = results[0]
+    for stats in results[1:]:
+        for (name, step_stats) in stats.items():
+            merged[name].merge(step_stats)
+    return {"elapsed" : elapsed, "steps" : {name : stats.summary(elapsed) for (name, stats) in merged.items()}}
+
+
+def _run_in_process(args : tuple, start_wall : float, process_index : int, processes : int) -> dict:
+    start_at = time.perf_counter() + (start_wall - time.time())
+    return _run_threads(*args, start_at, process_index, processes)
+
+
+def report(result : dict, file=sys.stdout) -> None:
+    print(f"{'step':>10s} {'count':>8s} {'req/s':>9s} {'mean ms':>8s} {'p50 ms':>8s} {'p90 ms':>8s} "
+          f"{'p99 ms':>8s} {'max ms':>8s} {'err %':>6s}  status", file=file)
+    for (name, stats) in result["steps"].items():
+        if not stats["count"]:
+            print(f"{name:>10s} {0:8d}", file=file)
+            continue
+        statuses = " ".join(f"{status}:{count}" for (status, count) in sorted(stats["statuses"].items()))
+        print(f"{name:>10s} {stats['count']:8d} {stats['rps']:9.1f} {stats['mean_ms']:8.2f} {stats['p50_ms']:8.2f} "
+              f"{stats['p90_ms']:8.2f} {stats['p99_ms']:8.2f} {stats['max_ms']:8.2f} "
+              f"{stats['error_rate'] * 100:6.2f}  {statuses}", file=file)
+
+
+def add_load_arguments(parser : argparse.ArgumentParser) -> None:
+    '''
+    loadgen.py와 bench_routes.py가 함께 쓰는 옵션'''
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--rate", type=float, default=0.0)
+    parser.add_argument("--flows", type=int, default=0)
+    parser.add_argument("--steps", nargs="+", choices=STEPS, default=list(STEPS))
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=REQUEST_TIMEOUT)
+    parser.add_argument("--json", default=None, help="결과를 저장할 JSON 파일")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("host")
+    parser.add_argument("port", type=int)
+    parser.add_argument("--images", nargs="+", default=["image.jpg"])
+    parser.add_argument("--seed-users", type=int, default=0)
+    add_load_arguments(parser)
+    args = parser.parse_args()
+
+    result = run(args.host, args.port, args.concurrency, args.duration, args.rate, args.flows,
+                 args.steps, args.images, args.seed_users, args.processes)
+    print(f"concurrency={args.concurrency} processes={args.processes} rate={args.rate or 'max'} "
+          f"elapsed={result['elapsed']:.1f}s")
+    report(result)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=4)
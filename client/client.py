@@ -1,10 +1,17 @@
 import socket
+import ssl
 import json
 import sys
+import argparse
 import time
-from PIL import Image
-from io import BytesIO
 import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlencode
+
+from connection_pool import ConnectionPool, client_context
+from response_reader import read_response, decode_body, HttpResponse, BundleSplitter, DecodingSink, ACCEPT_ENCODING
+from web_cache import WebCache
 
 # client.py 사용 전 지정해줘야 함
 SERVER_IP = "127.0.0.1" 
@@ -12,45 +19,119 @@ COOKIES_DB = "cookies.json"
 DNS = {
     "server": SERVER_IP,
     }
+DOWNLOAD_CONCURRENCY = 8 # download_images가 동시에 받는 이미지(bundle) 수 (pool의 MAX_IDLE_PER_HOST 이하)
+BUNDLE_MAX_IMAGES = 64 # POST /images/batch 하나로 받는 최대 이미지 수 (서버의 MAX_BUNDLE_IMAGES)
+THROTTLE_RETRIES = 3 # 429 Too Many Requests를 받은 request를 Retry-After만큼 기다렸다가 다시 보내는 횟수
+THROTTLE_MAX_WAIT = 10 # Retry-After가 이보다 길면(초) 기다리지 않고 429를 그대로 반환
 
 MODE = None
 
-class Client(socket.socket):
-    def __init__(self, host : str, port : int):
-        socket.socket.__init__(self, socket.AF_INET, socket.SOCK_STREAM)
+class Client:
+    def __init__(self, host : str, port : int, pool : ConnectionPool=None, web_cache : WebCache=None,
+                 tls_context : ssl.SSLContext=None):
+        '''
+        host : ip address or domain
+        port : server port
+        pool : 연결을 빌려올 ConnectionPool. 여러 Client가 같은 pool을 공유할 수 있음
+        web_cache : 다운로드한 이미지를 저장할 WebCache. None이면 web_cash 디렉터리 사용
+        tls_context : connection_pool.client_context(). pool이 None일 때 HTTPS로 연결 (None이면 평문)'''
         self.host = self.domain_to_ip(host)
         self.port = port
+        self.pool = pool if pool is not None else ConnectionPool(ssl_context=tls_context) # keep-alive 연결 pool
+        self.web_cache = web_cache if web_cache is not None else WebCache() # 이미지 cache
 
         self.session_cookie = {}
         self.is_logined = False
         self.id = None
+        self._privileged_key = None # HEAD /images로 확인한 key 쿠키 값
 
         # connect client to server
         try:
-            self.connect((self.host, self.port))
+            self.pool.release(self.host, self.port, self.pool.acquire(self.host, self.port))
         except Exception as e:
             print("connect() error:", e)
             sys.exit(1)
+
+    def __enter__(self):
+        return self
     
     def __exit__(self, exc_type, exc_value, traceback):
         if exc_type:
             print(f"An exception occurred: {exc_value}")
         self.save_cookies(self.session_cookie)
+        self.web_cache.close()
         print("Client closed")
-        self.close()
+        self.pool.close()
         return False  # 예외를 전파하고 싶다면 False를 반환
 
-    def _send_request(self, request : str) -> str:
+    def _exchange(self, request : str, bin_data=False, sink=None):
+        '''
+        pool에서 연결을 빌려 request를 보내고 response를 받은 뒤 연결을 돌려줌.
+
+        재사용한 연결이 서버 쪽에서 이미 닫혀 있으면 새 연결로 한 번 다시 시도함.
+        새 연결에서도 실패하면 에러를 출력하고 빈 response를 반환.
+        429 Too Many Requests를 받으면 Retry-After만큼 기다렸다가 THROTTLE_RETRIES번까지 다시 보냄.
+
+        request : _create_request 로부터 return된 string
+        bin_data : True if bin_data is binary else False
+        sink : binary data를 바로 쓸 file object (_response_handler 참고)
+
+        return : _response_handler의 return 값'''
+        (reconnected, throttled) = (False, 0)
+        while True:
+            try:
+                conn = self.pool.acquire(self.host, self.port)
+            except OSError as e:
+                print("connect() error:", e)
+                break
+            try:
+                self._send_request(conn, request)
+                response = self._response_handler(conn, bin_data, sink)
+            except OSError as e: # ConnectionError 포함
+                self.pool.discard(conn)
+                if conn.reused and not reconnected:
+                    reconnected = True
+                    if sink is not None: # 앞서 받은 일부 data를 지우고 다시 받음
+                        sink.seek(0)
+                        sink.truncate()
+                    continue # 끊어진 keep-alive 연결 => 새 연결로 재시도
+                print("request error:", e)
+                break
+            self.pool.release(self.host, self.port, conn)
+
+            wait = self._retry_after(response[0] if bin_data else response)
+            if wait is None or throttled == THROTTLE_RETRIES:
+                return response
+            throttled += 1
+            if MODE == 'debug':
+                print(f"429 Too Many Requests. {wait}초 후 다시 요청합니다.")
+            time.sleep(wait)
+            if sink is not None: # 429 body를 지움
+                sink.seek(0)
+                sink.truncate()
+        return ("", b"") if bin_data else ""
+
+    def _retry_after(self, headers : str) -> int:
+        '''
+        429 Too Many Requests response이면 Retry-After(초). 다른 response이거나 THROTTLE_MAX_WAIT보다 길면 None'''
+        if not headers.startswith("HTTP/1.1 429"):
+            return None
+        wait = 1
+        for line in headers.split("\r\n")[1:]:
+            (name, _, value) = line.partition(":")
+            if name.strip().lower() == "retry-after" and value.strip().isdigit():
+                wait = int(value)
+        return wait if wait <= THROTTLE_MAX_WAIT else None
+
+    def _send_request(self, conn : socket.socket, request : str) -> None:
         '''
         request를 server에 보내는 함수
         
+        conn : pool에서 빌린 연결
         request : _create_request 로부터 return된 반복 가능한 string'''
 
         # send request to server
-        try:
-            self.sendall(request.encode())
-        except Exception as e:
-            print("write() error:", e)
+        conn.sendall(request.encode())
 
     def _create_request(self, method : str, url : str, headers : list=None, body : str=None) -> str:
         '''
@@ -65,16 +146,17 @@ class Client(socket.socket):
 
         response = [f"{method} {url} HTTP/1.1"]
         response.append(f"Host: {self.host}")
+        response.append(f"Accept-Encoding: {ACCEPT_ENCODING}") # 압축된 response는 _response_handler에서 풂
 
         cookies = []
         for cookie in list(self.session_cookie.keys()):
             if time.time() < self.session_cookie[cookie]["expiry_time"]: # 기간 안지났으면
-                cookies.append(f"{cookie}={self.session_cookie[cookie]["value"]}") # 쿠키 추가
+                cookies.append(f"{cookie}={self.session_cookie[cookie]['value']}") # 쿠키 추가
             else :
                 del self.session_cookie[cookie] # 기간 지났으면 쿠키 삭제
         cookies = "; ".join(cookies)
         if cookies:
-            headers_cookie = "Set-Cookie: " + cookies
+            headers_cookie = "Cookie: " + cookies
             response.append(headers_cookie)
 
         # add headers
@@ -90,60 +172,46 @@ class Client(socket.socket):
 
         return "\r\n".join(response)
 
-    def _response_handler(self, bin_data=False):
+    def _response_handler(self, conn : socket.socket, bin_data=False, sink=None):
         '''
         server로부터 받은 response를 header 부분과 data 부분으로 나눔.
 
+        response_reader.read_response가 Content-Length(또는 chunked)로 response 하나를 정확히 읽음.
         data 부분이 binary 파일인 경우(이미지 파일) header 부분과 binary_data를 return
         data 부분이 string data인 경우 header 부분과 string data를 붙혀서 return
         
-        data 부분이 string data인 경우 cookie를 self.session_cookie에 저장
+        response의 cookie를 self.session_cookie에 저장
+        Content-Encoding으로 압축된 body는 풀어서 return
         
+        conn : 요청을 보낸 연결
         bin_data : True if bin_data is binary else False
+        sink : binary data를 메모리에 모으지 않고 바로 쓸 file object
         
         return : 
             bin_data = True:
-                tuple(header : str, image_data : bytes)
+                tuple(header : str, image_data : bytearray). sink를 사용하면 image_data는 None
             bin_data = False
                 string(_response)'''
         
         # recieve response and data by server
-        _response = ""
-        if not bin_data:
-            _response = self.recv(4096).decode()
-            if MODE == 'debug':
-                print(f"_response : \n{_response}")
-        else: 
-            _b_response = b""
-            while True:
-                chunk = self.recv(4 * 1024) # data를 chunk 조각으로 나누어 받음
-                if not chunk:
-                    break
-                
-                _b_response += chunk
-
-                # header와 data 분류
-                if b"\r\n\r\n" in _b_response: 
-                    (header, image_data) = _b_response.split(b"\r\n\r\n", 1)
-                    break
-            
-            while True:
-                chunk = self.recv(4096)
-                if not chunk:
-                    break
-                image_data += chunk 
-                if len(chunk) < 4096:
-                    break
-
-            return (header.decode(), image_data)
+        response = read_response(conn, sink=sink)
+        try:
+            decode_body(response) # Content-Encoding (sink로 받은 body는 그대로. DecodingSink이면 이미 풀림)
+        except ValueError as e:
+            raise ConnectionError(str(e)) from None
 
         # Set-Cookie 처리 (쿠키 저장)
-        if "Set-Cookie" in _response:
-            for line in _response.split("\r\n"):
-                if line.startswith("Set-Cookie:"):
-                    name, max_age = line.split(": ")[1].split("; ")
-                    self.session_cookie[name.split("=")[0]] = {"value" : name.split("=")[1], "expiry_time" : time.time() + int(max_age.split("=")[1])}
-                    
+        for (name, value) in response.header_list:
+            if name.lower() == "set-cookie":
+                cookie, max_age = value.split("; ")
+                self.session_cookie[cookie.split("=")[0]] = {"value" : cookie.split("=")[1], "expiry_time" : time.time() + int(max_age.split("=")[1])}
+
+        if bin_data:
+            return (response.head, response.body)
+
+        _response = response.head + "\r\n\r\n" + bytes(response.body or b"").decode()
+        if MODE == 'debug':
+            print(f"_response : \n{_response}")
         return _response
 
     # 회원가입 요청
@@ -159,8 +227,7 @@ class Client(socket.socket):
 
         data = json.dumps({"username": username, "password": password})
         request = self._create_request("POST", "/register", headers=["Content-Type: application/json"], body=data)
-        self._send_request(request)
-        response = self._response_handler()
+        response = self._exchange(request)
         if MODE == 'debug':
             print(response)
 
@@ -183,8 +250,7 @@ class Client(socket.socket):
 
         data = json.dumps({"username": username, "password": password})
         request = self._create_request("POST", "/login", headers=["Content-Type: application/json"], body=data)
-        self._send_request(request)
-        response = self._response_handler()
+        response = self._exchange(request)
         if MODE == 'debug':
             print(response)
             print(f"Saved Cookie: {self.session_cookie}")
@@ -195,6 +261,8 @@ class Client(socket.socket):
             print(f"로그인 성공: {username}")
         elif "LOGIN_FAILED" in response:
             print(f"로그인 실패: {username}")
+        elif "429 Too Many Requests" in response:
+            print("로그인 시도가 너무 많습니다. 잠시 후 다시 시도해주세요.")
 
     def upgrade_privilege(self) -> None:
         '''
@@ -208,13 +276,17 @@ class Client(socket.socket):
 
         data = json.dumps({"username": self.id})
         request = self._create_request("PUT", "/privilege", headers=["Content-Type: application/json"], body=data)
-        self._send_request(request)
-        response = self._response_handler()
+        response = self._exchange(request)
         if MODE == 'debug':
             print(response)
 
+        if "LOGIN_REQUIRED" in response: # session이 만료됨
+            self.is_logined = False
+            print("로그인이 만료되었습니다. 다시 로그인해주세요.")
+            return
+
         # 타임스탬프를 로컬 시간으로 변환
-        local_time = time.localtime(self.session_cookie["key"]["expiry_time"])
+        local_time = time.localtime(self.session_cookie.get("key", {}).get("expiry_time", 0))
         # 로컬 시간을 문자열로 출력
         formatted_time = time.strftime("%Y-%m-%d %H:%M:%S", local_time)
         if "PRIVILEGE_CHANGED" in response:
@@ -228,55 +300,287 @@ class Client(socket.socket):
         '''
         이미지 보여주기 요청. (HEAD /images) -> (GET /images)
 
-        image를 보기 위해 id의 key가 유효한 지 확인인 (HEAD /images)
+        image를 보기 위해 id의 key가 유효한 지 확인인 (HEAD /images). 확인은 key의 유효 시간 동안 한 번만 함
         key가 유효하면, (GET /images)로 이미지 정보를 binary 정보로 가져와 보여줌.
 
-        가져온 이미지는 web_cash에 저장됨.
-        url을 확인한 후 먼저 web_cash에 해당 이미지가 존재하는 지 확인한 후 존재하면 가져옴
-        존재하지 않으면 (GET /images)를 통해 이미지 정보를 요청.
+        가져온 이미지는 다시 인코딩하지 않고 받은 그대로 web_cash(WebCache)에 저장됨.
+        url로 먼저 web_cash를 확인하여 유효 기간(max-age)이 남았으면 요청 없이 바로 보여줌.
+        유효 기간이 지났으면 ETag/Last-Modified로 조건부 (GET /images)를 보내 304 Not Modified이면 cache를 사용.
+        cache에 없으면 (GET /images)를 통해 이미지 정보를 요청.
 
         url : 원하는 이미지 경로. 확장자를 포함하여야 함. EX) images.jpg
+        size : 원하는 최대 크기. EX) 320x240, 320x (너비만), x240 (높이만). 빈칸이면 원본.
+               크기를 주면 서버가 축소한 variant를 (GET /images?w=&h=)로 받고, web_cash에는 url과 크기별로 저장됨.
 
         Body content-Type: json
         '''
 
+        from PIL import Image # 이미지를 보여줄 때만 필요 (load generator 등은 PIL 없이 Client를 사용)
+
+        if not self._check_privilege():
+            return
+
+        url = input("이미지 url을 입력하세요: ")
+        url_data = json.dumps({"url": url})
+        print(f"{url_data}")
+        path = "/images" + self._variant_query(input("크기를 입력하세요 (EX) 320x240, 빈칸이면 원본): "))
+        if path != "/images":
+            url += path[len("/images"):] # web_cash에 variant별로 저장
+
+        entry = self.web_cache.lookup(url)
+        if entry is not None and self.web_cache.is_fresh(entry): # web_cash
+            image_data = self.web_cache.read(entry)
+            if image_data is not None:
+                print('open in web cash..')
+                Image.open(BytesIO(image_data)).show()
+                return
+            entry = None # cache 파일이 사라짐 => 다시 다운로드
+
+        request = self._create_request("GET", path, headers=["Content-Type: image/jpg"] + self.web_cache.validators(entry), body=url_data)
+        (headers, image_data) = self._exchange(request, bin_data=True)
+        if MODE == 'debug':
+            print(headers)
+
+        if "304 Not Modified" in headers: # 서버의 이미지가 바뀌지 않음
+            self.web_cache.refresh(url, headers)
+            image_data = self.web_cache.read(entry)
+            if image_data is None:
+                print(f"web cash를 읽을 수 없습니다. 다시 시도해주세요. Image : {url}")
+                return
+            print('open in web cash (not modified)..')
+            Image.open(BytesIO(image_data)).show()
+
+        elif "404 Not Found" in headers:
+            print(f"이미지가 존재하지 않습니다. Image : {url}")
+            self.web_cache.remove(url)
+
+        elif "400 Bad Request" in headers or "501 Not Implemented" in headers:
+            print(f"이미지 크기를 변경할 수 없습니다. {image_data.decode(errors='replace')}")
+
+        elif "401 Unauthorized" in headers: # key가 만료됨
+            self._privileged_key = None
+            print("권한이 없습니다. 권한을 상승시켜 주세요.")
+
+        elif "200 OK" in headers:
+            self.web_cache.store(url, headers, image_data)
+            Image.open(BytesIO(image_data)).show()
+
+    def download_images(self, urls : list, size : str="", concurrency : int=DOWNLOAD_CONCURRENCY,
+                        bundle : bool=False) -> dict:
+        '''
+        여러 이미지를 보여주지 않고 web_cash(WebCache)에 받아 둠 (갤러리 미리 받기). (GET /images)
+
+        권한은 key의 유효 시간 동안 한 번만 확인하고(_check_privilege),
+        이미지들은 concurrency개의 thread가 pool의 keep-alive 연결로 동시에 받음.
+        show_image와 같이 web_cash의 유효 기간이 남은 이미지는 요청하지 않고,
+        지난 이미지는 조건부 GET을 보냄. body는 메모리에 모으지 않고 web_cash의 임시 파일에 바로 씀.
+
+        bundle이면 이미지마다 request를 보내지 않고 최대 BUNDLE_MAX_IMAGES개씩 묶어 (POST /images/batch)로 받음.
+        묶음들은 concurrency개의 연결로 나누어 동시에 받고, response는 BundleSplitter가 받는 대로 part별로 web_cash에 씀.
+        서버는 원본만 묶어 보내므로 size를 주면 bundle을 사용하지 않음.
+
+        urls : 이미지 경로 리스트. 같은 경로는 한 번만 받음
+        size : show_image의 크기와 같은 형식. 모든 이미지에 적용 (빈칸이면 원본)
+        concurrency : 동시에 받는 이미지(bundle이면 묶음) 수
+        bundle : True이면 (POST /images/batch)로 묶어서 받음
+
+        return : 결과별 이미지 수 dict
+            downloaded, not_modified(304), cached(요청하지 않음), not_found, unauthorized, failed'''
+        result = dict.fromkeys(("downloaded", "not_modified", "cached", "not_found", "unauthorized", "failed"), 0)
+        if not self._check_privilege():
+            result["unauthorized"] = len(urls)
+            return result
+
+        query = self._variant_query(size)
+        stale = [] # (url, web_cash key, CacheEntry or None)
+        for url in dict.fromkeys(urls): # 순서를 유지한 채 중복 제거
+            key = url + query # web_cash key (show_image와 같음)
+            entry = self.web_cache.lookup(key)
+            if entry is not None and self.web_cache.is_fresh(entry) and self.web_cache.exists(entry):
+                result["cached"] += 1
+                continue
+            stale.append((url, key, entry))
+
+        # 쿠키를 읽고 지우는 _create_request는 여기(한 thread)에서만 호출
+        if bundle and not query:
+            per_bundle = min(BUNDLE_MAX_IMAGES, max(1, -(-len(stale) // max(1, concurrency))))
+            jobs = []
+            for i in range(0, len(stale), per_bundle):
+                group = stale[i:i + per_bundle]
+                body = {"urls" : [url for (url, _, _) in group],
+                        "etags" : {url : entry.etag for (url, _, entry) in group if entry is not None and entry.etag}}
+                jobs.append(([url for (url, _, _) in group],
+                             self._create_request("POST", "/images/batch", headers=["Content-Type: application/json"], body=json.dumps(body))))
+            download = self._download_bundle
+        else:
+            jobs = [([key], self._create_request("GET", "/images" + query, headers=["Content-Type: image/jpg"] + self.web_cache.validators(entry),
+                                                 body=json.dumps({"url": url})))
+                    for (url, key, entry) in stale]
+            download = self._download_image
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(jobs) or 1))) as executor:
+            for statuses in executor.map(download, jobs):
+                for (key, status) in statuses.items():
+                    result[status] += 1
+                    if status == "not_found":
+                        print(f"이미지가 존재하지 않습니다. Image : {key}")
+                    elif status == "failed":
+                        print(f"이미지를 받지 못했습니다. Image : {key}")
+        self.web_cache.flush() # _download_image, _download_bundle은 index를 저장하지 않음
+        if result["unauthorized"]:
+            self._privileged_key = None
+            print("권한이 없습니다. 권한을 상승시켜 주세요.")
+        if MODE == 'debug':
+            print(f"download_images : {len(jobs)} requests in {time.perf_counter() - start:.2f}s")
+        return result
+
+    def list_images(self, after : str="", limit : int=None, prefix : str="", query : str="") -> dict:
+        '''
+        서버의 이미지 목록 한 page 요청 (GET /images/list)
+
+        after : 이전 page의 next. 빈칸이면 처음부터
+        limit : page의 이미지 수. None이면 서버 기본값 (100)
+        prefix : 이 문자열로 시작하는 이미지만 (EX) gallery/)
+        query : 이름에 이 문자열이 포함된 이미지만
+
+        return : {"images" : [{name, size, mtime, width, height, content_type, etag}, ...], "next" : str or None,
+                  "total" : int}. 권한이 없거나 실패하면 None'''
+        params = {name : value for (name, value) in (("after", after), ("limit", limit), ("prefix", prefix), ("q", query))
+                  if value}
+        path = "/images/list" + ("?" + urlencode(params) if params else "")
+        request = self._create_request("GET", path, headers=["Content-Type: application/json"], body="{}")
+        (headers, data) = self._exchange(request, bin_data=True)
+        if MODE == 'debug':
+            print(headers)
+
+        if "200 OK" in headers:
+            return json.loads(bytes(data))
+        if "401 Unauthorized" in headers: # key가 만료됨
+            self._privileged_key = None
+            print("권한이 없습니다. 권한을 상승시켜 주세요.")
+        elif "400 Bad Request" in headers:
+            print(f"잘못된 요청입니다. {bytes(data).decode(errors='replace')}")
+        else:
+            print("이미지 목록을 가져오지 못했습니다.")
+        return None
+
+    def _download_bundle(self, job : tuple) -> dict:
+        '''
+        (POST /images/batch)로 받은 bundle을 BundleSplitter로 나누어 part마다 web_cash에 저장 (worker thread에서 호출)
+
+        job : (url 리스트, _create_request로 만든 POST request)
+        return : url -> download_images의 결과 이름. bundle에서 받지 못한 url은 "failed"'''
+        (urls, request) = job
+        results = {}
+
+        def open_part(part : HttpResponse):
+            url = part.header("Content-Location")
+            if part.status_code != 200 or url not in urls:
+                return None
+            return open(self.web_cache.temp_path(url), "wb")
+
+        def close_part(part : HttpResponse, file) -> None:
+            url = part.header("Content-Location")
+            if file is not None:
+                file.close()
+                self.web_cache.store_file(url, part.head, file.name, flush=False)
+                results[url] = "downloaded"
+            elif part.status_code == 304:
+                results[url] = "not_modified" if self.web_cache.refresh(url, part.head, flush=False) is not None else "failed"
+            elif part.status_code == 404:
+                self.web_cache.remove(url, flush=False)
+                results[url] = "not_found"
+
+        splitter = BundleSplitter(open_part, close_part)
+        try:
+            (headers, _) = self._exchange(request, bin_data=True, sink=splitter)
+        except (OSError, ValueError) as e: # 형식이 잘못된 bundle, web_cash에 쓸 수 없음
+            if MODE == 'debug':
+                print(f"_download_bundle error: {e}")
+            headers = ""
+        finally:
+            splitter.seek(0) # 받다 만 part의 임시 파일을 닫음
+            for url in urls:
+                if url not in results and os.path.exists(self.web_cache.temp_path(url)):
+                    os.remove(self.web_cache.temp_path(url))
+        if headers and HttpResponse(headers).status_code == 401:
+            return dict.fromkeys(urls, "unauthorized")
+        return {url : results.get(url, "failed") for url in urls}
+
+    def _download_image(self, job : tuple) -> dict:
+        '''
+        download_images의 이미지 하나를 받아 web_cash에 저장 (worker thread에서 호출)
+
+        job : ([web_cash key], _create_request로 만든 GET request)
+        return : {web_cash key : download_images의 결과 이름}'''
+        ([key], request) = job
+        return {key : self._fetch_image(key, request)}
+
+    def _fetch_image(self, key : str, request : str) -> str:
+        '''
+        return : download_images의 결과 이름'''
+        tmp_path = self.web_cache.temp_path(key)
+        try:
+            with open(tmp_path, "wb") as file:
+                sink = DecodingSink(file) # Content-Encoding으로 압축된 body는 받는 대로 풀어서 저장
+                (headers, _) = self._exchange(request, bin_data=True, sink=sink)
+            status = HttpResponse(headers).status_code if headers else 0
+
+            if status == 200:
+                sink.finish()
+                self.web_cache.store_file(key, headers, tmp_path, flush=False)
+                return "downloaded"
+            if status == 304: # 서버의 이미지가 바뀌지 않음
+                return "not_modified" if self.web_cache.refresh(key, headers, flush=False) is not None else "failed"
+            if status == 404:
+                self.web_cache.remove(key, flush=False)
+                return "not_found"
+            if status == 401:
+                return "unauthorized"
+            return "failed"
+        except (OSError, ValueError) as e:
+            if MODE == 'debug':
+                print(f"_download_image error: {key} {e}")
+            return "failed"
+        finally:
+            if os.path.exists(tmp_path): # store_file이 옮기지 않은 임시 파일
+                os.remove(tmp_path)
+
+    def _check_privilege(self) -> bool:
+        '''
+        image를 보기 위해 id의 key가 유효한 지 확인 (HEAD /images)
+
+        확인한 key 쿠키가 바뀌지 않았고 유효 시간이 남았으면 다시 요청하지 않음.
+        권한이 없으면 안내를 출력
+
+        return : True if 권한이 있음 else False'''
+        key = self.session_cookie.get("key")
+        if key is not None and key["value"] == self._privileged_key and time.time() < key["expiry_time"]:
+            return True
+
         data = json.dumps({"username": self.id})
         check_privilege = self._create_request("HEAD", "/images", headers=["Content-Type: application/json"], body=data)
-        self._send_request(check_privilege)
-        privilege_response = self._response_handler()
+        privilege_response = self._exchange(check_privilege)
         if MODE == 'debug':
             print(privilege_response)
 
+        if "200 OK" in privilege_response:
+            self._privileged_key = self.session_cookie.get("key", {}).get("value")
+            return True
+        self._privileged_key = None
         if "401 Unauthorized" in privilege_response:
             print("권한이 없습니다. 권한을 상승시켜 주세요.")
-            return
-        
-        elif "200 OK" in privilege_response: # 200 OK
-            url = input("이미지 url을 입력하세요: ")
-            url_data = json.dumps({"url": url})
-            print(f"{url_data}")
-
-        if os.path.exists("web_cash/" + url): # web_cash
-            print('open in web cash..')
-            image = Image.open("web_cash/" + url)
-            image.show()
-            return
-        
         else:
-            request = self._create_request("GET", "/images", headers=["Content-Type: image/jpg"], body=url_data)
-            self._send_request(request)
-            (headers, image_data) = self._response_handler(bin_data=True)
-            if MODE == 'debug':
-                print(headers)
+            print("권한 확인에 실패했습니다.")
+        return False
 
-            if "404 Not Found" in headers:
-                print(f"이미지가 존재하지 않습니다. Image : {url}")
-                
-                
-            elif "200 OK" in headers:
-                image = Image.open(BytesIO(image_data))
-                image.show()
-                image.save("web_cash/" + url.split('.')[0] + ".jpg")
+    def _variant_query(self, size : str) -> str:
+        '''
+        "320x240" 형식의 크기를 /images의 query string으로 변환. 빈칸이면 ""'''
+        (width, _, height) = size.strip().lower().partition("x")
+        params = [f"{name}={value.strip()}" for (name, value) in (("w", width), ("h", height)) if value.strip()]
+        return "?" + "&".join(params) if params else ""
 
     def _is_domain(self, host : str) -> bool:
         '''
@@ -338,12 +642,71 @@ class Client(socket.socket):
             json.dump(session_cookies, file, indent=4)
 
 
-def main(host : str, port : int):
+def read_image_list(items : list) -> list:
+    '''
+    이미지 경로 리스트를 만듦. "@파일"은 목록 파일(manifest)의 경로들로 바꿈.
+    목록 파일은 한 줄에 경로 하나 (빈 줄과 #으로 시작하는 줄은 무시)이거나 경로의 JSON 배열
+
+    raise : OSError 목록 파일을 읽을 수 없음, ValueError 잘못된 JSON'''
+    urls = []
+    for item in items:
+        if not item.startswith("@"):
+            urls.append(item)
+            continue
+        with open(item[1:]) as f:
+            text = f.read()
+        if text.lstrip().startswith("["):
+            urls.extend(str(url) for url in json.loads(text))
+        else:
+            urls.extend(line.strip() for line in text.splitlines() if line.strip() and not line.lstrip().startswith("#"))
+    return urls
+
+
+def show_image_list(client : Client, prefix : str="", query : str="") -> None:
+    '''
+    이미지 목록을 한 page씩 출력. 다음 page가 있으면 Enter로 계속, 다른 입력이면 중단'''
+    after = ""
+    while True:
+        page = client.list_images(after, prefix=prefix, query=query)
+        if page is None:
+            return
+        for image in page["images"]:
+            size = f"{image['width']}x{image['height']}" if image["width"] else "?"
+            print(f"{image['name']:40s} {size:>11s} {image['size']:>10d} {image['content_type']}")
+        if page["next"] is None:
+            print(f"전체 이미지 {page['total']}개")
+            return
+        if input("다음 page (Enter, 그만 보려면 q): ").strip():
+            return
+        after = page["next"]
+
+
+def print_download_result(result : dict, elapsed : float) -> None:
+    summary = ", ".join(f"{name} {count}" for (name, count) in result.items() if count)
+    print(f"이미지 {sum(result.values())}개 ({elapsed:.2f}s) : {summary or '없음'}")
+
+
+def download(client : Client, items : list, size : str="", concurrency : int=DOWNLOAD_CONCURRENCY,
+             bundle : bool=False) -> None:
+    '''
+    items(이미지 경로, @목록 파일)의 이미지를 web_cash에 받고 결과를 출력'''
+    try:
+        urls = read_image_list(items)
+    except (OSError, ValueError) as e:
+        print(f"이미지 목록을 읽을 수 없습니다: {e}")
+        return
+    start = time.perf_counter()
+    result = client.download_images(urls, size, concurrency, bundle)
+    print_download_result(result, time.perf_counter() - start)
+
+
+def main(host : str, port : int, tls : bool=False, cafile : str=None, batch : list=None, size : str="",
+         concurrency : int=DOWNLOAD_CONCURRENCY, bundle : bool=False):
     '''
     회원가입, 로그인, 권한 상승, 이미지 보기 기능을 이용할 수 있는 클라이언트.
     실행 시 초기 화면으로 회원가입, 로그인 기능만 이용 가능.
-    로그인 시 권한 상승, 이미지 보기 기능 이용 가능.
-    이미지 보기 기능은 권한이 상승된 상태에서 이용 가능.
+    로그인 시 권한 상승, 이미지 보기, 이미지 일괄 다운로드 기능 이용 가능.
+    이미지 보기와 일괄 다운로드 기능은 권한이 상승된 상태에서 이용 가능.
     종료는 99를 눌러야 가능.
 
     회원가입부터 이미지 보기 절차 :
@@ -362,9 +725,23 @@ def main(host : str, port : int):
         ip address를 입력할 경우 server의 ip address를 str로 입력.
 
     port : server.py에 사용한 port와 같은 port를 사용
+
+    tls : True이면 HTTPS로 연결 (server.py --tls)
+    cafile : 서버 인증서를 검증할 CA 파일. self-signed 인증서는 server의 cert.pem. None이면 시스템 CA
+
+    batch : 이미지 경로(@목록 파일) 리스트. 주어지면 메뉴 없이 COOKIES_DB의 key 쿠키로
+            이미지들을 web_cash에 받고 종료 (권한 상승까지 마친 뒤 사용)
+    size : batch 이미지의 크기 (show_image와 같은 형식)
+    concurrency : batch 이미지를 동시에 받는 수
+    bundle : True이면 일괄 다운로드를 (POST /images/batch) 묶음으로 받음
     '''
 
-    with Client(host, port) as client:
+    with Client(host, port, tls_context=client_context(cafile) if tls else None) as client:
+
+        if batch:
+            client.load_cookies()
+            download(client, batch, size, concurrency, bundle)
+            return
 
         while True:
             print("사용할 서비스를 선택하세요:")
@@ -374,6 +751,8 @@ def main(host : str, port : int):
             else:
                 print("3. 권한 상승 요청 (PUT /)")
                 print("4. 이미지 보기 (GET /)")
+                print("5. 이미지 일괄 다운로드 (GET /)")
+                print("6. 이미지 목록 (GET /images/list)")
             print("99. 종료")
             user_input = input("> ")
             
@@ -397,6 +776,18 @@ def main(host : str, port : int):
                 # 이미지 다운로드 요청
                 client.show_image()
 
+            elif client.is_logined and user_input == "5":
+                # 여러 이미지를 web_cash에 다운로드
+                items = input("이미지 url들을 입력하세요 (공백으로 구분, @파일이면 목록 파일): ").split()
+                size = input("크기를 입력하세요 (EX) 320x240, 빈칸이면 원본): ")
+                download(client, items, size, concurrency, bundle)
+
+            elif client.is_logined and user_input == "6":
+                # 서버의 이미지 목록
+                prefix = input("디렉터리를 입력하세요 (EX) gallery/, 빈칸이면 전체): ")
+                query = input("검색어를 입력하세요 (빈칸이면 전체): ")
+                show_image_list(client, prefix, query)
+
             elif user_input == "99":
                 print("클라이언트를 종료합니다.")
                 break
@@ -409,13 +800,23 @@ def main(host : str, port : int):
 if __name__ == "__main__":
     '''
     system argument로 host, port를 받아옴.
-    sys.argv[1] : host
-    sys.argv[2] : port'''
-    if len(sys.argv) != 3:
-        print("Usage: {} <IP> <port>".format(sys.argv[0]))
-        sys.exit(1)
-    
-    server_host = sys.argv[1] # host
-    server_port = int(sys.argv[2]) # port
-
-    main(server_host, server_port)
+    argv[1] : host
+    argv[2] : port
+    --tls : HTTPS로 연결
+    --cafile : 서버 인증서를 검증할 CA 파일 (self-signed 인증서는 server/cert.pem)
+    --batch : 메뉴 없이 이미지들을 web_cash에 받고 종료. 이미지 경로 또는 @목록 파일 (EX) --batch a.jpg @gallery.txt
+    --size : --batch 이미지의 크기 (EX) 320x240)
+    --concurrency : --batch 이미지를 동시에 받는 수 (기본값 8)
+    --bundle : 일괄 다운로드를 이미지마다 요청하지 않고 (POST /images/batch) 묶음으로 받음'''
+    parser = argparse.ArgumentParser()
+    parser.add_argument("host")
+    parser.add_argument("port", type=int)
+    parser.add_argument("--tls", action="store_true")
+    parser.add_argument("--cafile", default=None)
+    parser.add_argument("--batch", nargs="+", default=None)
+    parser.add_argument("--size", default="")
+    parser.add_argument("--concurrency", type=int, default=DOWNLOAD_CONCURRENCY)
+    parser.add_argument("--bundle", action="store_true")
+    args = parser.parse_args()
+
+    main(args.host, args.port, args.tls, args.cafile, args.batch, args.size, args.concurrency, args.bundle)
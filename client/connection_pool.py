@@ -0,0 +1,134 @@
+import select
+import socket
+import ssl
+import threading
+import time
+from collections import deque
+
+IDLE_TIMEOUT = 10 # 이 시간(초) 이상 사용하지 않은 연결은 닫음. 서버가 먼저 닫지 않도록 서버의 IDLE_TIMEOUT(15초)보다 짧게
+MAX_IDLE_PER_HOST = 8 # host마다 유지하는 최대 idle 연결 수
+CONNECT_TIMEOUT = 5 # 연결 시도 timeout(초)
+ALPN_PROTOCOLS = ["http/1.1"]
+
+
+def client_context(cafile : str=None) -> ssl.SSLContext:
+    '''
+    HTTPS 연결용 SSLContext. 서버 인증서와 host 이름을 검증하고 ALPN으로 http/1.1을 요청함
+
+    cafile : 서버 인증서를 검증할 CA(PEM). self-signed 인증서는 그 인증서 파일. None이면 시스템 CA'''
+    context = ssl.create_default_context(cafile=cafile)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    context.set_alpn_protocols(ALPN_PROTOCOLS)
+    return context
+
+
+class ConnectionPool:
+    '''
+    (host, port)별 keep-alive 연결 pool.
+
+    acquire로 연결을 빌리고, 응답을 다 읽은 뒤 release로 돌려주면 다음 요청에서 재사용함.
+    idle 상태로 IDLE_TIMEOUT이 지난 연결은 버림.
+    빌려주기 전에 연결이 살아있는 지 확인하여(health check) 서버가 닫은 연결은 버리고 새로 연결함.
+    여러 thread에서 동시에 사용할 수 있음.
+
+    ssl_context를 주면 새 연결마다 TLS handshake를 함. 연결을 돌려받을 때 (host, port)별로 마지막 TLS session을
+    기억해 두고, 다음 새 연결에서 그 session으로 재개(resumption)하여 인증서 검증과 key 교환을 생략함.
+    '''
+    def __init__(self, idle_timeout : float=IDLE_TIMEOUT, max_idle_per_host : int=MAX_IDLE_PER_HOST,
+                 connect_timeout : float=CONNECT_TIMEOUT, ssl_context : ssl.SSLContext=None):
+        '''
+        ssl_context : client_context(). None이면 평문 연결'''
+        self.idle_timeout = idle_timeout
+        self.max_idle_per_host = max_idle_per_host
+        self.connect_timeout = connect_timeout
+        self.ssl_context = ssl_context
+
+        self._idle = {} # (host, port) -> deque of (socket, 마지막 사용 시각)
+        self._tls_sessions = {} # (host, port) -> 재개할 ssl.SSLSession
+        self._lock = threading.Lock()
+
+    def acquire(self, host : str, port : int) -> socket.socket:
+        '''
+        idle 연결 중 살아있는 연결을 반환. 없으면 새로 연결
+
+        return : socket.socket'''
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                idle = self._idle.get((host, port))
+                if not idle:
+                    break
+                (sock, last_used) = idle.pop() # 가장 최근에 사용한 연결부터
+            if now - last_used < self.idle_timeout and self._is_healthy(sock):
+                sock.reused = True
+                return sock
+            sock.close()
+
+        return self.connect(host, port)
+
+    def connect(self, host : str, port : int) -> socket.socket:
+        '''
+        새 연결 생성. ssl_context가 있으면 기억해 둔 session으로 TLS handshake
+
+        return : socket.socket or ssl.SSLSocket (session_reused로 재개 여부 확인)'''
+        sock = _PooledSocket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.settimeout(self.connect_timeout)
+        try:
+            sock.connect((host, port))
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1) # TLS handshake 메세지도 바로 보내도록
+            if self.ssl_context is not None:
+                sock = self.ssl_context.wrap_socket(sock, server_hostname=host,
+                                                    session=self._tls_sessions.get((host, port)))
+        except BaseException:
+            sock.close()
+            raise
+        sock.settimeout(None)
+        sock.reused = False
+        return sock
+
+    def release(self, host : str, port : int, sock : socket.socket) -> None:
+        '''
+        응답을 모두 읽은 연결을 pool에 돌려줌.
+        TLS 1.3 session ticket은 handshake 후 첫 응답과 함께 오므로 여기서 session을 기억함'''
+        session = getattr(sock, "session", None)
+        with self._lock:
+            if session is not None:
+                self._tls_sessions[(host, port)] = session
+            idle = self._idle.setdefault((host, port), deque())
+            if len(idle) < self.max_idle_per_host:
+                idle.append((sock, time.monotonic()))
+                return
+        sock.close()
+
+    def discard(self, sock : socket.socket) -> None:
+        '''
+        오류가 난 연결은 pool에 돌려주지 않고 닫음'''
+        sock.close()
+
+    def close(self) -> None:
+        '''
+        모든 idle 연결을 닫음'''
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for (sock, _) in connections:
+                sock.close()
+
+    def _is_healthy(self, sock : socket.socket) -> bool:
+        '''
+        idle 연결은 읽을 data가 없어야 정상.
+        읽을 수 있는 상태라면 서버가 연결을 닫았거나(EOF) 예상하지 못한 data가 남아있는 것이므로 사용하지 않음.
+        TLS 연결은 이미 복호화되어 buffer에 남은 data(pending)도 확인'''
+        if isinstance(sock, ssl.SSLSocket) and sock.pending():
+            return False
+        try:
+            readable, _, _ = select.select([sock], [], [], 0)
+        except (OSError, ValueError):
+            return False
+        return not readable
+
+
+class _PooledSocket(socket.socket):
+    '''
+    pool에서 재사용된 연결인지(reused) 표시할 수 있는 socket'''
+    reused = False
@@ -0,0 +1,428 @@
+import gzip
+import socket
+import zlib
+
+try: # 선택 의존성. 설치되어 있으면 Accept-Encoding에 추가
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+RECV_BUFFER_SIZE = 64 * 1024 # recv_into에 사용하는 buffer 크기
+MAX_HEADER_SIZE = 64 * 1024 # status line + header 최대 크기
+
+HEADER_END = b"\r\n\r\n"
+
+# 요청의 Accept-Encoding. decode_body가 풀 수 있는 coding만 보냄
+ACCEPT_ENCODING = ", ".join(coding for coding in ("zstd", "br", "gzip", "deflate")
+                            if (coding != "zstd" or zstandard is not None) and (coding != "br" or brotli is not None))
+
+
+class HttpResponse:
+    '''
+    서버로부터 받은 HTTP response
+
+    status : "200 OK" 형태의 상태
+    status_code : 200
+    head : status line과 header (string)
+    headers : 소문자 header 이름 -> 값 dict
+    header_list : (이름, 값) 리스트. Set-Cookie처럼 여러 번 오는 header용
+    body : bytearray. sink로 받았으면 None'''
+    __slots__ = ("status", "status_code", "head", "headers", "header_list", "body")
+
+    def __init__(self, head : str):
+        self.head = head
+        lines = head.split("\r\n")
+        parts = lines[0].split(" ", 1)
+        self.status = parts[1] if len(parts) > 1 else ""
+        self.status_code = int(self.status.split(" ", 1)[0]) if self.status[:3].isdigit() else 0
+        self.header_list = []
+        self.headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(":")
+            if sep:
+                self.header_list.append((name.strip(), value.strip()))
+                self.headers[name.strip().lower()] = value.strip()
+        self.body = None
+
+    def header(self, name : str, default : str=None) -> str:
+        return self.headers.get(name.lower(), default)
+
+
+def read_response(conn : socket.socket, sink=None, head_only : bool=False) -> HttpResponse:
+    '''
+    연결에서 response 하나를 읽음.
+
+    body는 Content-Length(또는 chunked encoding)로 경계를 나누어 정확히 한 response만 읽으므로
+    keep-alive 연결에 다음 response가 섞이지 않음.
+    Content-Length body는 미리 할당한 bytearray에 recv_into로 바로 받아 추가 복사가 없음.
+    sink(write 메서드가 있는 파일 등)를 주면 body를 메모리에 모으지 않고 고정 크기 buffer로 받아 바로 씀.
+
+    conn : 요청을 보낸 연결
+    sink : body를 쓸 file object. None이면 response.body에 저장.
+           DecodingSink이면 header를 읽은 뒤 Content-Encoding을 알려 압축된 body를 받는 대로 풀어 씀
+    head_only : True이면 body가 없는 response (HEAD 요청, Content-Length만 참고)
+
+    return : HttpResponse
+    raise : ConnectionError (응답을 다 받기 전에 연결이 끊어짐)'''
+    buffer = bytearray(RECV_BUFFER_SIZE)
+    view = memoryview(buffer)
+
+    # header
+    data = bytearray(getattr(conn, "buffered", b""))
+    _set_buffered(conn, b"")
+    scan_from = 0
+    while True:
+        end = data.find(HEADER_END, scan_from)
+        if end >= 0:
+            break
+        if len(data) > MAX_HEADER_SIZE:
+            raise ConnectionError("Response header too large")
+        scan_from = max(0, len(data) - len(HEADER_END) + 1)
+        size = conn.recv_into(buffer)
+        if not size:
+            raise ConnectionError("Connection closed by server")
+        data += view[:size]
+
+    response = HttpResponse(data[:end].decode("latin-1"))
+    rest = memoryview(data)[end + len(HEADER_END):]
+
+    if head_only or response.status_code in (204, 304) or 100 <= response.status_code < 200:
+        _set_buffered(conn, bytes(rest))
+        return response
+    if isinstance(sink, DecodingSink):
+        sink.start(response)
+
+    if "chunked" in response.header("Transfer-Encoding", "").lower():
+        response.body = _read_chunked(conn, rest, sink, buffer)
+        return response
+
+    length = response.header("Content-Length")
+    if length is None: # 연결이 끊어질 때까지 body
+        response.body = _read_until_close(conn, rest, sink, buffer)
+        return response
+
+    length = int(length)
+    if len(rest) > length: # 다음 response의 앞부분
+        _set_buffered(conn, bytes(rest[length:]))
+        rest = rest[:length]
+
+    if sink is not None:
+        sink.write(rest)
+        remaining = length - len(rest)
+        while remaining:
+            size = conn.recv_into(buffer, min(remaining, len(buffer)))
+            if not size:
+                raise ConnectionError("Connection closed by server")
+            sink.write(view[:size])
+            remaining -= size
+        return response
+
+    body = bytearray(length)
+    body_view = memoryview(body)
+    received = len(rest)
+    body_view[:received] = rest
+    while received < length:
+        size = conn.recv_into(body_view[received:])
+        if not size:
+            raise ConnectionError("Connection closed by server")
+        received += size
+    response.body = body
+    return response
+
+
+def _set_buffered(conn : socket.socket, data : bytes) -> None:
+    '''
+    response 뒤에 이어서 받은 data를 연결에 남겨 다음 read_response에서 사용'''
+    try:
+        conn.buffered = data
+    except AttributeError: # 속성을 붙일 수 없는 socket.socket
+        if data:
+            raise
+
+
+class _Stream:
+    '''
+    chunked body를 읽을 때 사용하는 작은 reader. 앞서 받은 data(rest)를 먼저 사용함'''
+    def __init__(self, conn : socket.socket, rest, buffer : bytearray):
+        self.conn = conn
+        self.data = bytearray(rest)
+        self.pos = 0
+        self.buffer = buffer
+
+    def _fill(self) -> None:
+        if self.pos:
+            del self.data[:self.pos]
+            self.pos = 0
+        size = self.conn.recv_into(self.buffer)
+        if not size:
+            raise ConnectionError("Connection closed by server")
+        self.data += memoryview(self.buffer)[:size]
+
+    def readline(self) -> bytes:
+        while True:
+            end = self.data.find(b"\r\n", self.pos)
+            if end >= 0:
+                line = bytes(self.data[self.pos:end])
+                self.pos = end + 2
+                return line
+            self._fill()
+
+    def read(self, size : int):
+        '''
+        최대 size 바이트를 반환 (buffer에 있는 만큼)'''
+        if self.pos >= len(self.data):
+            self._fill()
+        chunk = memoryview(self.data)[self.pos:self.pos + size]
+        self.pos += len(chunk)
+        return chunk
+
+    def leftover(self) -> bytes:
+        return bytes(self.data[self.pos:])
+
+
+def _read_chunked(conn : socket.socket, rest, sink, buffer : bytearray):
+    '''
+    Transfer-Encoding: chunked body를 읽음'''
+    stream = _Stream(conn, rest, buffer)
+    body = bytearray() if sink is None else None
+    while True:
+        size = int(stream.readline().split(b";", 1)[0], 16)
+        if size == 0:
+            while stream.readline(): # trailer
+                pass
+            break
+        while size:
+            chunk = stream.read(size)
+            if sink is not None:
+                sink.write(chunk)
+            else:
+                body += chunk
+            size -= len(chunk)
+            chunk.release()
+        stream.readline() # chunk 끝의 \r\n
+    _set_buffered(conn, stream.leftover())
+    return body
+
+
+def _read_until_close(conn : socket.socket, rest, sink, buffer : bytearray):
+    '''
+    Content-Length가 없는 body. 연결이 끊어질 때까지 읽음'''
+    body = bytearray() if sink is None else None
+    view = memoryview(buffer)
+    chunk = rest
+    while True:
+        if sink is not None:
+            sink.write(chunk)
+        else:
+            body += chunk
+        size = conn.recv_into(buffer)
+        if not size:
+            break
+        chunk = view[:size]
+    return body
+
+
+class BundleSplitter:
+    '''
+    multipart/mixed bundle(POST /images/batch) body를 받는 대로 part별로 나누는 sink.
+    read_response(conn, sink=splitter)로 사용하므로 bundle 전체를 메모리에 모으지 않음.
+
+    모든 part에 Content-Length가 있는 bundle만 처리하며, part body는 boundary를 찾지 않고 길이만큼 그대로 넘김.
+    boundary는 body의 첫 줄에서 읽음 (서버는 preamble을 보내지 않음). 첫 줄이 boundary가 아니면(에러 response)
+    bundle이 아닌 것으로 보고 나머지 body를 무시함 (boundary는 None).
+    part는 Status header(없으면 200 OK)를 status로 하는 HttpResponse로 만들어 전달함.
+
+    open_part(part : HttpResponse) -> file object or None : part header를 받으면 호출. body를 쓸 file을 반환
+    close_part(part : HttpResponse, file) : part body를 다 받으면 호출
+
+    done : 마지막 boundary까지 받았거나 bundle이 아님'''
+    def __init__(self, open_part, close_part):
+        self.open_part = open_part
+        self.close_part = close_part
+        self._file = None
+        self.seek(0)
+
+    def write(self, data) -> None:
+        data = memoryview(data)
+        while data and not self.done:
+            if self._remaining is None: # boundary와 part header
+                self._pending += data
+                data = self._parse_head()
+                continue
+            size = min(self._remaining, len(data))
+            if self._file is not None:
+                self._file.write(data[:size])
+            self._remaining -= size
+            data = data[size:]
+            if not self._remaining:
+                (part, file) = (self._part, self._file)
+                (self._part, self._file, self._remaining) = (None, None, None)
+                self.close_part(part, file)
+
+    def seek(self, offset : int) -> None:
+        '''
+        처음부터 다시 받음 (Client._exchange가 끊어진 연결로 받은 일부를 버릴 때). 받던 part의 file은 닫고 버림'''
+        if self._file is not None:
+            self._file.close()
+        self.boundary = None
+        self.done = False
+        self._pending = bytearray()
+        self._part = None
+        self._file = None
+        self._remaining = None # 받고 있는 part body의 남은 크기. None이면 header를 받는 중
+
+    def truncate(self) -> None:
+        pass
+
+    def _parse_head(self) -> memoryview:
+        '''
+        self._pending에서 (앞 part 끝의 CRLF,) boundary 줄과 part header를 찾아 part를 시작함
+
+        return : 다음에 처리할 data (part body의 앞부분). 아직 header를 다 받지 못했으면 빈 data
+        raise : ValueError 형식이 잘못된 bundle'''
+        pending = self._pending
+        start = 2 if pending[:2] == b"\r\n" else 0 # 앞 part body 끝의 \r\n
+        line_end = pending.find(b"\r\n", start)
+        if line_end < 0:
+            if len(pending) > MAX_HEADER_SIZE:
+                raise ValueError("Invalid bundle boundary")
+            return memoryview(b"")
+        line = bytes(pending[start:line_end])
+        if self.boundary is None:
+            if not line.startswith(b"--"): # bundle이 아닌 body
+                self.done = True
+                return memoryview(b"")
+            self.boundary = line[2:]
+        if line == b"--" + self.boundary + b"--":
+            self.done = True
+            return memoryview(b"")
+        if line != b"--" + self.boundary:
+            raise ValueError("Invalid bundle boundary")
+
+        end = pending.find(HEADER_END, line_end)
+        if end < 0:
+            if len(pending) > MAX_HEADER_SIZE:
+                raise ValueError("Bundle part header too large")
+            return memoryview(b"")
+        head = pending[line_end + 2:end].decode("latin-1")
+        status = HttpResponse("\r\n" + head).header("Status", "200 OK")
+        part = HttpResponse(f"HTTP/1.1 {status}\r\n{head}")
+        rest = bytes(pending[end + len(HEADER_END):])
+        self._pending = bytearray()
+        try:
+            self._remaining = int(part.header("Content-Length"))
+        except (TypeError, ValueError):
+            raise ValueError("Bundle part without Content-Length") from None
+        file = self.open_part(part)
+        if self._remaining:
+            (self._part, self._file) = (part, file)
+        else: # body 없는 part (304, 404)
+            self._remaining = None
+            self.close_part(part, file)
+        return memoryview(rest)
+
+
+class DecodingSink:
+    '''
+    Content-Encoding(zstd, br, gzip, deflate)으로 압축된 body를 받는 대로 풀어 file에 쓰는 sink.
+    read_response가 header를 읽은 뒤 start(response)를 호출하며, 압축되지 않은 body는 그대로 씀.
+    압축된 body 전체를 메모리나 디스크에 모았다가 푸는 decode_body와 달리 한 번에 받은 조각만큼만 메모리를 사용함.
+
+    풀 수 없는 data를 받아도 연결에서 response는 끝까지 읽어야 하므로 write에서는 예외를 내지 않고,
+    body를 다 받은 뒤 finish()가 ValueError를 냄
+    '''
+    def __init__(self, file):
+        '''
+        file : 푼 body를 쓸 file object (seek, truncate 지원)'''
+        self.file = file
+        self._decompress = None # 조각을 푸는 함수. None이면 압축되지 않은 body
+        self._decoder = None
+        self._error = None
+
+    def start(self, response : HttpResponse) -> None:
+        '''
+        response의 Content-Encoding으로 decoder를 만듦'''
+        coding = response.header("Content-Encoding", "identity").strip().lower()
+        (self._decompress, self._decoder, self._error) = (None, None, None)
+        if coding == "identity":
+            return
+        if coding in ("gzip", "deflate"):
+            self._decoder = zlib.decompressobj(wbits=31 if coding == "gzip" else zlib.MAX_WBITS)
+            self._decompress = self._inflate
+        elif coding == "br" and brotli is not None:
+            self._decoder = brotli.Decompressor()
+            self._decompress = self._decoder.process
+        elif coding == "zstd" and zstandard is not None:
+            self._decoder = zstandard.ZstdDecompressor().decompressobj()
+            self._decompress = self._decoder.decompress
+        else:
+            self._error = f"Unsupported Content-Encoding: {coding}"
+
+    def write(self, data) -> None:
+        if self._error is not None: # 남은 body는 버림
+            return
+        if self._decompress is None:
+            self.file.write(data)
+            return
+        try:
+            self.file.write(self._decompress(data))
+        except Exception as e: # zlib.error, brotli.error, zstandard.ZstdError
+            self._error = f"Invalid body: {e}"
+
+    def _inflate(self, data) -> bytes:
+        '''
+        zlib decoder는 RECV_BUFFER_SIZE씩 나누어 푼 결과를 바로 씀 (0이 이어지는 작은 조각이 크게 풀려도 메모리는 일정)'''
+        decoder = self._decoder
+        chunk = decoder.decompress(data, RECV_BUFFER_SIZE)
+        while decoder.unconsumed_tail:
+            self.file.write(chunk)
+            chunk = decoder.decompress(decoder.unconsumed_tail, RECV_BUFFER_SIZE)
+        return chunk
+
+    def finish(self) -> None:
+        '''
+        body를 다 받은 뒤 호출
+
+        raise : ValueError 지원하지 않는 coding이거나 압축된 data가 잘못되었거나 중간에 끊김'''
+        if self._error is not None:
+            raise ValueError(self._error)
+        if not getattr(self._decoder, "eof", True): # zlib, zstandard
+            raise ValueError("Invalid body: compressed data is truncated")
+
+    def seek(self, offset : int) -> int:
+        '''
+        다시 받을 때(_exchange의 재시도) 처음부터 씀. decoder는 다음 response의 start에서 새로 만듦'''
+        (self._decompress, self._decoder, self._error) = (None, None, None)
+        return self.file.seek(offset)
+
+    def truncate(self, size : int=None) -> int:
+        return self.file.truncate(size)
+
+
+def decode_body(response : HttpResponse) -> None:
+    '''
+    Content-Encoding(zstd, br, gzip, deflate)으로 압축된 response.body를 풀어 바꿈.
+    sink로 받은 response(body가 None)는 그대로 둠
+
+    raise : ValueError 지원하지 않는 coding이거나 압축된 data가 잘못됨'''
+    coding = response.header("Content-Encoding", "identity").strip().lower()
+    if response.body is None or coding == "identity":
+        return
+    try:
+        if coding == "gzip":
+            body = gzip.decompress(response.body)
+        elif coding == "deflate":
+            body = zlib.decompress(response.body)
+        elif coding == "br" and brotli is not None:
+            body = brotli.decompress(bytes(response.body))
+        elif coding == "zstd" and zstandard is not None:
+            body = zstandard.ZstdDecompressor().decompress(response.body)
+        else:
+            raise ValueError(f"Unsupported Content-Encoding: {coding}")
+    except (OSError, EOFError, zlib.error) as e: # gzip.BadGzipFile은 OSError
+        raise ValueError(f"Invalid {coding} body: {e}") from None
+    response.body = bytearray(body)
@@ -0,0 +1,284 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from response_reader import HttpResponse
+
+WEB_CACHE_DIR = "web_cash" # 다운로드한 이미지를 저장하는 디렉터리
+WEB_CACHE_BYTES = 256 * 1024 * 1024 # web_cash 전체 최대 크기
+INDEX_FILE = "index.json" # url -> entry 정보 (web_cash 안에 저장)
+
+_EXTENSION = re.compile(r"^\.[A-Za-z0-9]{1,8}$")
+_CACHE_FILE = re.compile(r"^[0-9a-f]{64}(\.[A-Za-z0-9]{1,8})?(\.tmp)?$") # web_cash가 만든 파일 이름
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+class CacheEntry:
+    '''
+    web_cash에 저장된 response 하나
+
+    url : 요청한 url (cache key)
+    filename : web_cash 안의 파일 이름
+    size : body 크기
+    etag : ETag header (없으면 None)
+    last_modified : Last-Modified header (없으면 None)
+    content_type : Content-Type header
+    expires : 이 시각(time.time)까지는 서버에 확인하지 않고 사용'''
+    __slots__ = ("url", "filename", "size", "etag", "last_modified", "content_type", "expires")
+
+    def __init__(self, url : str, filename : str, size : int, etag : str=None, last_modified : str=None,
+                 content_type : str=None, expires : float=0):
+        self.url = url
+        self.filename = filename
+        self.size = size
+        self.etag = etag
+        self.last_modified = last_modified
+        self.content_type = content_type
+        self.expires = expires
+
+    def to_dict(self) -> dict:
+        return {name : getattr(self, name) for name in self.__slots__}
+
+
+class WebCache:
+    '''
+    client의 on-disk HTTP cache (web_cash).
+
+    요청한 url을 그대로 key로 사용하고 받은 body를 다시 인코딩하지 않고 그대로 저장함.
+    url -> CacheEntry index를 메모리에 유지하여 cache 확인에 디스크를 뒤지지 않음.
+    Cache-Control: max-age 동안은 서버에 묻지 않고 사용하고,
+    이후에는 ETag/Last-Modified로 조건부 GET(If-None-Match/If-Modified-Since)을 보내 304이면 그대로 사용.
+    전체 크기가 max_bytes를 넘으면 가장 오래 사용하지 않은 entry부터 제거 (LRU).
+    여러 thread에서 동시에 사용할 수 있음.
+    '''
+    def __init__(self, directory : str=WEB_CACHE_DIR, max_bytes : int=WEB_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.size = 0
+
+        self._entries = OrderedDict() # url -> CacheEntry. 앞쪽이 오래 사용하지 않은 entry
+        self._lock = threading.Lock()
+        self._dirty = False # index 파일에 저장하지 않은 변경(사용 순서 포함)이 있는 지
+
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def lookup(self, url : str) -> CacheEntry:
+        '''
+        url의 entry를 반환. 없으면 None'''
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                self._entries.move_to_end(url)
+                self._dirty = True
+            return entry
+
+    def is_fresh(self, entry : CacheEntry) -> bool:
+        '''
+        서버에 확인하지 않고 사용해도 되는 지'''
+        return time.time() < entry.expires
+
+    def read(self, entry : CacheEntry) -> bytes:
+        '''
+        entry의 body를 읽음. 파일이 사라졌으면 entry를 지우고 None 반환'''
+        try:
+            with open(os.path.join(self.directory, entry.filename), "rb") as f:
+                data = f.read()
+        except OSError:
+            data = None
+        if data is None or len(data) != entry.size:
+            self.remove(entry.url)
+            return None
+        return data
+
+    def exists(self, entry : CacheEntry) -> bool:
+        '''
+        entry의 파일이 온전히 남아 있는 지 (body를 읽지 않고 크기만 확인). 아니면 entry를 지움'''
+        try:
+            if os.path.getsize(os.path.join(self.directory, entry.filename)) == entry.size:
+                return True
+        except OSError:
+            pass
+        self.remove(entry.url)
+        return False
+
+    def validators(self, entry : CacheEntry) -> list:
+        '''
+        조건부 GET에 붙일 header 리스트. entry가 None이면 빈 리스트'''
+        headers = []
+        if entry is not None:
+            if entry.etag:
+                headers.append(f"If-None-Match: {entry.etag}")
+            if entry.last_modified:
+                headers.append(f"If-Modified-Since: {entry.last_modified}")
+        return headers
+
+    def store(self, url : str, head : str, data, flush : bool=True) -> CacheEntry:
+        '''
+        200 response의 body를 저장.
+
+        url : 요청한 url
+        head : response의 status line과 header
+        data : body (bytes, bytearray)
+        flush : False이면 index를 파일에 저장하지 않음 (여러 entry를 저장한 뒤 flush()를 한 번 호출)
+
+        return : 저장한 CacheEntry. 저장하지 않았으면(no-store, 너무 큼) None'''
+        if len(data) > self.max_bytes:
+            self.remove(url, flush)
+            return None
+        tmp_path = self.temp_path(url)
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        return self.store_file(url, head, tmp_path, flush)
+
+    def temp_path(self, url : str) -> str:
+        '''
+        url의 body를 받아 쓸 임시 파일 경로. 다 쓴 뒤 store_file로 cache에 넣음'''
+        return os.path.join(self.directory, self._filename(url) + ".tmp")
+
+    def store_file(self, url : str, head : str, tmp_path : str, flush : bool=True) -> CacheEntry:
+        '''
+        temp_path(url)에 받아 둔 200 response의 body를 cache 파일로 옮겨 저장 (body를 메모리에 올리지 않음).
+        저장하지 않으면 임시 파일을 지움
+
+        return : 저장한 CacheEntry. 저장하지 않았으면(no-store, 너무 큼) None'''
+        response = HttpResponse(head)
+        cache_control = response.header("Cache-Control", "").lower()
+        size = os.path.getsize(tmp_path)
+        if "no-store" in cache_control or size > self.max_bytes:
+            os.remove(tmp_path)
+            self.remove(url, flush)
+            return None
+
+        entry = CacheEntry(url, self._filename(url), size, response.header("ETag"),
+                           response.header("Last-Modified"), response.header("Content-Type"),
+                           self._expires(cache_control))
+        os.replace(tmp_path, os.path.join(self.directory, entry.filename))
+
+        with self._lock:
+            old = self._entries.pop(url, None)
+            if old is not None:
+                self.size -= old.size
+            self._entries[url] = entry
+            self.size += entry.size
+            evicted = self._evict()
+            self._dirty = True
+        self._remove_files(evicted)
+        if flush:
+            self.flush()
+        return entry
+
+    def refresh(self, url : str, head : str, flush : bool=True) -> CacheEntry:
+        '''
+        304 Not Modified를 받은 entry의 유효 시간과 validator를 갱신
+
+        return : 갱신한 CacheEntry. entry가 없으면 None'''
+        response = HttpResponse(head)
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                return None
+            entry.expires = self._expires(response.header("Cache-Control", "").lower())
+            entry.etag = response.header("ETag", entry.etag)
+            entry.last_modified = response.header("Last-Modified", entry.last_modified)
+            self._dirty = True
+        if flush:
+            self.flush()
+        return entry
+
+    def remove(self, url : str, flush : bool=True) -> None:
+        with self._lock:
+            entry = self._entries.pop(url, None)
+            if entry is None:
+                return
+            self.size -= entry.size
+            self._dirty = True
+        self._remove_files([entry])
+        if flush:
+            self.flush()
+
+    def flush(self) -> None:
+        '''
+        index를 INDEX_FILE에 저장 (임시 파일에 쓴 뒤 os.replace)'''
+        with self._lock:
+            if not self._dirty:
+                return
+            index = [entry.to_dict() for entry in self._entries.values()] # LRU 순서
+            self._dirty = False
+        path = os.path.join(self.directory, INDEX_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(index, f)
+        os.replace(path + ".tmp", path)
+
+    def close(self) -> None:
+        '''
+        사용 순서를 index에 저장'''
+        self.flush()
+
+    def _load(self) -> None:
+        '''
+        INDEX_FILE을 읽어 index를 만듦.
+        파일이 사라진 entry는 버리고, index에 없는 cache 파일은 지움'''
+        try:
+            with open(os.path.join(self.directory, INDEX_FILE)) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = []
+
+        for item in index:
+            try:
+                entry = CacheEntry(**item)
+                if os.path.getsize(os.path.join(self.directory, entry.filename)) != entry.size:
+                    continue
+            except (OSError, TypeError):
+                continue
+            self._entries[entry.url] = entry
+            self.size += entry.size
+
+        known = {entry.filename for entry in self._entries.values()}
+        for name in os.listdir(self.directory):
+            if _CACHE_FILE.match(name) and name not in known: # 이전 실행에서 index에 기록되지 못한 파일
+                self._remove_files([CacheEntry("", name, 0)])
+
+        self._remove_files(self._evict()) # max_bytes가 줄어든 경우
+        self._dirty = len(self._entries) != len(index)
+
+    def _evict(self) -> list:
+        '''
+        max_bytes를 넘지 않을 때까지 LRU entry를 index에서 제거. self._lock을 잡은 상태에서 호출
+
+        return : 제거한 entry 리스트 (파일은 호출한 쪽에서 지움)'''
+        evicted = []
+        while self.size > self.max_bytes:
+            (_, entry) = self._entries.popitem(last=False)
+            self.size -= entry.size
+            evicted.append(entry)
+        return evicted
+
+    def _remove_files(self, entries : list) -> None:
+        for entry in entries:
+            try:
+                os.remove(os.path.join(self.directory, entry.filename))
+            except OSError:
+                pass
+
+    def _filename(self, url : str) -> str:
+        '''
+        url의 hash를 파일 이름으로 사용 (디렉터리나 특수 문자가 포함된 url도 저장 가능).
+        원래 확장자는 그대로 붙임'''
+        ext = os.path.splitext(url)[1]
+        if not _EXTENSION.match(ext):
+            ext = ""
+        return hashlib.sha256(url.encode()).hexdigest() + ext
+
+    def _expires(self, cache_control : str) -> float:
+        '''
+        Cache-Control의 max-age로 유효 시각 계산. 없으면 매번 서버에 확인'''
+        if "no-cache" in cache_control:
+            return 0
+        match = _MAX_AGE.search(cache_control)
+        return time.time() + int(match.group(1)) if match else 0
@@ -0,0 +1,223 @@
+import asyncio
+import resource
+import signal
+
+from http_parser import RequestParser, HttpParseError, RECV_BUFFER_SIZE
+from file_cache import FileBody, BundleBody
+from log_writer import WARNING
+from tls import HANDSHAKE_TIMEOUT
+
+DEFAULT_ASYNC_MAX_CONNECTIONS = 10000 # asyncio mode에서 동시에 유지하는 최대 연결 수
+DRAIN_POLL_INTERVAL = 0.05 # drain 중 남은 연결 수를 확인하는 주기(초)
+
+
+def _raise_nofile_limit(max_connections : int) -> None:
+    '''
+    max_connections개의 socket을 열 수 있도록 fd soft limit을 hard limit까지 올림'''
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = max_connections + 64 # listen socket, log file 등 여유분
+    if soft != resource.RLIM_INFINITY and soft < wanted:
+        new_soft = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (new_soft, hard))
+
+
+class AsyncEngine:
+    '''
+    asyncio event loop 기반 connection engine.
+
+    Server의 listen socket과 request_handler를 그대로 사용하고,
+    연결마다 OS thread를 두지 않고 coroutine으로 처리함.
+    idle keep-alive 연결은 event loop에 등록만 되어 있으므로 연결 수가 많아도 thread가 늘어나지 않음.
+    '''
+    def __init__(self, server, max_connections : int=DEFAULT_ASYNC_MAX_CONNECTIONS):
+        '''
+        server : 이미 bind/listen된 Server 인스턴스
+        max_connections : 동시에 유지하는 최대 연결 수. 초과한 연결은 바로 닫음'''
+        self.server = server
+        self.max_connections = max_connections
+        self.active_connections = 0
+        self._idle = set() # 다음 request를 기다리는 연결의 StreamWriter
+        self._forced = False # drain 중에 signal을 다시 받음
+
+    async def client_handler(self, reader : asyncio.StreamReader, writer : asyncio.StreamWriter) -> None:
+        '''
+        Server.client_handler의 asyncio 버전.
+        request 처리는 default executor에서 Server.request_handler로 실행하여
+        users.json 읽기/쓰기가 event loop를 막지 않도록 함.
+        timeout과 연결을 닫는 조건은 Server._serve_connection과 같음.'''
+        addr = writer.get_extra_info("peername")
+        if self.active_connections >= self.max_connections:
+            writer.close()
+            return
+
+        server = self.server
+        self.active_connections += 1
+        server.metrics.connection_opened()
+        server.log_message(f"[{addr[0]}] is accept.")
+        loop = asyncio.get_running_loop()
+        parser = RequestParser()
+        served = 0
+        deadline = None # 받고 있는 request의 read deadline
+        reason = "client"
+        try:
+            while True:
+                if deadline is None:
+                    if server.draining.is_set() and served:
+                        reason = "drain"
+                        break
+                    self._idle.add(writer) # drain이 시작되면 닫음
+                    timeout = server.idle_timeout
+                else:
+                    timeout = deadline - loop.time()
+                try:
+                    data = await asyncio.wait_for(reader.read(RECV_BUFFER_SIZE), max(0, timeout)) # 클라이언트로부터 데이터 수신
+                except asyncio.TimeoutError:
+                    if deadline is None:
+                        reason = "idle_timeout"
+                        break
+                    server.log_message(f"[{addr[0]}] request timed out", WARNING)
+                    (response, _) = server._create_response_str("408 Request Timeout", body="Request timeout")
+                    await self._send_with_timeout(writer, response, None, server._connection_header(None, "read_timeout"))
+                    reason = "read_timeout"
+                    break
+                finally:
+                    self._idle.discard(writer)
+                if not data:
+                    reason = "drain" if server.draining.is_set() else "client"
+                    break # 클라이언트가 연결을 종료하면 루프 종료
+
+                try:
+                    requests = parser.feed(data)
+                except HttpParseError as e:
+                    (response, _) = server._create_response_str(e.status, body=e.message)
+                    await self._send_with_timeout(writer, response, None, server._connection_header(None, "bad_request"))
+                    server.log_message(f"[{addr[0]}] bad request: {e.message}", WARNING)
+                    reason = "bad_request"
+                    break
+
+                if requests:
+                    deadline = None
+                close = None
+                for request in requests:
+                    served += 1
+                    request.client = addr[0]
+                    close = server._close_reason(request, served)
+                    (response, bin_file) = await loop.run_in_executor(None, server.request_handler, request)
+                    try:
+                        sent = await self._send_with_timeout(writer, response, bin_file,
+                                                             server._connection_header(request, close))
+                    finally:
+                        if request.release is not None: # 동시 다운로드 slot
+                            request.release()
+                    if not sent:
+                        server.log_message(f"[{addr[0]}] response timed out", WARNING)
+                        close = "write_timeout"
+                    if close is not None:
+                        break
+                if close is not None:
+                    reason = close
+                    break
+                if parser.in_progress() and deadline is None: # 새 request의 첫 byte
+                    deadline = loop.time() + server.read_timeout
+
+        except OSError: # ConnectionResetError, 보내는 중에 바뀐 BundleBody 파일
+            server.log_message(f"[{addr[0]}] 연결이 강제 종료되었습니다.")
+        finally:
+            self.active_connections -= 1
+            server.metrics.connection_closed(reason)
+            server.log_message(f"[{addr[0]}] 연결 종료.")
+            writer.close()
+
+    async def _send_with_timeout(self, writer : asyncio.StreamWriter, response : bytes, bin_file,
+                                 connection : bytes=b"") -> bool:
+        '''
+        Server.write_timeout 안에 _send_response. BundleBody는 part마다 write_timeout을 적용.
+        Connection header와 작은 body는 Server._response_bytes로 header에 이어붙임
+
+        connection : Connection header line (Server._connection_header)
+
+        return : 보냈으면 True'''
+        if isinstance(bin_file, (FileBody, BundleBody)):
+            (response, _) = self.server._response_bytes(response, None, connection)
+        else:
+            (response, bin_file) = self.server._response_bytes(response, bin_file, connection)
+        try:
+            if isinstance(bin_file, BundleBody):
+                await self._send_bundle(writer, response, bin_file)
+            else:
+                await asyncio.wait_for(self._send_response(writer, response, bin_file), self.server.write_timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def _send_bundle(self, writer : asyncio.StreamWriter, response : bytes, bundle : BundleBody) -> None:
+        '''
+        BundleBody를 part별로 전송. 파일을 열고 읽는 BundleBody의 iteration은 executor에서 실행하여 event loop를 막지 않음'''
+        loop = asyncio.get_running_loop()
+        parts = iter(bundle)
+        while True:
+            part = await loop.run_in_executor(None, next, parts, None)
+            if part is None:
+                return
+            await asyncio.wait_for(self._send_response(writer, response, part), self.server.write_timeout)
+            response = b""
+
+    async def _send_response(self, writer : asyncio.StreamWriter, response : bytes, bin_file) -> None:
+        '''
+        Server._send_response의 asyncio 버전. FileBody는 loop.sendfile로 전송'''
+        writer.write(response)
+        if isinstance(bin_file, FileBody):
+            try:
+                await writer.drain()
+                await asyncio.get_running_loop().sendfile(writer.transport, bin_file.file, bin_file.offset, bin_file.length)
+            finally:
+                bin_file.close()
+            return
+        if bin_file is not None:
+            writer.write(bin_file)
+        await writer.drain()
+
+    async def serve(self) -> None:
+        '''
+        Server의 listen socket으로 asyncio server를 열고 SIGTERM 또는 Ctrl+C를 받을 때까지 대기.
+        Server.tls_context가 있으면 TLS로 받음.
+
+        signal을 받으면 accept를 멈추고 idle 연결을 닫은 뒤, 처리 중인 연결이 끝나기를 drain_timeout까지 기다림.
+        drain 중에 다시 받으면 바로 종료.'''
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, self._on_signal, stop)
+
+        tls = {} if self.server.tls_context is None else {"ssl" : self.server.tls_context,
+                                                           "ssl_handshake_timeout" : HANDSHAKE_TIMEOUT}
+        aio_server = await asyncio.start_server(self.client_handler, sock=self.server, **tls)
+        await stop.wait()
+        aio_server.close() # 새 연결을 받지 않음
+        self.server.log_message(f"Draining connections (timeout {self.server.drain_timeout}s)")
+        for writer in list(self._idle):
+            writer.close()
+        deadline = loop.time() + self.server.drain_timeout
+        while self.active_connections and loop.time() < deadline and not self._forced:
+            await asyncio.sleep(DRAIN_POLL_INTERVAL)
+        if self.active_connections:
+            self.server.log_message(f"closing {self.active_connections} unfinished connections", WARNING)
+
+    def _on_signal(self, stop : asyncio.Event) -> None:
+        if self.server.draining.is_set():
+            self._forced = True
+            return
+        self.server.log_message("signal received, stop accepting")
+        self.server.draining.set()
+        stop.set()
+
+
+def serve_async(server, max_connections : int=DEFAULT_ASYNC_MAX_CONNECTIONS) -> None:
+    '''
+    asyncio mode로 서버 실행.
+
+    server : 이미 bind/listen된 Server 인스턴스
+    max_connections : 동시에 유지하는 최대 연결 수'''
+    _raise_nofile_limit(max_connections)
+    server.log_message(f"Server started (asyncio mode, max_connections={max_connections})")
+    asyncio.run(AsyncEngine(server, max_connections).serve())
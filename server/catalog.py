@@ -0,0 +1,323 @@
+import bisect
+import mimetypes
+import os
+import struct
+import threading
+import time
+
+from file_cache import FileInfo, file_info
+
+IMAGE_ROOT = "." # 이미지를 찾는 디렉터리 (기본값은 server.py를 실행한 디렉터리)
+CATALOG_REFRESH_INTERVAL = 2.0 # 디렉터리가 바뀌었는 지 확인하는 최소 간격(초)
+LIST_LIMIT = 100 # /images/list 한 page의 기본 이미지 수
+MAX_LIST_LIMIT = 1000 # /images/list 한 page의 최대 이미지 수
+
+_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC} # JPEG frame header (DHT, JPG, DAC 제외)
+_O_NOFOLLOW = getattr(os, "O_NOFOLLOW", 0)
+
+
+class CatalogEntry:
+    '''
+    catalog에 등록된 이미지 하나
+
+    name : root 기준 상대 경로 ("/" 구분). client가 요청하는 이름
+    path : 파일 시스템 경로
+    info : FileInfo (크기, mtime, ETag(내용 hash), Content-Type)
+    width, height : 이미지 크기. header를 읽을 수 없는 형식이면 None
+    stamp : (st_ino, st_size, st_mtime_ns). 파일이 바뀌었는 지 비교'''
+    __slots__ = ("name", "path", "info", "width", "height", "stamp")
+
+    def __init__(self, name : str, path : str, info : FileInfo, width : int, height : int, stamp : tuple):
+        self.name = name
+        self.path = path
+        self.info = info
+        self.width = width
+        self.height = height
+        self.stamp = stamp
+
+    def to_dict(self) -> dict:
+        '''
+        /images/list에 보내는 정보'''
+        return {"name" : self.name, "size" : self.info.size, "mtime" : int(self.info.mtime),
+                "width" : self.width, "height" : self.height, "content_type" : self.info.content_type,
+                "etag" : self.info.etag}
+
+
+class ImageCatalog:
+    '''
+    image root 아래 이미지 파일의 in-memory index (이름 -> CatalogEntry).
+
+    refresh()가 root를 훑어 index를 만들고, 이후에는 mtime이 바뀐 디렉터리만 다시 읽어
+    추가/삭제/변경된 파일만 다시 계산함 (incremental). open과 list는 refresh_interval마다 한 번 refresh를 시도하므로
+    새로 넣은 파일도 곧 보임. 내용만 바뀐 파일(디렉터리 mtime은 그대로)은 open할 때 fstat으로 확인하여 다시 계산함.
+
+    client가 보낸 이름은 index의 key로만 사용하고 파일 시스템 경로로 해석하지 않으므로
+    root 밖의 파일, symlink, 숨김 파일(.으로 시작)에는 접근할 수 없음.
+    확장자가 이미지 형식인 파일만 읽어 Content-Type(magic number, 모르면 확장자)이 image/*인 파일을 등록함.
+    여러 thread에서 동시에 사용할 수 있음.
+    '''
+    def __init__(self, root : str=IMAGE_ROOT, exclude : tuple=(), refresh_interval : float=CATALOG_REFRESH_INTERVAL):
+        '''
+        root : 이미지를 찾는 디렉터리
+        exclude : root 아래에서 훑지 않을 디렉터리 (변환한 이미지 cache 등)
+        refresh_interval : 디렉터리가 바뀌었는 지 확인하는 최소 간격(초)'''
+        self.root = os.path.abspath(root)
+        self.exclude = {os.path.abspath(path) for path in exclude}
+        self.refresh_interval = refresh_interval
+
+        self._entries = {} # 이름 -> CatalogEntry
+        self._names = [] # 정렬된 이름 (list)
+        self._dirs = {} # 디렉터리 이름(root는 "") -> (st_mtime_ns, 하위 디렉터리 이름 리스트, 파일 이름 set)
+        self._lock = threading.Lock() # _entries, _names
+        self._refresh_lock = threading.Lock() # refresh는 한 thread에서만 (_dirs)
+        self._checked = None # 마지막 refresh 시각 (time.monotonic). None이면 아직 훑지 않음
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def refresh(self) -> int:
+        '''
+        mtime이 바뀐 디렉터리를 다시 읽어 index를 갱신. 다른 thread가 refresh 중이면 끝나기를 기다림
+
+        return : 추가, 변경, 삭제된 이미지 수'''
+        with self._refresh_lock:
+            return self._refresh()
+
+    def open(self, name : str) -> tuple:
+        '''
+        name의 이미지 파일을 엶. 열린 파일의 fstat이 index와 다르면(내용이 바뀜) entry를 다시 계산함
+
+        name : index의 이름 (root 기준 상대 경로, "/" 구분)
+        return : (CatalogEntry, 열린 파일 (binary))
+        raise : KeyError index에 없거나 파일이 사라짐'''
+        self._maybe_refresh()
+        entry = self._entries.get(name)
+        if entry is None:
+            raise KeyError(name)
+        try:
+            file = os.fdopen(os.open(entry.path, os.O_RDONLY | _O_NOFOLLOW), "rb")
+        except OSError:
+            self._remove(name)
+            raise KeyError(name) from None
+        stat = os.fstat(file.fileno())
+        if _stamp(stat) != entry.stamp:
+            entry = self._load(name, entry.path, file, stat)
+            if entry is None: # 이미지가 아니게 됨
+                file.close()
+                self._remove(name)
+                raise KeyError(name)
+            self._put(entry)
+        return (entry, file)
+
+    def list(self, after : str="", limit : int=LIST_LIMIT, prefix : str="", query : str="") -> tuple:
+        '''
+        이름 순서로 after 다음 이미지부터 limit개
+
+        after : 이전 page의 마지막 이름 (next). 빈 문자열이면 처음부터
+        prefix : 이 문자열로 시작하는 이름만 (EX) "gallery/")
+        query : 이름에 이 문자열이 포함된 이미지만 (대소문자 무시)
+
+        return : (CatalogEntry 리스트, 다음 page의 after. 마지막 page이면 None)'''
+        self._maybe_refresh()
+        query = query.lower()
+        entries = []
+        with self._lock:
+            names = self._names
+            start = max(bisect.bisect_right(names, after) if after else 0, bisect.bisect_left(names, prefix))
+            for name in names[start:]:
+                if not name.startswith(prefix):
+                    break
+                if query and query not in name.lower():
+                    continue
+                if len(entries) == limit:
+                    return (entries, entries[-1].name)
+                entries.append(self._entries[name])
+        return (entries, None)
+
+    def _maybe_refresh(self) -> None:
+        '''
+        마지막 refresh 후 refresh_interval이 지났으면 refresh. 다른 thread가 refresh 중이면 기다리지 않음'''
+        if self._checked is None:
+            self.refresh()
+            return
+        if time.monotonic() - self._checked < self.refresh_interval:
+            return
+        if self._refresh_lock.acquire(blocking=False):
+            try:
+                self._refresh()
+            finally:
+                self._refresh_lock.release()
+
+    def _refresh(self) -> int:
+        '''
+        _refresh_lock을 가진 상태에서 refresh'''
+        self._checked = time.monotonic()
+        seen = set()
+        changed = self._walk("", seen)
+        for name in [name for name in self._dirs if name not in seen]: # 사라진 디렉터리
+            for file_name in self._dirs.pop(name)[2]:
+                changed += self._remove(file_name)
+        return changed
+
+    def _walk(self, name : str, seen : set) -> int:
+        '''
+        디렉터리 name과 하위 디렉터리를 확인. mtime이 바뀐 디렉터리만 _scan
+
+        seen : 확인한 디렉터리 이름을 추가
+        return : 추가, 변경, 삭제된 이미지 수'''
+        try:
+            mtime = os.stat(self._path(name), follow_symlinks=False).st_mtime_ns
+        except OSError: # 사라진 디렉터리 => refresh에서 정리
+            return 0
+        seen.add(name)
+        changed = 0
+        known = self._dirs.get(name)
+        if known is not None and known[0] == mtime:
+            subdirs = known[1]
+        else:
+            (subdirs, changed) = self._scan(name, mtime)
+        for subdir in subdirs:
+            changed += self._walk(subdir, seen)
+        return changed
+
+    def _scan(self, name : str, mtime : int) -> tuple:
+        '''
+        디렉터리 name의 파일을 읽어 새 파일과 바뀐 파일만 다시 계산하고, 사라진 파일은 지움
+
+        mtime : 읽기 전에 구한 디렉터리 mtime. 읽는 중에 바뀌면 다음 refresh에서 다시 읽음
+        return : (하위 디렉터리 이름 리스트, 추가, 변경, 삭제된 이미지 수)'''
+        (subdirs, files, changed) = ([], set(), 0)
+        old_files = self._dirs[name][2] if name in self._dirs else set()
+        try:
+            items = list(os.scandir(self._path(name)))
+        except OSError:
+            items = []
+        for item in items:
+            if item.name.startswith("."):
+                continue
+            child = f"{name}/{item.name}" if name else item.name
+            try:
+                if item.is_dir(follow_symlinks=False):
+                    if os.path.abspath(item.path) not in self.exclude:
+                        subdirs.append(child)
+                    continue
+                if not item.is_file(follow_symlinks=False) or not _is_image_name(item.name):
+                    continue
+                stat = item.stat(follow_symlinks=False)
+                entry = self._entries.get(child)
+                if entry is None or entry.stamp != _stamp(stat):
+                    with open(item.path, "rb") as file:
+                        entry = self._load(child, item.path, file, os.fstat(file.fileno()))
+                    if entry is None:
+                        continue
+                    self._put(entry)
+                    changed += 1
+            except OSError: # 읽는 중에 사라짐
+                continue
+            files.add(child)
+        for child in old_files - files:
+            changed += self._remove(child)
+        self._dirs[name] = (mtime, subdirs, files)
+        return (subdirs, changed)
+
+    def _load(self, name : str, path : str, file, stat : os.stat_result) -> CatalogEntry:
+        '''
+        열린 파일의 hash, Content-Type, 크기를 계산
+
+        return : CatalogEntry. 이미지가 아니면 None'''
+        info = file_info(path, file, stat)
+        if not info.content_type.startswith("image/"):
+            return None
+        (width, height) = image_size(file, info.content_type)
+        return CatalogEntry(name, path, info, width, height, _stamp(stat))
+
+    def _put(self, entry : CatalogEntry) -> None:
+        with self._lock:
+            if entry.name not in self._entries:
+                bisect.insort(self._names, entry.name)
+            self._entries[entry.name] = entry
+
+    def _remove(self, name : str) -> int:
+        '''
+        return : 지웠으면 1'''
+        with self._lock:
+            if self._entries.pop(name, None) is None:
+                return 0
+            index = bisect.bisect_left(self._names, name)
+            del self._names[index]
+            return 1
+
+    def _path(self, name : str) -> str:
+        return os.path.join(self.root, *name.split("/")) if name else self.root
+
+
+def image_size(file, content_type : str) -> tuple:
+    '''
+    이미지 header에서 크기를 읽음 (PNG, GIF, BMP, WebP, JPEG). 읽은 뒤 처음 위치로 되돌림
+
+    return : (width, height). 모르는 형식이거나 header가 잘못되었으면 (None, None)'''
+    try:
+        file.seek(0)
+        head = file.read(32)
+        if content_type == "image/png" and head[12:16] == b"IHDR":
+            return struct.unpack(">II", head[16:24])
+        if content_type == "image/gif":
+            return struct.unpack("<HH", head[6:10])
+        if content_type == "image/bmp":
+            if struct.unpack("<I", head[14:18])[0] == 12: # OS/2 BITMAPCOREHEADER
+                return struct.unpack("<HH", head[18:22])
+            (width, height) = struct.unpack("<ii", head[18:26])
+            return (width, abs(height)) # height가 음수이면 위에서 아래로 저장된 bitmap
+        if content_type == "image/webp":
+            return _webp_size(head)
+        if content_type == "image/jpeg":
+            return _jpeg_size(file)
+    except (struct.error, IndexError, ValueError): # 잘린 파일은 크기 없이 등록
+        pass
+    finally:
+        file.seek(0)
+    return (None, None)
+
+
+def _webp_size(head : bytes) -> tuple:
+    chunk = head[12:16]
+    if chunk == b"VP8 " and head[23:26] == b"\x9d\x01\x2a": # lossy
+        (width, height) = struct.unpack("<HH", head[26:30])
+        return (width & 0x3FFF, height & 0x3FFF)
+    if chunk == b"VP8L" and head[20:21] == b"\x2f": # lossless
+        bits = struct.unpack("<I", head[21:25])[0]
+        return (1 + (bits & 0x3FFF), 1 + ((bits >> 14) & 0x3FFF))
+    if chunk == b"VP8X": # extended : canvas 크기 - 1 (24bit)
+        return (1 + int.from_bytes(head[24:27], "little"), 1 + int.from_bytes(head[27:30], "little"))
+    return (None, None)
+
+
+def _jpeg_size(file) -> tuple:
+    '''
+    JPEG segment를 따라가며 SOF(frame header)의 크기를 읽음. segment 내용은 읽지 않고 건너뜀'''
+    file.seek(2) # SOI
+    while True:
+        byte = file.read(1)
+        if byte != b"\xff":
+            return (None, None)
+        marker = file.read(1)
+        while marker == b"\xff": # fill byte
+            marker = file.read(1)
+        if not marker or marker[0] == 0xDA: # 파일 끝 또는 SOS (SOF 없이 image data 시작)
+            return (None, None)
+        if marker[0] == 0x01 or 0xD0 <= marker[0] <= 0xD7: # 길이가 없는 marker
+            continue
+        length = struct.unpack(">H", file.read(2))[0]
+        if marker[0] in _SOF_MARKERS:
+            (height, width) = struct.unpack(">xHH", file.read(5))
+            return (width, height)
+        file.seek(length - 2, os.SEEK_CUR)
+
+
+def _is_image_name(filename : str) -> bool:
+    content_type = mimetypes.guess_type(filename)[0]
+    return content_type is not None and content_type.startswith("image/")
+
+
+def _stamp(stat : os.stat_result) -> tuple:
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
@@ -0,0 +1,156 @@
+import functools
+import gzip
+import threading
+import zlib
+from collections import OrderedDict
+
+try: # 선택 의존성
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESS_MIN_SIZE = 512 # 이보다 작은 body는 압축하지 않음 (header overhead가 더 큼)
+COMPRESS_MAX_SIZE = 8 * 1024 * 1024 # 이보다 큰 파일은 압축하지 않고 sendfile로 전송
+COMPRESS_MIN_SAVING = 0.1 # 10% 이상 줄지 않으면 압축하지 않은 body를 전송
+COMPRESSED_CACHE_BYTES = 32 * 1024 * 1024 # 압축해 둔 정적 body cache 최대 크기
+
+# 요청마다 만드는 body(JSON, 텍스트, 지표)는 빠른 level, ETag가 있는 정적 파일은 한 번만 압축하므로 최대 level
+DYNAMIC_LEVELS = {"zstd" : 3, "br" : 4, "gzip" : 6, "deflate" : 6}
+STATIC_LEVELS = {"zstd" : 19, "br" : 11, "gzip" : 9, "deflate" : 9}
+
+# 서버가 선호하는 순서. 설치되지 않은 coding은 제외
+CODINGS = tuple(coding for coding in ("zstd", "br", "gzip", "deflate")
+                if (coding != "zstd" or zstandard is not None) and (coding != "br" or brotli is not None))
+
+# 이미 압축된 형식(JPEG, PNG, GIF, WebP ...)은 제외하고 아래 형식만 압축
+_COMPRESSIBLE_TYPES = frozenset(("application/json", "application/javascript", "application/xml",
+                                 "image/svg+xml", "image/bmp", "image/tiff", "image/x-icon"))
+
+
+def compress(data, coding : str, level : int) -> bytes:
+    '''
+    data를 coding(zstd, br, gzip, deflate)으로 압축'''
+    if coding == "gzip":
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    if coding == "deflate": # HTTP deflate는 zlib 형식
+        return zlib.compress(data, level)
+    if coding == "br":
+        return brotli.compress(bytes(data), quality=level)
+    if coding == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    raise ValueError(f"Unsupported coding: {coding}")
+
+
+def is_compressible(content_type : str) -> bool:
+    '''
+    content_type("text/html; charset=utf-8" 형식)의 body를 압축할 가치가 있는 지'''
+    media_type = content_type.partition(";")[0].strip().lower()
+    return media_type.startswith("text/") or media_type in _COMPRESSIBLE_TYPES
+
+
+@functools.lru_cache(maxsize=256) # client마다 같은 header를 보내므로 파싱 결과를 재사용
+def negotiate(accept_encoding : str, codings : tuple=CODINGS) -> str:
+    '''
+    Accept-Encoding header에서 사용할 coding을 고름
+
+    q 값이 가장 큰 coding을 고르고, 같으면 codings 순서(서버 선호)를 따름. q=0은 거부, "*"는 나머지 전부.
+
+    return : coding. 압축하지 않아야 하면 None'''
+    if not accept_encoding:
+        return None
+    qualities = {}
+    for item in accept_encoding.split(","):
+        (name, _, params) = item.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            (key, _, value) = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.strip().lower()] = quality
+
+    default = qualities.get("*", 0.0)
+    (best, best_quality) = (None, 0.0)
+    for coding in codings:
+        quality = qualities.get(coding, default)
+        if quality > best_quality:
+            (best, best_quality) = (coding, quality)
+    return best
+
+
+class Compressor:
+    '''
+    response body 압축기.
+
+    ETag가 있는 정적 body(이미지 파일, variant)는 STATIC_LEVELS로 한 번만 압축하여 (ETag, coding)별로 LRU cache에 보관함.
+    압축해도 COMPRESS_MIN_SAVING만큼 줄지 않는 body는 "압축하지 않음"을 기억하여 다시 시도하지 않음.
+    ETag가 없는 body(JSON, 텍스트)는 요청마다 DYNAMIC_LEVELS로 압축함.
+    '''
+    def __init__(self, codings : tuple=CODINGS, min_size : int=COMPRESS_MIN_SIZE, max_size : int=COMPRESS_MAX_SIZE,
+                 cache_bytes : int=COMPRESSED_CACHE_BYTES):
+        '''
+        codings : 사용할 coding (서버 선호 순서). 비어 있으면 압축하지 않음
+        min_size, max_size : 압축할 body 크기 범위
+        cache_bytes : 압축한 정적 body cache 최대 크기'''
+        self.codings = tuple(codings)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.cache_bytes = cache_bytes
+        self.size = 0
+
+        self._cache = OrderedDict() # (etag, coding) -> 압축한 bytes or None(압축하지 않음)
+        self._lock = threading.Lock()
+
+    def options(self) -> dict:
+        '''
+        process worker에서 같은 설정의 Compressor를 만들 인자'''
+        return {"codings" : self.codings, "min_size" : self.min_size, "max_size" : self.max_size,
+                "cache_bytes" : self.cache_bytes}
+
+    def choose(self, accept_encoding : str, size : int) -> str:
+        '''
+        크기가 size인 body에 사용할 coding. 압축하지 않으면 None'''
+        if not self.codings or not self.min_size <= size <= self.max_size:
+            return None
+        return negotiate(accept_encoding, self.codings)
+
+    def encode(self, coding : str, data, etag : str=None) -> bytes:
+        '''
+        body를 coding으로 압축
+
+        data : bytes-like or data를 반환하는 함수 (cache에 없을 때만 호출)
+        etag : 정적 body의 ETag. 있으면 cache를 사용
+
+        return : 압축한 bytes. 충분히 줄지 않으면 None'''
+        if etag is None:
+            data = data() if callable(data) else data
+            return self._compress(data, coding, DYNAMIC_LEVELS[coding])
+
+        key = (etag, coding)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        data = data() if callable(data) else data
+        encoded = self._compress(data, coding, STATIC_LEVELS[coding])
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = encoded
+                self.size += len(encoded or b"")
+                while self.size > self.cache_bytes:
+                    (_, evicted) = self._cache.popitem(last=False)
+                    self.size -= len(evicted or b"")
+        return encoded
+
+    def _compress(self, data, coding : str, level : int) -> bytes:
+        encoded = compress(data, coding, level)
+        if len(encoded) > len(data) * (1 - COMPRESS_MIN_SAVING):
+            return None
+        return encoded
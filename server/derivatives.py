@@ -0,0 +1,243 @@
+import contextlib
+import hashlib
+import importlib.util
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+
+DERIVATIVE_DIR = "derivatives" # 변환한 이미지를 저장하는 디렉터리
+DERIVATIVE_CACHE_BYTES = 256 * 1024 * 1024 # 디렉터리 전체 최대 크기
+RENDER_WORKERS = os.cpu_count() or 1 # 변환을 실행하는 process 수
+MAX_DIMENSION = 4096 # w, h 최대값
+DEFAULT_QUALITY = 80 # JPEG/WebP 품질
+RENDER_TIMEOUT = 600 # 이보다 오래된 임시 파일은 변환 도중 종료되어 남은 것으로 보고 지움 (초)
+FORMATS = {"jpeg" : ("JPEG", "jpg", "image/jpeg"), "png" : ("PNG", "png", "image/png"),
+           "webp" : ("WEBP", "webp", "image/webp")} # fmt -> (PIL format, 확장자, Content-Type)
+VARIANT_PARAMS = ("w", "h", "fmt", "q") # 이 중 하나라도 있으면 변환 요청
+_FORMAT_ALIASES = {"jpg" : "jpeg"}
+_SOURCE_FORMATS = {"image/jpeg" : "jpeg", "image/png" : "png", "image/webp" : "webp"} # fmt가 없을 때 원본 형식 유지
+
+PILLOW_AVAILABLE = importlib.util.find_spec("PIL") is not None
+
+
+class Variant:
+    '''
+    요청한 변환 (w, h 안에 비율을 유지하여 축소, fmt로 다시 인코딩)'''
+    __slots__ = ("width", "height", "format", "quality")
+
+    def __init__(self, width : int, height : int, format : str, quality : int):
+        self.width = width
+        self.height = height
+        self.format = format
+        self.quality = quality
+
+    def key(self, source_etag : str) -> str:
+        '''
+        원본 내용 hash와 변환 parameter로 만든 cache key'''
+        text = f"{source_etag}|{self.width}|{self.height}|{self.format}|{self.quality}"
+        return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+    def extension(self) -> str:
+        return FORMATS[self.format][1]
+
+    def content_type(self) -> str:
+        return FORMATS[self.format][2]
+
+
+def parse_variant(query : dict, source_type : str) -> Variant:
+    '''
+    query string(w, h, fmt, q)을 Variant로 변환
+
+    query : HttpRequest.query()
+    source_type : 원본 Content-Type. fmt가 없으면 원본 형식을 유지 (변환할 수 없는 형식이면 JPEG)
+
+    raise : ValueError 잘못된 parameter'''
+    (width, height) = (_dimension(query, "w"), _dimension(query, "h"))
+
+    fmt = query.get("fmt")
+    if fmt is None:
+        fmt = _SOURCE_FORMATS.get(source_type, "jpeg")
+    fmt = _FORMAT_ALIASES.get(fmt.lower(), fmt.lower())
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format: {query['fmt']}")
+
+    quality = DEFAULT_QUALITY
+    if "q" in query:
+        if not query["q"].isdigit() or not 1 <= int(query["q"]) <= 100:
+            raise ValueError("q must be an integer between 1 and 100")
+        quality = int(query["q"])
+    return Variant(width, height, fmt, quality)
+
+
+def _dimension(query : dict, name : str) -> int:
+    value = query.get(name)
+    if value is None:
+        return 0 # 제한 없음
+    if not value.isdigit() or not 1 <= int(value) <= MAX_DIMENSION:
+        raise ValueError(f"{name} must be an integer between 1 and {MAX_DIMENSION}")
+    return int(value)
+
+
+def render_variant(source_path : str, target_path : str, width : int, height : int, format : str, quality : int) -> int:
+    '''
+    원본을 width x height 안에 들어가도록 비율을 유지하여 축소(확대는 하지 않음)하고 format으로 저장.
+    render process에서 실행됨. 임시 파일에 쓴 뒤 os.replace로 교체하므로 다른 process가 반쯤 쓴 파일을 읽지 않음
+
+    return : 저장한 파일 크기
+    raise : ValueError 원본을 이미지로 읽을 수 없음
+            OSError 변환한 파일을 저장할 수 없음'''
+    from PIL import Image # 변환할 때만 필요 (선택 의존성)
+
+    (pil_format, _, _) = FORMATS[format]
+    tmp_path = f"{target_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        try:
+            with Image.open(source_path) as image:
+                image.thumbnail((width or image.width, height or image.height))
+                if pil_format == "JPEG" and image.mode not in ("RGB", "L"): # JPEG는 alpha channel이 없음
+                    image = image.convert("RGB")
+                save_options = {"optimize" : True} if pil_format == "PNG" else {"quality" : quality}
+                image.save(tmp_path, pil_format, **save_options)
+        except (OSError, SyntaxError) as e: # PIL.UnidentifiedImageError는 OSError
+            raise ValueError(f"Cannot transform image: {e}") from None
+        os.replace(tmp_path, target_path)
+    finally:
+        with contextlib.suppress(FileNotFoundError): # 실패하면 임시 파일을 남기지 않음 (교체했으면 이미 없음)
+            os.remove(tmp_path)
+    return os.path.getsize(target_path)
+
+
+class DerivativeCache:
+    '''
+    변환한 이미지(derivative)를 디스크에 저장하는 크기 제한 cache.
+
+    파일 이름은 <Variant.key(원본 ETag)>.<확장자>이므로 원본 내용이 바뀌면 key도 바뀌어 새로 변환함.
+    전체 크기가 max_bytes를 넘으면 가장 오래 사용하지 않은 파일부터 지움 (시작 시 mtime 순서로 복구).
+    process, prefork mode에서는 worker process마다 DerivativeCache를 따로 만들어 같은 디렉터리를 사용하므로
+    max_bytes는 process마다 적용됨 (디렉터리 전체는 최대 worker 수 x max_bytes까지 커질 수 있음).
+
+    같은 key를 동시에 요청하면 첫 요청만 변환하고 나머지는 그 결과(Future)를 기다림 (stampede 방지).
+    변환은 workers개 process의 pool(처음 변환할 때 생성)에서 실행하여 요청 thread의 GIL을 잡지 않음.
+    workers가 0이면 요청 thread에서 바로 변환함 (process mode worker는 이미 별도 process).
+    '''
+    def __init__(self, directory : str=DERIVATIVE_DIR, max_bytes : int=DERIVATIVE_CACHE_BYTES,
+                 workers : int=RENDER_WORKERS):
+        '''
+        directory : derivative 저장 디렉터리
+        max_bytes : 이 process가 index한 파일의 최대 크기 (process마다 적용)
+        workers : 변환 process 수. 0이면 호출한 thread에서 변환'''
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self.total_bytes = 0
+
+        self._entries = OrderedDict() # filename -> size (LRU 순서)
+        self._inflight = {} # filename -> Future(path)
+        self._lock = threading.Lock()
+        self._pool = None
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def worker_options(self) -> dict:
+        '''
+        process worker에서 같은 디렉터리를 사용하는 DerivativeCache를 만들 인자 (변환은 worker에서 바로 실행)'''
+        return {"directory" : self.directory, "max_bytes" : self.max_bytes, "workers" : 0}
+
+    def get(self, source_path : str, source_etag : str, variant : Variant) -> str:
+        '''
+        variant의 파일 경로를 반환. cache에 없으면 변환하여 저장
+
+        return : derivative 파일 경로
+        raise : ValueError 원본을 변환할 수 없음
+                OSError 변환한 파일을 저장할 수 없음'''
+        filename = f"{variant.key(source_etag)}.{variant.extension()}"
+        path = os.path.join(self.directory, filename)
+        with self._lock:
+            if filename in self._entries:
+                self._entries.move_to_end(filename)
+                return path
+            future = self._inflight.get(filename)
+            owner = future is None
+            if owner:
+                future = self._inflight[filename] = Future()
+
+        if not owner: # 같은 변환이 진행 중
+            return future.result()
+
+        try:
+            if os.path.exists(path): # 다른 process가 이미 변환함
+                size = os.path.getsize(path)
+            else:
+                size = self._render(source_path, path, variant)
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[filename]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._inflight[filename]
+            self._entries[filename] = size
+            self.total_bytes += size
+            self._evict()
+        future.set_result(path)
+        return path
+
+    def forget(self, path : str) -> None:
+        '''
+        다른 process가 지운 derivative를 index에서 뺌. 다음 get에서 다시 변환함'''
+        with self._lock:
+            size = self._entries.pop(os.path.basename(path), None)
+            if size is not None:
+                self.total_bytes -= size
+
+    def _render(self, source_path : str, path : str, variant : Variant) -> int:
+        args = (source_path, path, variant.width, variant.height, variant.format, variant.quality)
+        if not self.workers:
+            return render_variant(*args)
+        with self._lock:
+            if self._pool is None: # 요청 thread가 많은 process에서 fork하지 않도록 spawn
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool.submit(render_variant, *args).result()
+
+    def _evict(self) -> None:
+        '''
+        max_bytes 이하가 될 때까지 오래된 파일을 지움. 호출 전에 lock을 잡고 있어야 함'''
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            (filename, size) = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(os.path.join(self.directory, filename))
+            except FileNotFoundError: # 다른 process가 이미 지움
+                pass
+
+    def _load(self) -> None:
+        '''
+        디렉터리의 파일로 index를 복구. 변환 도중 종료되어 남은 임시 파일(RENDER_TIMEOUT보다 오래됨)은 지움.
+        새로 만든 임시 파일은 다른 worker process가 변환 중인 파일이므로 그대로 둠'''
+        files = []
+        now = time.time()
+        for entry in os.scandir(self.directory):
+            try:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+            except FileNotFoundError: # 다른 process가 지움
+                continue
+            if entry.name.endswith(".tmp"):
+                if now - stat.st_mtime > RENDER_TIMEOUT:
+                    with contextlib.suppress(FileNotFoundError): # 다른 process가 동시에 시작하며 지움
+                        os.remove(entry.path)
+                continue
+            files.append((stat.st_mtime, entry.name, stat.st_size))
+        for (_, filename, size) in sorted(files):
+            self._entries[filename] = size
+            self.total_bytes += size
+        self._evict()
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,220 @@
+import hashlib
+import mimetypes
+import os
+import threading
+from collections import OrderedDict
+
+FILE_CACHE_BYTES = 64 * 1024 * 1024 # cache 전체 최대 크기
+FILE_CACHE_MAX_FILE = 1024 * 1024 # 이보다 큰 파일은 cache하지 않고 sendfile로 전송
+FILE_INFO_ENTRIES = 4096 # ETag, Content-Type을 기억하는 최대 파일 수
+HASH_CHUNK_SIZE = 1024 * 1024 # ETag hash 계산 시 한 번에 읽는 크기
+
+# 파일 앞부분(magic number)으로 판별하는 이미지 형식
+_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+    (b"\x00\x00\x01\x00", "image/x-icon"),
+)
+
+
+class FileInfo:
+    '''
+    파일의 validator 정보
+
+    size : 파일 크기
+    mtime : 수정 시각 (초)
+    etag : 파일 내용 hash로 만든 ETag (따옴표 포함)
+    content_type : 파일 내용(없으면 확장자)으로 판별한 Content-Type'''
+    __slots__ = ("size", "mtime", "etag", "content_type")
+
+    def __init__(self, size : int, mtime : float, etag : str, content_type : str):
+        self.size = size
+        self.mtime = mtime
+        self.etag = etag
+        self.content_type = content_type
+
+
+class FileBody:
+    '''
+    response body로 보낼 파일 구간.
+    client_handler가 socket.sendfile로 전송하므로 파일 내용이 Python 메모리로 복사되지 않음.
+    전송이 끝나면(또는 실패하면) 보내는 쪽에서 close해야 함.
+
+    file : 열린 파일 (binary)
+    offset : 시작 위치
+    length : 보낼 바이트 수'''
+    __slots__ = ("file", "offset", "length")
+
+    def __init__(self, file, offset : int, length : int):
+        self.file = file
+        self.offset = offset
+        self.length = length
+
+    def __len__(self) -> int:
+        return self.length
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class BundleBody:
+    '''
+    여러 파일을 이어 보내는 response body (POST /images/batch의 multipart bundle).
+
+    parts는 bytes(part 구분자와 header)와 (path, FileInfo) 파일 항목의 리스트.
+    파일은 보낼 차례가 되었을 때 열어 FileCache.body(cache된 bytes 또는 FileBody)로 넘기므로
+    열린 파일은 한 번에 하나이고 response 전체를 메모리에 만들지 않음.
+    길이는 만들 때의 FileInfo.size로 계산하므로, 그 사이 파일이 바뀌면 Content-Length를 지킬 수 없어 OSError.
+
+    iter(body) : 보낼 순서대로 bytes 또는 FileBody. FileBody는 보내는 쪽에서 close해야 함'''
+    __slots__ = ("parts", "file_cache", "length")
+
+    def __init__(self, parts : list, file_cache):
+        self.parts = parts
+        self.file_cache = file_cache
+        self.length = sum(len(part) if isinstance(part, bytes) else part[1].size for part in parts)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self):
+        for part in self.parts:
+            if isinstance(part, bytes):
+                yield part
+                continue
+            (path, info) = part
+            file = open(path, "rb")
+            stat = os.fstat(file.fileno())
+            if stat.st_size != info.size or stat.st_mtime != info.mtime:
+                file.close()
+                raise OSError(f"{path} changed while sending")
+            yield self.file_cache.body(path, file)
+
+
+class FileCache:
+    '''
+    자주 요청되는 작은 파일의 내용을 메모리에 유지하는 LRU cache.
+
+    파일 크기와 mtime이 바뀌면 다시 읽음.
+    전체 크기가 max_bytes를 넘으면 가장 오래 사용하지 않은 파일부터 제거.
+    max_file_size보다 큰 파일은 cache하지 않고 FileBody로 반환하여 sendfile로 전송하게 함.
+
+    파일의 ETag(내용 hash)와 Content-Type도 (device, inode)별로 기억하여
+    파일이 바뀌지 않는 동안에는 다시 계산하지 않음.
+    '''
+    def __init__(self, max_bytes : int=FILE_CACHE_BYTES, max_file_size : int=FILE_CACHE_MAX_FILE):
+        self.max_bytes = max_bytes
+        self.max_file_size = max_file_size
+        self.size = 0
+
+        self._entries = OrderedDict() # path -> (mtime_ns, size, data)
+        self._infos = OrderedDict() # (st_dev, st_ino) -> (mtime_ns, size, FileInfo)
+        self._lock = threading.Lock()
+
+    def info(self, path : str, file) -> FileInfo:
+        '''
+        file의 FileInfo를 반환. 처음 보거나 바뀐 파일만 내용을 읽어 hash를 계산함
+
+        path : Content-Type을 내용으로 판별하지 못했을 때 사용할 경로(확장자)
+        file : path를 연 파일 (binary). 읽은 뒤 처음 위치로 되돌림
+
+        return : FileInfo'''
+        stat = os.fstat(file.fileno())
+        key = (stat.st_dev, stat.st_ino)
+        with self._lock:
+            entry = self._infos.get(key)
+            if entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+                self._infos.move_to_end(key)
+                return entry[2]
+
+        info = file_info(path, file, stat)
+        with self._lock:
+            self._infos[key] = (stat.st_mtime_ns, stat.st_size, info)
+            self._infos.move_to_end(key)
+            while len(self._infos) > FILE_INFO_ENTRIES:
+                self._infos.popitem(last=False)
+        return info
+
+    def body(self, path : str, file, offset : int=0, length : int=None) -> object:
+        '''
+        path 파일의 response body를 반환
+
+        path : cache key로 사용할 경로
+        file : path를 연 파일 (binary). bytes를 반환하면 여기서 close함
+        offset, length : 보낼 구간 (Range 요청). length가 None이면 offset부터 파일 끝까지
+
+        return : cache된 bytes(구간이면 memoryview) 또는 FileBody'''
+        stat = os.fstat(file.fileno())
+        if length is None:
+            length = stat.st_size - offset
+        if stat.st_size > self.max_file_size or stat.st_size > self.max_bytes:
+            return FileBody(file, offset, length)
+
+        data = None
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+                self._entries.move_to_end(path)
+                data = entry[2]
+
+        if data is None:
+            with file:
+                data = file.read()
+            self._put(path, stat.st_mtime_ns, data)
+        else:
+            file.close()
+        if offset == 0 and length == len(data):
+            return data
+        return memoryview(data)[offset:offset + length] # 복사하지 않고 구간만 전송
+
+    def _put(self, path : str, mtime_ns : int, data : bytes) -> None:
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self.size -= len(old[2])
+            self._entries[path] = (mtime_ns, len(data), data)
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                (_, (_, _, evicted)) = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+
+def file_info(path : str, file, stat : os.stat_result=None) -> FileInfo:
+    '''
+    file의 내용을 읽어 FileInfo를 계산 (ETag는 내용 hash, Content-Type은 앞부분의 magic number)
+
+    path : Content-Type을 내용으로 판별하지 못했을 때 사용할 경로(확장자)
+    file : path를 연 파일 (binary). 읽은 뒤 처음 위치로 되돌림
+    stat : file의 os.fstat. None이면 여기서 구함'''
+    if stat is None:
+        stat = os.fstat(file.fileno())
+    digest = hashlib.blake2b(digest_size=16)
+    buffer = bytearray(min(HASH_CHUNK_SIZE, max(stat.st_size, 1)))
+    view = memoryview(buffer)
+    file.seek(0)
+    head = b""
+    while True:
+        size = file.readinto(buffer)
+        if not size:
+            break
+        if not head:
+            head = bytes(view[:16])
+        digest.update(view[:size])
+    file.seek(0)
+    return FileInfo(stat.st_size, stat.st_mtime, f'"{digest.hexdigest()}"', _content_type(path, head))
+
+
+def _content_type(path : str, head : bytes) -> str:
+    '''
+    파일 앞부분(head)의 magic number로 Content-Type을 판별. 모르는 형식이면 확장자로 추측'''
+    for (signature, content_type) in _SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return mimetypes.guess_type(path)[0] or "application/octet-stream"
@@ -0,0 +1,168 @@
+from urllib.parse import parse_qsl
+
+MAX_HEADER_SIZE = 8 * 1024 # request line + header 최대 크기
+MAX_BODY_SIZE = 1024 * 1024 # body(Content-Length) 최대 크기
+RECV_BUFFER_SIZE = 64 * 1024 # recv_into에 사용하는 buffer 크기
+
+HEADER_END = b"\r\n\r\n"
+
+
+class HttpParseError(Exception):
+    '''
+    request를 파싱할 수 없을 때 발생. status는 client에 돌려줄 응답 상태'''
+    def __init__(self, status : str, message : str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class HttpRequest:
+    '''
+    파싱이 끝난 HTTP request
+
+    method : GET, HEAD, POST, PUT ...
+    path : request path
+    version : HTTP/1.1
+    headers : 소문자 header 이름 -> 값 dict
+    body : bytes
+    route : Router가 찾은 route pattern. 일치하는 route가 없으면 None
+    client : request를 보낸 client의 IP 주소. 연결 loop가 기록하며, 연결 없이 만든 request는 None
+    release : response를 다 보낸 뒤(실패해도) 연결 loop가 호출할 함수. 없으면 None'''
+    __slots__ = ("method", "path", "version", "headers", "body", "route", "client", "release", "_head")
+
+    def __init__(self, method : str, path : str, version : str, headers : dict, head : str):
+        self.method = method
+        self.path = path
+        self.version = version
+        self.headers = headers
+        self.body = b""
+        self.route = None
+        self.client = None
+        self.release = None
+        self._head = head
+
+    def header(self, name : str, default : str=None) -> str:
+        '''
+        header 값을 반환. name은 대소문자 구분 없음'''
+        return self.headers.get(name.lower(), default)
+
+    def query(self) -> dict:
+        '''
+        path의 query string을 이름 -> 값 dict로 반환. 같은 이름이 여러 번 있으면 마지막 값'''
+        return dict(parse_qsl(self.path.partition("?")[2]))
+
+    def text(self) -> str:
+        '''
+        body를 string으로 반환'''
+        return self.body.decode()
+
+    def __str__(self) -> str:
+        '''
+        로그용 request 문자열'''
+        return f"{self._head}\r\n\r\n{self.body.decode(errors='replace')}"
+
+
+class RequestParser:
+    '''
+    연결 하나에 대한 incremental HTTP request parser.
+
+    recv로 받은 data를 feed하면 완성된 request들을 순서대로 반환함.
+    header 끝(\\r\\n\\r\\n)과 Content-Length로 request 경계를 나누므로
+    request가 여러 recv에 걸쳐 오거나(큰 body), 여러 request가 한 번에 와도(pipelining) 처리 가능.
+
+    buffer는 bytearray 하나를 계속 사용하며, 처리한 앞부분만 잘라냄.
+    header 끝을 찾을 때는 이전에 검사한 위치부터 다시 찾으므로 buffer 전체를 반복해서 검사하지 않음.
+    '''
+    def __init__(self, max_header_size : int=MAX_HEADER_SIZE, max_body_size : int=MAX_BODY_SIZE):
+        self.max_header_size = max_header_size
+        self.max_body_size = max_body_size
+
+        self._buffer = bytearray()
+        self._scan_from = 0 # header 끝을 찾기 시작할 위치
+        self._pending = None # header까지 파싱되고 body를 기다리는 request
+        self._body_length = 0
+
+    def feed(self, data) -> list:
+        '''
+        수신한 data를 buffer에 추가하고 완성된 request 리스트를 반환
+
+        data : bytes, bytearray or memoryview
+
+        return : list of HttpRequest. 아직 완성된 request가 없으면 빈 리스트
+        raise : HttpParseError'''
+        buffer = self._buffer
+        buffer += data
+        requests = []
+
+        while True:
+            if self._pending is None:
+                end = buffer.find(HEADER_END, self._scan_from)
+                if end < 0:
+                    if len(buffer) > self.max_header_size:
+                        raise HttpParseError("431 Request Header Fields Too Large", "Header too large")
+                    self._scan_from = max(0, len(buffer) - len(HEADER_END) + 1)
+                    break
+                if end > self.max_header_size:
+                    raise HttpParseError("431 Request Header Fields Too Large", "Header too large")
+
+                self._pending = self._parse_head(bytes(buffer[:end]))
+                del buffer[:end + len(HEADER_END)]
+                self._scan_from = 0
+
+            if len(buffer) < self._body_length:
+                break
+
+            request = self._pending
+            if self._body_length:
+                request.body = bytes(buffer[:self._body_length])
+                del buffer[:self._body_length]
+            self._pending = None
+            self._body_length = 0
+            requests.append(request)
+
+        return requests
+
+    def in_progress(self) -> bool:
+        '''
+        request 일부를 받고 나머지를 기다리는 중인지'''
+        return self._pending is not None or len(self._buffer) > 0
+
+    def _parse_head(self, head : bytes) -> HttpRequest:
+        '''
+        request line과 header를 파싱하고 body 길이를 설정.
+        같은 header가 여러 번 오면 마지막 값을 사용함. 단, 서로 다른 Content-Length나
+        Transfer-Encoding과 Content-Length가 함께 오면 request 경계가 모호하므로 400'''
+        text = head.decode("latin-1")
+        lines = text.split("\r\n")
+
+        request_line = lines[0].split(" ")
+        if len(request_line) != 3:
+            raise HttpParseError("400 Bad Request", "Malformed request line")
+        method, path, version = request_line
+        if not version.startswith("HTTP/"):
+            raise HttpParseError("400 Bad Request", "Malformed request line")
+
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(":")
+            if not sep:
+                raise HttpParseError("400 Bad Request", "Malformed header")
+            (name, value) = (name.strip().lower(), value.strip())
+            if name == "content-length" and headers.get(name, value) != value: # 어느 값으로 body를 나눌 지 모호함 (request smuggling)
+                raise HttpParseError("400 Bad Request", "Invalid Content-Length")
+            headers[name] = value
+
+        if "transfer-encoding" in headers and "content-length" in headers: # body 경계가 모호함 (request smuggling)
+            raise HttpParseError("400 Bad Request", "Both Transfer-Encoding and Content-Length")
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise HttpParseError("501 Not Implemented", "Chunked request body is not supported")
+
+        length = headers.get("content-length", "0")
+        if not (length.isascii() and length.isdigit()): # int()가 받지 못하는 유니코드 숫자("²")도 거절
+            raise HttpParseError("400 Bad Request", "Invalid Content-Length")
+        length = int(length)
+        if length > self.max_body_size:
+            raise HttpParseError("413 Content Too Large", "Body too large")
+
+        self._body_length = length
+        return HttpRequest(method, path, version, headers, text)
@@ -0,0 +1,179 @@
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LEVEL_NAMES = {DEBUG : "DEBUG", INFO : "INFO", WARNING : "WARNING", ERROR : "ERROR"}
+LEVELS = {name.lower() : level for (level, name) in LEVEL_NAMES.items()}
+
+LOG_FLUSH_INTERVAL = 0.2 # 로그 flush 주기(초)
+LOG_FLUSH_BATCH = 512 # 이만큼 쌓이면 주기를 기다리지 않고 flush
+LOG_MAX_QUEUE = 100000 # writer가 따라가지 못할 때 대기열 최대 크기. 넘으면 버리고 개수만 기록
+LOG_MAX_BYTES = 10 * 1024 * 1024 # 로그 파일이 이 크기를 넘으면 rotation
+LOG_BACKUP_COUNT = 5 # server_log.txt.1 ~ .5 까지 보관
+
+
+class LogWriter:
+    '''
+    요청을 처리하는 thread를 막지 않는 로그 기록기.
+
+    log()는 (시각, level, message)를 deque에 append만 함 (deque.append는 lock 없이 thread-safe).
+    message 문자열 변환, 시각 formatting, 파일 쓰기, 화면 출력은 background thread가
+    flush_interval마다(또는 batch_size개가 쌓이면) 모아서 한 번의 write로 처리함.
+
+    level보다 낮은 메세지는 대기열에 넣지도 않음.
+    DEBUG 메세지(raw request 등)는 level이 DEBUG일 때 sample_rate 비율만 기록.
+    파일이 max_bytes를 넘으면 <path>.1, <path>.2 ... 로 밀어내고 새 파일에 씀 (rotate=True일 때).
+    다른 process가 rotation하여 파일이 바뀌면 다시 엶.
+    '''
+    def __init__(self, path : str, level : int=INFO, echo : bool=True, sample_rate : float=1.0,
+                 batch_size : int=LOG_FLUSH_BATCH, flush_interval : float=LOG_FLUSH_INTERVAL,
+                 max_bytes : int=LOG_MAX_BYTES, backup_count : int=LOG_BACKUP_COUNT, rotate : bool=True):
+        '''
+        path : 로그 파일 경로
+        level : 기록할 최소 level (DEBUG, INFO, WARNING, ERROR)
+        echo : 화면(stdout)에도 출력할 지
+        sample_rate : DEBUG 메세지 중 기록할 비율 (0 ~ 1)
+        batch_size, flush_interval : flush 조건
+        max_bytes, backup_count : rotation 크기와 보관할 파일 수
+        rotate : False이면 rotation하지 않고 파일이 바뀌었을 때 다시 열기만 함 (process worker)'''
+        self.path = path
+        self.level = level
+        self.echo = echo
+        self.sample_rate = sample_rate
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.rotate = rotate
+        self.dropped = 0
+
+        self._queue = deque()
+        self._wakeup = threading.Event()
+        self._flush_lock = threading.Lock() # 파일 쓰기는 한 번에 하나만
+        self._closed = False
+
+        self._file = None
+        self._inode = None # rotation 감지용
+        self._open()
+        self._writer = threading.Thread(target=self._writer_loop, name="log-writer", daemon=True)
+        self._writer.start()
+
+    def enabled(self, level : int) -> bool:
+        return level >= self.level
+
+    def worker_options(self) -> dict:
+        '''
+        process worker에서 같은 파일에 기록하는 LogWriter를 만들 인자.
+        rotation은 parent process만 하고 worker는 파일이 바뀌면 다시 엶'''
+        return {"path" : self.path, "level" : self.level, "echo" : self.echo, "sample_rate" : self.sample_rate,
+                "batch_size" : self.batch_size, "flush_interval" : self.flush_interval, "rotate" : False}
+
+    def log(self, message, level : int=INFO) -> None:
+        '''
+        message를 대기열에 추가. str() 변환은 writer thread에서 함
+
+        message : 기록할 메세지 (str 또는 str()로 변환할 object)
+        level : DEBUG, INFO, WARNING, ERROR'''
+        if level < self.level:
+            return
+        if level == DEBUG and self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        if len(self._queue) >= LOG_MAX_QUEUE:
+            self.dropped += 1
+            return
+        self._queue.append((time.time(), level, message))
+        if len(self._queue) >= self.batch_size:
+            self._wakeup.set()
+
+    def _writer_loop(self) -> None:
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        '''
+        대기열의 메세지를 모아 파일에 쓰고 화면에 출력'''
+        with self._flush_lock:
+            lines = []
+            echo = []
+            last_second = None
+            timestamp = ""
+            while True:
+                try:
+                    (created, level, message) = self._queue.popleft()
+                except IndexError:
+                    break
+                second = int(created)
+                if second != last_second: # 같은 초의 메세지는 timestamp 문자열을 재사용
+                    timestamp = time.strftime("[%Y-%m-%d %H:%M:%S]", time.localtime(second))
+                    last_second = second
+                text = str(message)
+                lines.append(f"{timestamp} [{LEVEL_NAMES.get(level, level)}] {text}\n")
+                if self.echo:
+                    echo.append(text + "\n")
+
+            if self.dropped:
+                (dropped, self.dropped) = (self.dropped, 0)
+                lines.append(f"{time.strftime('[%Y-%m-%d %H:%M:%S]')} [WARNING] {dropped} log messages dropped\n")
+            if not lines:
+                return
+
+            self._reopen_if_moved()
+            self._file.write("".join(lines))
+            self._file.flush()
+            if echo:
+                try:
+                    sys.stdout.write("".join(echo))
+                    sys.stdout.flush()
+                except (OSError, ValueError): # stdout이 닫힌 경우
+                    pass
+            if self.rotate and self.max_bytes and self._file.tell() >= self.max_bytes:
+                self._do_rotate()
+
+    def close(self) -> None:
+        '''
+        writer thread를 멈추고 남은 메세지를 기록'''
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        self._writer.join()
+        self.flush()
+        self._file.close()
+
+    def _open(self) -> None:
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._inode = os.fstat(self._file.fileno()).st_ino
+
+    def _reopen_if_moved(self) -> None:
+        '''
+        다른 process가 rotation하여 path가 다른 파일이 되었으면 다시 엶'''
+        try:
+            moved = os.stat(self.path).st_ino != self._inode
+        except FileNotFoundError:
+            moved = True
+        if moved:
+            self._file.close()
+            self._open()
+
+    def _do_rotate(self) -> None:
+        '''
+        path.(n-1) -> path.n, ..., path -> path.1 로 이름을 바꾸고 새 파일을 엶'''
+        self._file.close()
+        if self.backup_count > 0:
+            for i in range(self.backup_count - 1, 0, -1):
+                source = f"{self.path}.{i}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.path}.{i + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
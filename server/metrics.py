@@ -0,0 +1,373 @@
+import functools
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# 상한(초) 목록. Prometheus histogram의 le label
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+LOCK_WAIT_BUCKETS = (0.000001, 0.00001, 0.0001, 0.001, 0.01, 0.1, 1.0)
+
+METHODS = ("GET", "HEAD", "POST", "PUT", "DELETE") # 이 외의 method는 "OTHER"로 집계
+SNAPSHOT_INTERVAL = 1.0 # process mode에서 다른 process가 읽을 snapshot을 쓰는 주기(초)
+
+
+class Histogram:
+    '''
+    고정 bucket histogram. observe는 bucket 하나의 count만 증가시킴 (누적은 출력할 때 계산)'''
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets : tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # 마지막은 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value : float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, counts : list, total : float, count : int) -> None:
+        for i, value in enumerate(counts):
+            self.counts[i] += value
+        self.sum += total
+        self.count += count
+
+    def quantile(self, q : float) -> float:
+        '''
+        bucket 안에서 선형 보간한 q 분위수 추정값 (Prometheus histogram_quantile과 같은 방식)'''
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, value in enumerate(self.counts):
+            if cumulative + value >= rank and value:
+                if i == len(self.buckets): # +Inf bucket
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / value
+            cumulative += value
+        return self.buckets[-1]
+
+
+class Metrics:
+    '''
+    서버 내부 지표 수집기. /metrics에서 Prometheus text format으로 출력.
+
+    - http_requests_total{route, method, status} : 요청 수
+    - http_response_bytes_total{route} : 보낸 response 크기 (header + body)
+    - http_request_duration_seconds{route} : request_handler 처리 시간 histogram
+    - handler_duration_seconds{handler} : 각 handler 처리 시간 histogram
+    - user_store_duration_seconds{op} : user database 조회/변경 시간 histogram
+    - user_store_lock_wait_seconds : JsonUserStore의 사용자 lock 대기 시간 histogram
+    - http_active_connections : 현재 연결 수 gauge
+    - http_connections_closed_total{reason} : 닫은 연결 수 (client, idle_timeout, read_timeout, write_timeout,
+      max_requests, drain, bad_request, tls_handshake)
+    - tls_handshake_duration_seconds{resumed} : TLS handshake 시간 histogram (session 재개 여부별)
+    - http_throttled_total{reason} : 429로 거절한 request 수 (ip, user, login, downloads)
+
+    모든 갱신은 짧은 lock 하나 안에서 dict 조회와 정수 덧셈만 함.
+
+    process mode에서는 share(directory)로 각 process가 SNAPSHOT_INTERVAL마다 <directory>/<pid>.json에
+    자기 지표를 쓰고, render()가 다른 process의 snapshot을 합쳐서 출력함.
+    '''
+    def __init__(self, directory : str=None):
+        '''
+        directory : None이 아니면 share(directory)'''
+        self.started = time.time()
+        self.active_connections = 0
+
+        self._requests = {} # (route, method, status) -> count
+        self._bytes = {} # route -> bytes
+        self._latency = {} # route -> Histogram
+        self._handlers = {} # handler -> Histogram
+        self._store = {} # op -> Histogram
+        self._lock_wait = Histogram(LOCK_WAIT_BUCKETS)
+        self._tls = {} # "true"/"false" -> Histogram
+        self._closed = {} # reason -> count
+        self._throttled = {} # reason -> count
+        self._lock = threading.Lock()
+
+        self.directory = None
+        self._snapshot_thread = None
+        if directory is not None:
+            self.share(directory)
+
+    def observe_request(self, route : str, method : str, status : str, size : int, seconds : float) -> None:
+        '''
+        route : Router가 찾은 route pattern. None(일치하는 route 없음)이면 "other".
+                client가 보낸 path가 아닌 등록된 pattern만 label로 쓰므로 label이 무한히 늘어나지 않음'''
+        if route is None:
+            route = "other"
+        if method not in METHODS:
+            method = "OTHER"
+        with self._lock:
+            key = (route, method, status)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            self._bytes[route] = self._bytes.get(route, 0) + size
+            histogram = self._latency.get(route)
+            if histogram is None:
+                histogram = self._latency[route] = Histogram(LATENCY_BUCKETS)
+            histogram.observe(seconds)
+
+    def observe_handler(self, handler : str, seconds : float) -> None:
+        with self._lock:
+            histogram = self._handlers.get(handler)
+            if histogram is None:
+                histogram = self._handlers[handler] = Histogram(LATENCY_BUCKETS)
+            histogram.observe(seconds)
+
+    def observe_store(self, op : str, seconds : float) -> None:
+        with self._lock:
+            histogram = self._store.get(op)
+            if histogram is None:
+                histogram = self._store[op] = Histogram(LATENCY_BUCKETS)
+            histogram.observe(seconds)
+
+    def observe_lock_wait(self, seconds : float) -> None:
+        with self._lock:
+            self._lock_wait.observe(seconds)
+
+    def observe_tls_handshake(self, resumed : bool, seconds : float) -> None:
+        key = "true" if resumed else "false"
+        with self._lock:
+            histogram = self._tls.get(key)
+            if histogram is None:
+                histogram = self._tls[key] = Histogram(LATENCY_BUCKETS)
+            histogram.observe(seconds)
+
+    def connection_opened(self) -> None:
+        with self._lock:
+            self.active_connections += 1
+
+    def connection_closed(self, reason : str="client") -> None:
+        '''
+        reason : 연결을 닫은 이유'''
+        with self._lock:
+            self.active_connections -= 1
+            self._closed[reason] = self._closed.get(reason, 0) + 1
+
+    def throttled(self, reason : str) -> None:
+        '''
+        reason : 거절한 제한 (rate_limit.AdmissionControl의 ip, user, login, downloads)'''
+        with self._lock:
+            self._throttled[reason] = self._throttled.get(reason, 0) + 1
+
+    def share(self, directory : str) -> None:
+        '''
+        process 간에 지표를 합치기 위해 directory에 주기적으로 snapshot을 씀'''
+        self.directory = directory
+        self._snapshot_thread = threading.Thread(target=self._snapshot_loop, name="metrics-snapshot", daemon=True)
+        self._snapshot_thread.start()
+
+    def snapshot(self) -> dict:
+        '''
+        현재 지표를 json으로 저장할 수 있는 dict로 반환'''
+        def histograms(table):
+            return [[key, h.counts, h.sum, h.count] for (key, h) in table.items()]
+        with self._lock:
+            return {
+                "requests" : [[list(key), count] for (key, count) in self._requests.items()],
+                "bytes" : list(self._bytes.items()),
+                "latency" : histograms(self._latency),
+                "handlers" : histograms(self._handlers),
+                "store" : histograms(self._store),
+                "lock_wait" : [self._lock_wait.counts, self._lock_wait.sum, self._lock_wait.count],
+                "tls" : histograms(self._tls),
+                "closed" : list(self._closed.items()),
+                "throttled" : list(self._throttled.items()),
+                "active_connections" : self.active_connections,
+            }
+
+    def render(self) -> str:
+        '''
+        Prometheus text format (version 0.0.4)'''
+        merged = Metrics()
+        merged._merge(self.snapshot(), live=True)
+        for snapshot, live in self._other_snapshots():
+            merged._merge(snapshot, live)
+
+        lines = []
+        lines.append("# HELP http_requests_total Total HTTP requests.")
+        lines.append("# TYPE http_requests_total counter")
+        for ((route, method, status), count) in sorted(merged._requests.items()):
+            lines.append(f'http_requests_total{{route="{route}",method="{method}",status="{status}"}} {count}')
+        lines.append("# HELP http_response_bytes_total Bytes sent in responses (header and body).")
+        lines.append("# TYPE http_response_bytes_total counter")
+        for (route, size) in sorted(merged._bytes.items()):
+            lines.append(f'http_response_bytes_total{{route="{route}"}} {size}')
+        _render_histograms(lines, "http_request_duration_seconds", "Time spent in request_handler.", "route", merged._latency)
+        lines.append("# HELP http_request_duration_estimate_seconds p50/p99 of http_request_duration_seconds estimated from the buckets.")
+        lines.append("# TYPE http_request_duration_estimate_seconds gauge")
+        for route in sorted(merged._latency):
+            for q in (0.5, 0.99):
+                lines.append(f'http_request_duration_estimate_seconds{{route="{route}",quantile="{q}"}} '
+                             f'{merged._latency[route].quantile(q):.6f}')
+        _render_histograms(lines, "handler_duration_seconds", "Time spent in each handler.", "handler", merged._handlers)
+        _render_histograms(lines, "user_store_duration_seconds", "Time spent in user database operations.", "op", merged._store)
+        _render_histograms(lines, "user_store_lock_wait_seconds", "Time waiting for JsonUserStore user locks.", None,
+                           {None : merged._lock_wait})
+        _render_histograms(lines, "tls_handshake_duration_seconds", "Time spent in TLS handshakes.", "resumed", merged._tls)
+        lines.append("# HELP http_active_connections Open client connections.")
+        lines.append("# TYPE http_active_connections gauge")
+        lines.append(f"http_active_connections {merged.active_connections}")
+        lines.append("# HELP http_connections_closed_total Closed client connections by reason.")
+        lines.append("# TYPE http_connections_closed_total counter")
+        for (reason, count) in sorted(merged._closed.items()):
+            lines.append(f'http_connections_closed_total{{reason="{reason}"}} {count}')
+        lines.append("# HELP http_throttled_total Requests rejected with 429 by admission control.")
+        lines.append("# TYPE http_throttled_total counter")
+        for (reason, count) in sorted(merged._throttled.items()):
+            lines.append(f'http_throttled_total{{reason="{reason}"}} {count}')
+        lines.append("# HELP process_start_time_seconds Start time of the server.")
+        lines.append("# TYPE process_start_time_seconds gauge")
+        lines.append(f"process_start_time_seconds {self.started:.3f}")
+        return "\n".join(lines) + "\n"
+
+    def close(self) -> None:
+        '''
+        snapshot 파일을 지움'''
+        if self.directory is not None:
+            try:
+                os.remove(os.path.join(self.directory, f"{os.getpid()}.json"))
+            except OSError:
+                pass
+            self.directory = None
+
+    def _merge(self, snapshot : dict, live : bool) -> None:
+        for (key, count) in snapshot["requests"]:
+            key = tuple(key)
+            self._requests[key] = self._requests.get(key, 0) + count
+        for (route, size) in snapshot["bytes"]:
+            self._bytes[route] = self._bytes.get(route, 0) + size
+        for (name, buckets) in (("latency", LATENCY_BUCKETS), ("handlers", LATENCY_BUCKETS), ("store", LATENCY_BUCKETS),
+                                ("tls", LATENCY_BUCKETS)):
+            table = getattr(self, "_" + name)
+            for (key, counts, total, count) in snapshot.get(name, ()):
+                table.setdefault(key, Histogram(buckets)).merge(counts, total, count)
+        for (reason, count) in snapshot.get("closed", ()):
+            self._closed[reason] = self._closed.get(reason, 0) + count
+        for (reason, count) in snapshot.get("throttled", ()):
+            self._throttled[reason] = self._throttled.get(reason, 0) + count
+        self._lock_wait.merge(*snapshot["lock_wait"])
+        if live: # 종료된 process의 연결 수는 더하지 않음
+            self.active_connections += snapshot["active_connections"]
+
+    def _other_snapshots(self):
+        '''
+        directory에 있는 다른 process의 snapshot. (snapshot, process가 살아있는 지)'''
+        if self.directory is None:
+            return
+        own = f"{os.getpid()}.json"
+        for name in os.listdir(self.directory):
+            if name == own or not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError): # 쓰는 중이거나 지워진 파일
+                continue
+            yield (snapshot, _is_alive(int(name[:-len(".json")])))
+
+    def flush(self) -> bool:
+        '''
+        share(directory)한 경우 현재 지표를 snapshot 파일에 씀. 종료하는 process는 마지막으로 호출하여
+        SNAPSHOT_INTERVAL 동안의 지표도 남김 (close와 달리 파일을 지우지 않음)
+
+        return : directory가 정리되어 쓸 수 없으면 False'''
+        directory = self.directory
+        if directory is None:
+            return False
+        path = os.path.join(directory, f"{os.getpid()}.json")
+        tmp = f"{path}.{threading.get_ident()}.tmp" # snapshot thread와 동시에 쓰지 않도록
+        try:
+            with open(tmp, "w") as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp, path)
+        except OSError: # directory가 정리된 경우
+            return False
+        return True
+
+    def _snapshot_loop(self) -> None:
+        while self.flush():
+            time.sleep(SNAPSHOT_INTERVAL)
+
+
+class TimedStore:
+    '''
+    user database(UserStore 또는 process worker의 proxy)의 get/create/update 시간을 Metrics에 기록하는 wrapper.
+    그 외의 속성은 원래 store로 전달'''
+    def __init__(self, store, metrics : Metrics):
+        self.store = store
+        self.metrics = metrics
+
+    def get(self, id : str) -> dict:
+        start = time.perf_counter()
+        try:
+            return self.store.get(id)
+        finally:
+            self.metrics.observe_store("get", time.perf_counter() - start)
+
+    def create(self, id : str, record : dict) -> bool:
+        start = time.perf_counter()
+        try:
+            return self.store.create(id, record)
+        finally:
+            self.metrics.observe_store("create", time.perf_counter() - start)
+
+    def update(self, id : str, fields : dict) -> bool:
+        start = time.perf_counter()
+        try:
+            return self.store.update(id, fields)
+        finally:
+            self.metrics.observe_store("update", time.perf_counter() - start)
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def __getattr__(self, name : str):
+        return getattr(self.store, name)
+
+
+def timed(handler : str):
+    '''
+    Server handler method의 처리 시간을 self.metrics에 기록하는 decorator
+
+    handler : handler_duration_seconds의 handler label'''
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self.metrics.observe_handler(handler, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def _render_histograms(lines : list, name : str, help : str, label : str, table : dict) -> None:
+    lines.append(f"# HELP {name} {help}")
+    lines.append(f"# TYPE {name} histogram")
+    for key in sorted(table, key=str):
+        histogram = table[key]
+        prefix = f'{label}="{key}",' if label else ""
+        labels = f"{{{prefix[:-1]}}}" if label else ""
+        cumulative = 0
+        for (bound, count) in zip(histogram.buckets + ("+Inf",), histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+        lines.append(f"{name}_sum{labels} {histogram.sum}")
+        lines.append(f"{name}_count{labels} {histogram.count}")
+
+
+def _is_alive(pid : int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
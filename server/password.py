@@ -0,0 +1,88 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+
+KDF_N = 2 ** 14 # scrypt cost (CPU/memory). 2의 거듭제곱
+KDF_R = 8 # scrypt block size
+KDF_P = 1 # scrypt 병렬도
+KDF_SALT_BYTES = 16
+KDF_KEY_BYTES = 32
+KDF_WORKERS = os.cpu_count() or 1 # 동시에 계산하는 hash 수
+SCHEME = "scrypt"
+
+
+def _b64encode(data : bytes) -> str:
+    return base64.b64encode(data).decode("ascii")
+
+
+class PasswordHasher:
+    '''
+    scrypt로 password를 hash하고 검증함.
+
+    저장 형식 : scrypt$<n>$<r>$<p>$<salt base64>$<hash base64>
+    검증은 저장된 parameter를 사용하므로 cost를 바꿔도 기존 hash를 그대로 검증할 수 있음.
+    parameter가 현재 값과 다르거나 평문(이전 users.json 형식)으로 저장된 password는 needs_rehash로 알려줌.
+
+    hash 계산은 요청 하나에 수십 ms가 걸리고 scrypt는 계산마다 128 * r * n byte를 사용하므로
+    workers개 thread의 pool에서만 실행하여 동시에 계산하는 수를 제한함.
+    hashlib.scrypt는 계산 중 GIL을 놓으므로 pool의 thread들은 병렬로 실행되고,
+    요청을 처리하는 thread나 accept loop, event loop는 막히지 않음.
+    '''
+    def __init__(self, n : int=KDF_N, r : int=KDF_R, p : int=KDF_P, workers : int=KDF_WORKERS):
+        '''
+        n, r, p : scrypt parameter. n은 2보다 큰 2의 거듭제곱
+        workers : hash를 계산하는 thread 수'''
+        if n < 2 or n & (n - 1):
+            raise ValueError(f"scrypt n must be a power of 2: {n}")
+        self.n = n
+        self.r = r
+        self.p = p
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="kdf")
+        self._dummy = None # 없는 사용자도 같은 시간이 걸리도록 검증할 hash
+
+    def options(self) -> dict:
+        '''
+        process worker에서 같은 설정의 PasswordHasher를 만들 인자'''
+        return {"n" : self.n, "r" : self.r, "p" : self.p, "workers" : self.workers}
+
+    def hash(self, password : str) -> str:
+        '''
+        password의 저장용 hash 문자열을 반환 (pool에서 계산)'''
+        salt = secrets.token_bytes(KDF_SALT_BYTES)
+        key = self._pool.submit(self._derive, password, salt, self.n, self.r, self.p).result()
+        return f"{SCHEME}${self.n}${self.r}${self.p}${_b64encode(salt)}${_b64encode(key)}"
+
+    def verify(self, password : str, stored : str) -> tuple:
+        '''
+        password가 stored와 일치하는 지 검사 (pool에서 계산)
+
+        stored : hash()가 만든 문자열 또는 평문 password. None이면 없는 사용자로 보고 dummy hash로 검증
+
+        return : (일치 여부, 현재 parameter로 다시 hash해야 하는 지)'''
+        if stored is None:
+            if self._dummy is None:
+                self._dummy = self.hash(secrets.token_hex(8))
+            self.verify(password, self._dummy)
+            return (False, False)
+
+        parts = stored.split("$")
+        if len(parts) != 6 or parts[0] != SCHEME: # 평문 password (이전 형식)
+            return (hmac.compare_digest(password.encode(), stored.encode()), True)
+
+        (_, n, r, p, salt, expected) = parts
+        (n, r, p) = (int(n), int(r), int(p))
+        key = self._pool.submit(self._derive, password, base64.b64decode(salt), n, r, p).result()
+        matched = hmac.compare_digest(key, base64.b64decode(expected))
+        return (matched, matched and (n, r, p) != (self.n, self.r, self.p))
+
+    @staticmethod
+    def _derive(password : str, salt : bytes, n : int, r : int, p : int) -> bytes:
+        maxmem = 128 * r * (n + p + 2) + 1024 * 1024 # scrypt가 사용하는 memory + 여유분
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=maxmem, dklen=KDF_KEY_BYTES)
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,141 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+IP_RATE = 100.0 # IP마다 초당 request 수 (token 보충 속도)
+IP_BURST = 200 # IP마다 한 번에 보낼 수 있는 request 수 (bucket 크기)
+AUTH_COST = 10 # /login, /register가 IP bucket에서 쓰는 token 수 (password hash 계산 비용)
+USER_RATE = 50.0 # 사용자(key cookie)마다 초당 이미지 request 수
+USER_BURST = 100
+LOGIN_RATE = 0.5 # (client IP, username)마다 초당 로그인 시도 수
+LOGIN_BURST = 5
+MAX_DOWNLOADS = 8 # 사용자마다 동시에 보내는 이미지 response 수 (client의 DOWNLOAD_CONCURRENCY)
+MAX_KEYS = 100000 # bucket table 하나에 유지하는 최대 key 수 (넘으면 새 key는 공유 bucket 하나를 씀)
+
+
+class TokenBuckets:
+    '''
+    key(IP, username)마다의 token bucket.
+
+    bucket마다 token 수와 시각 대신 "bucket이 다시 가득 차는 시각"(GCRA의 theoretical arrival time) float 하나만 저장함.
+    request는 그 시각을 cost / rate만큼 미루고, 미룬 시각이 지금보다 burst / rate 이상 앞서면 거절함.
+    table은 마지막으로 사용한 순서의 OrderedDict이므로, 앞쪽부터 이미 가득 찬(시각이 지난) bucket을
+    사용할 때마다 지움 (lazy expiry). 가득 찬 bucket은 없는 bucket과 같으므로 지워도 결과는 같음.
+    아직 차지 않은 bucket은 지우지 않음 (지우면 key를 바꿔가며 보내는 client가 제한을 초기화할 수 있음).
+    key가 max_keys개이고 모두 아직 차지 않았으면, 새 key는 하나의 공유 bucket(overflow)을 함께 씀. 모두 O(1) (amortized).
+    '''
+    def __init__(self, rate : float, burst : int, max_keys : int=MAX_KEYS):
+        '''
+        rate : 초당 보충하는 token 수. 0이면 제한하지 않음
+        burst : bucket 크기 (연속으로 허용하는 request 수)'''
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._full_at = OrderedDict() # key -> bucket이 가득 차는 시각 (time.monotonic)
+        self._overflow_at = 0.0 # table이 찼을 때 새 key들이 함께 쓰는 bucket이 가득 차는 시각
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._full_at)
+
+    def acquire(self, key, cost : float=1) -> float:
+        '''
+        key의 bucket에서 token cost개를 씀
+
+        return : 허용하면 0. 거절하면 token이 충분해질 때까지 기다려야 하는 시간(초)'''
+        if not self.rate:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            table = self._full_at
+            while table:
+                (oldest, full_at) = next(iter(table.items()))
+                if full_at > now:
+                    break
+                del table[oldest]
+            overflow = key not in table and len(table) >= self.max_keys
+            previous = self._overflow_at if overflow else table.get(key, now)
+            full_at = max(previous, now) + cost / self.rate
+            wait = full_at - now - self.burst / self.rate
+            if wait > 0:
+                return wait
+            if overflow:
+                self._overflow_at = full_at
+            else:
+                table[key] = full_at
+                table.move_to_end(key)
+            return 0
+
+
+class ConcurrencyLimits:
+    '''
+    key(사용자)마다 동시에 진행 중인 작업 수 제한. 진행 중인 작업이 있는 key만 저장함
+    '''
+    def __init__(self, limit : int):
+        '''
+        limit : key마다 동시에 허용하는 작업 수. 0이면 제한하지 않음'''
+        self.limit = limit
+        self._counts = {} # key -> 진행 중인 작업 수
+        self._lock = threading.Lock()
+
+    def acquire(self, key) -> bool:
+        '''
+        return : 허용하면 True (끝나면 release(key)). limit개가 진행 중이면 False'''
+        with self._lock:
+            count = self._counts.get(key, 0)
+            if self.limit and count >= self.limit:
+                return False
+            self._counts[key] = count + 1
+            return True
+
+    def release(self, key) -> None:
+        with self._lock:
+            count = self._counts.pop(key) - 1
+            if count:
+                self._counts[key] = count
+
+
+class AdmissionControl:
+    '''
+    request를 처리하기 전에 적용하는 제한. 넘으면 Server가 429 Too Many Requests와 Retry-After로 거절함.
+
+    - ip : client IP마다 모든 request (token bucket). /login, /register는 AUTH_COST개를 씀
+    - user : 사용자(key cookie)마다 이미지 request (token bucket)
+    - login : (client IP, username)마다 로그인 시도 (token bucket). 한 계정에 대한 password 대입을 늦춤.
+              username만으로 제한하지 않으므로 다른 client가 그 사용자의 로그인을 막을 수 없음
+    - downloads : 사용자마다 동시에 보내는 이미지 response 수
+
+    process, prefork mode에서는 worker process마다 따로 제한함.
+    '''
+    def __init__(self, ip_rate : float=IP_RATE, ip_burst : int=IP_BURST, user_rate : float=USER_RATE,
+                 user_burst : int=USER_BURST, login_rate : float=LOGIN_RATE, login_burst : int=LOGIN_BURST,
+                 max_downloads : int=MAX_DOWNLOADS, max_keys : int=MAX_KEYS):
+        '''
+        *_rate : 초당 request 수. 0이면 제한하지 않음
+        *_burst : 연속으로 허용하는 request 수
+        max_downloads : 사용자마다 동시에 보내는 이미지 response 수. 0이면 제한하지 않음
+        max_keys : bucket table마다 유지하는 최대 key 수'''
+        self.ip = TokenBuckets(ip_rate, max(ip_burst, AUTH_COST), max_keys)
+        self.user = TokenBuckets(user_rate, user_burst, max_keys)
+        self.login = TokenBuckets(login_rate, login_burst, max_keys)
+        self.downloads = ConcurrencyLimits(max_downloads)
+
+    def options(self) -> dict:
+        '''
+        process worker에서 같은 제한을 만드는 인자'''
+        return {"ip_rate" : self.ip.rate, "ip_burst" : self.ip.burst, "user_rate" : self.user.rate,
+                "user_burst" : self.user.burst, "login_rate" : self.login.rate, "login_burst" : self.login.burst,
+                "max_downloads" : self.downloads.limit, "max_keys" : self.ip.max_keys}
+
+    @classmethod
+    def disabled(cls):
+        '''
+        아무것도 제한하지 않는 AdmissionControl (benchmark 등)'''
+        return cls(ip_rate=0, user_rate=0, login_rate=0, max_downloads=0)
+
+
+def retry_after(wait : float) -> int:
+    '''
+    기다려야 하는 시간(초)을 Retry-After header 값(1 이상의 정수)으로'''
+    return max(1, math.ceil(wait))
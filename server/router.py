@@ -0,0 +1,240 @@
+import functools
+import json
+import re
+
+from http_parser import HttpRequest
+
+_PARAM = re.compile(r"\{(\w+)(?::path)?\}") # {name} : "/"를 포함하지 않는 구간, {name:path} : 나머지 전체
+
+
+class HttpError(Exception):
+    '''
+    route에서 처리할 수 없는 request. Router의 error_handler가 status 응답으로 바꿈
+
+    status : "400 Bad Request" 형식
+    message : 응답 body
+    headers : 추가 header 목록'''
+    def __init__(self, status : str, message : str, headers : list=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers
+
+
+class Route:
+    '''
+    (method, pattern) 하나에 등록된 handler'''
+    __slots__ = ("method", "pattern", "handler", "fields", "skip")
+
+    def __init__(self, method : str, pattern : str, handler, fields : tuple, skip : tuple=()):
+        self.method = method
+        self.pattern = pattern
+        self.handler = handler
+        self.fields = fields
+        self.skip = skip
+
+
+class Router:
+    '''
+    선언적 route table.
+
+    route(method, pattern, fields)로 handler를 등록하면, 처음 dispatch할 때 한 번 compile함 :
+    - param이 없는 pattern : path -> {method : Route} dict. 조회 한 번(O(1))으로 handler를 찾음
+    - param이 있는 pattern("/images/{name}") : 첫 path 구간별로 나눈 정규식 목록. 같은 구간의 pattern만 비교
+    - middleware : middleware(target, request, call_next) 를 등록 순서대로 감싼 호출 chain.
+      skip을 준 route의 path는 그 middleware들을 뺀 chain을 따로 만들어 path 조회 한 번으로 고름
+
+    fields를 주면 body를 JSON object로 한 번만 파싱하고 각 field가 문자열인 지 확인하여 handler에 keyword로 전달.
+    path param도 keyword로 전달함 : handler(target, request, **fields, **params)
+
+    path가 없으면 404, path는 있지만 method가 없으면 405(Allow header 포함),
+    body가 JSON object가 아니거나 field가 없으면 400을 error_handler로 만들어 반환.
+    head_handler가 있으면 HEAD route가 없고 GET route가 있는 path의 HEAD request는 GET handler로 처리하고
+    그 응답을 head_handler로 body 없이 바꿈 (Allow에도 HEAD를 넣음).
+    '''
+    def __init__(self, error_handler, head_handler=None):
+        '''
+        error_handler : error_handler(target, HttpError) -> response. HttpError를 응답으로 바꿈
+        head_handler : head_handler(target, response) -> response. GET handler의 응답에서 body를 뺌.
+                       None이면 HEAD route가 없는 path의 HEAD request는 405'''
+        self.error_handler = error_handler
+        self.head_handler = head_handler
+        self._routes = []
+        self._middlewares = []
+        self._exact = None # path -> {method : Route}
+        self._params = None # 첫 path 구간 -> [(정규식, {method : Route}, pattern)]
+        self._call = None # middleware로 감싼 _invoke
+        self._chains = None # skip이 있는 path -> 그 middleware를 뺀 chain
+
+    def route(self, method : str, pattern : str, fields : tuple=(), skip : tuple=()):
+        '''
+        handler를 등록하는 decorator. handler는 그대로 반환
+
+        method : GET, HEAD, POST, PUT ...
+        pattern : "/login", "/images/{name}", "/files/{path:path}"
+        fields : body JSON object에서 꺼내 handler에 전달할 문자열 field 이름
+        skip : 이 path의 request에서 실행하지 않을 middleware (등록한 함수). param이 없는 pattern만 가능하며
+               middleware는 route를 찾기 전에 실행되므로 path의 모든 method에 적용됨'''
+        def decorator(handler):
+            self.add(method, pattern, handler, fields, skip)
+            return handler
+        return decorator
+
+    def add(self, method : str, pattern : str, handler, fields : tuple=(), skip : tuple=()) -> None:
+        if skip and _PARAM.search(pattern) is not None:
+            raise ValueError(f"skip needs a fixed path: {pattern}")
+        self._routes.append(Route(method, pattern, handler, tuple(fields), tuple(skip)))
+        self._call = None # 다시 compile
+
+    def middleware(self, middleware):
+        '''
+        middleware를 등록하는 decorator. 먼저 등록한 middleware가 바깥쪽에서 실행됨
+
+        middleware(target, request, call_next) -> response. call_next(target, request)로 다음 단계를 호출'''
+        self._middlewares.append(middleware)
+        self._call = None
+        return middleware
+
+    def compile(self) -> None:
+        '''
+        등록된 route와 middleware로 조회 table과 호출 chain을 만듦'''
+        exact = {}
+        grouped = {}
+        for route in self._routes:
+            table = exact if _PARAM.search(route.pattern) is None else grouped
+            methods = table.setdefault(route.pattern, {})
+            if route.method in methods:
+                raise ValueError(f"Duplicate route: {route.method} {route.pattern}")
+            methods[route.method] = route
+
+        params = {}
+        for (pattern, methods) in grouped.items():
+            segment = _first_segment(pattern)
+            if _PARAM.search(segment): # "/{name}/..." 는 모든 path와 비교
+                segment = ""
+            params.setdefault(segment, []).append((_compile_pattern(pattern), methods, pattern))
+
+        skips = {}
+        for route in self._routes:
+            if route.skip:
+                skips.setdefault(route.pattern, set()).update(route.skip)
+        chains = {path : self._build_chain(skip) for (path, skip) in skips.items()}
+        (self._exact, self._params, self._chains, self._call) = (exact, params, chains, self._build_chain(()))
+
+    def _build_chain(self, skip):
+        '''
+        skip에 없는 middleware로 _invoke를 감싼 호출 chain'''
+        call = self._invoke
+        for middleware in reversed(self._middlewares):
+            if middleware not in skip:
+                call = functools.partial(_chain, middleware, call)
+        return call
+
+    def dispatch(self, target, request : HttpRequest) -> tuple:
+        '''
+        request에 맞는 handler를 middleware chain을 거쳐 호출
+
+        target : handler의 첫 번째 인자 (Server)
+        request : RequestParser가 파싱한 HttpRequest. 일치한 pattern은 request.route에 기록
+
+        return : handler 또는 error_handler의 return 값'''
+        if self._call is None:
+            self.compile()
+        if self._chains:
+            return self._chains.get(request.path.partition("?")[0], self._call)(target, request)
+        return self._call(target, request)
+
+    def resolve(self, method : str, path : str) -> tuple:
+        '''
+        method와 path에 맞는 route를 찾음 (query string은 무시)
+
+        return : (Route, path params dict)
+        raise : HttpError (404, 405)'''
+        if self._call is None:
+            self.compile()
+        (_, methods, params) = self._match(path)
+        return (self._method_route(methods, method), params)
+
+    def _match(self, path : str) -> tuple:
+        '''
+        return : (pattern, {method : Route}, path params dict)
+        raise : HttpError (404)'''
+        path = path.partition("?")[0]
+        methods = self._exact.get(path)
+        if methods is not None:
+            return (path, methods, {})
+        for bucket in (_first_segment(path), ""):
+            for (regex, methods, pattern) in self._params.get(bucket, ()):
+                match = regex.fullmatch(path)
+                if match is not None:
+                    return (pattern, methods, match.groupdict())
+        raise HttpError("404 Not Found", "Page not found")
+
+    def _method_route(self, methods : dict, method : str) -> Route:
+        route = methods.get(method)
+        if route is None and method == "HEAD" and self.head_handler is not None:
+            route = methods.get("GET")
+        if route is None:
+            allowed = set(methods)
+            if "GET" in allowed and self.head_handler is not None:
+                allowed.add("HEAD")
+            raise HttpError("405 Method Not Allowed", "Method not allowed", [f"Allow: {', '.join(sorted(allowed))}"])
+        return route
+
+    def _invoke(self, target, request : HttpRequest) -> tuple:
+        '''
+        middleware chain의 가장 안쪽. route를 찾고 body를 파싱하여 handler 호출'''
+        try:
+            (pattern, methods, params) = self._match(request.path)
+            request.route = pattern
+            route = self._method_route(methods, request.method)
+            if route.fields:
+                params.update(_parse_fields(request, route.fields))
+            response = route.handler(target, request, **params)
+        except HttpError as e:
+            return self.error_handler(target, e)
+        if route.method != request.method: # GET handler로 처리한 HEAD
+            return self.head_handler(target, response)
+        return response
+
+
+def _chain(middleware, call_next, target, request : HttpRequest) -> tuple:
+    return middleware(target, request, call_next)
+
+
+def _compile_pattern(pattern : str) -> re.Pattern:
+    '''
+    "/images/{name}" -> /images/(?P<name>[^/]+) 형식의 정규식 (fullmatch로 비교)'''
+    parts = []
+    position = 0
+    for match in _PARAM.finditer(pattern):
+        parts.append(re.escape(pattern[position:match.start()]))
+        parts.append(f"(?P<{match.group(1)}>{'.+' if match.group(0).endswith(':path}') else '[^/]+'})")
+        position = match.end()
+    parts.append(re.escape(pattern[position:]))
+    return re.compile("".join(parts))
+
+
+def _first_segment(path : str) -> str:
+    return path.split("/", 2)[1] if path.startswith("/") else ""
+
+
+def _parse_fields(request : HttpRequest, fields : tuple) -> dict:
+    '''
+    body를 JSON object로 파싱하고 fields의 값을 꺼냄
+
+    raise : HttpError (400) body가 JSON object가 아니거나 field가 없거나 문자열이 아님'''
+    try:
+        data = json.loads(request.body)
+    except ValueError: # JSONDecodeError, UnicodeDecodeError
+        raise HttpError("400 Bad Request", "Invalid JSON body") from None
+    if not isinstance(data, dict):
+        raise HttpError("400 Bad Request", "JSON body must be an object")
+
+    values = {}
+    for field in fields:
+        value = data.get(field)
+        if not isinstance(value, str):
+            raise HttpError("400 Bad Request", f"Missing or invalid field: {field}")
+        values[field] = value
+    return values
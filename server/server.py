@@ -1,28 +1,234 @@
 import socket
+import ssl
+import hashlib
 import json
 import os
-import sys
+import secrets
 import time
 import threading
-from datetime import datetime
+import signal
+import argparse
+import shutil
+import tempfile
+import multiprocessing
+import multiprocessing.connection
+import functools
+import ipaddress
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from email.utils import formatdate, parsedate_to_datetime
+
+from http_parser import RequestParser, HttpRequest, HttpParseError, RECV_BUFFER_SIZE
+from user_store import UserStore, JsonUserStore
+from file_cache import FileCache, FileBody, BundleBody
+from log_writer import LogWriter, LEVELS, DEBUG, INFO, WARNING, ERROR
+from metrics import Metrics, TimedStore, timed
+from router import Router, HttpError
+from password import PasswordHasher, KDF_N, KDF_WORKERS
+from session import SessionTable, SESSION_MAX_AGE, KEY_MAX_AGE
+from derivatives import DerivativeCache, DERIVATIVE_DIR, VARIANT_PARAMS, PILLOW_AVAILABLE, parse_variant
+from content_encoding import Compressor, is_compressible
+from tls import server_context, CERT_FILE, KEY_FILE, HANDSHAKE_TIMEOUT
+from catalog import ImageCatalog, IMAGE_ROOT, LIST_LIMIT, MAX_LIST_LIMIT
+from rate_limit import AdmissionControl, IP_RATE, USER_RATE, LOGIN_RATE, MAX_DOWNLOADS, AUTH_COST, retry_after
 
 USER_DB = "users.json"
+SQLITE_DB = "users.db"
+USER_STORES = ("json", "sqlite")
 LOG_FILE = "server_log.txt"
 
+CONCURRENCY_MODES = ("thread", "process", "asyncio", "prefork")
+DEFAULT_WORKERS = 8 # 동시에 처리하는 연결 수
+DEFAULT_MAX_CONNECTIONS = 64 # accept 후 처리 대기 중인 연결까지 포함한 최대 연결 수
+DEFAULT_BACKLOG = 128 # listen backlog
+ACCEPT_TIMEOUT = 0.5 # accept 대기 주기. signal이 다른 thread로 전달되어도 main thread가 주기적으로 깨어나 처리하도록
+IDLE_TIMEOUT = 15 # keep-alive 연결에서 다음 request를 기다리는 시간(초)
+READ_TIMEOUT = 10 # request의 첫 byte부터 request 전체를 받을 때까지의 시간(초). 조금씩 보내는 client(slowloris)도 끊김
+WRITE_TIMEOUT = 30 # response를 받아가지 않는 client를 기다리는 시간(초)
+MAX_REQUESTS_PER_CONNECTION = 1000 # 연결 하나에서 처리하는 최대 request 수
+DRAIN_TIMEOUT = 10 # 종료할 때 처리 중인 연결을 마치기를 기다리는 시간(초)
+PREFORK_START_TIMEOUT = 10 # worker process들이 listen을 시작하기를 기다리는 최대 시간(초)
+PREFORK_RESTART_DELAY = 1.0 # 이보다 빨리 죽은 worker는 이만큼 기다렸다가 다시 띄움 (crash loop 방지)
+IMAGE_MAX_AGE = 60 # client가 서버에 다시 확인하지 않고 이미지 cache를 사용하는 시간(초)
+MAX_BUNDLE_IMAGES = 64 # POST /images/batch 하나로 요청할 수 있는 최대 이미지 수
+STATIC_RESPONSES = 256 # header 없는 응답(status, body)을 직렬화한 bytes로 기억하는 최대 개수
+IMAGE_HEADER_ENTRIES = 4096 # 이미지 응답 header를 만들어 두는 최대 파일 수
+SEND_COPY_LIMIT = 32 * 1024 # 이 크기 이하의 bytes body는 header에 이어붙여 send 한 번으로. 더 크면 복사하지 않고 sendmsg로
+
+METRICS_ACCESS = ("local", "public", "off") # /metrics를 받을 client : loopback만, 모두, 없음 (404)
+
+CONNECTION_CLOSE = b"Connection: close\r\n"
+CONNECTION_KEEP_ALIVE = b"Connection: keep-alive\r\n"
+
+_date = (0, "") # (Date가 바뀌는 시각, Date header)
+_static = {} # (status, body) -> (Date가 바뀌는 시각, 직렬화한 response)
+
+
+def _date_now() -> tuple:
+    '''
+    현재 시각의 Date header. formatdate는 초가 바뀔 때만 다시 계산함
+
+    return : (Date가 바뀌는 시각(다음 초), "Date: ...")'''
+    global _date
+    date = _date
+    now = time.time()
+    if now >= date[0]:
+        second = int(now)
+        date = _date = (second + 1, f"Date: {formatdate(second, usegmt=True)}")
+    return date
+
+
+def _static_response(status : str, body : str) -> bytes:
+    '''
+    header 없는 응답 전체(status line, Date, Content-Length, body)를 bytes로.
+    route의 응답 대부분("200 OK" + "LOGIN_SUCCESS", "404 Not Found" + "Image not found" ...)은 몇 가지뿐이므로
+    Date가 바뀌는 1초 동안은 처음 만든 bytes를 그대로 보냄. 서로 다른 (status, body)는 STATIC_RESPONSES개까지만 기억함'''
+    entry = _static.get((status, body))
+    if entry is not None and time.time() < entry[0]:
+        return entry[1]
+    (expiry, date) = _date_now()
+    data = body.encode()
+    response = f"HTTP/1.1 {status}\r\n{date}\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data
+    if entry is not None or len(_static) < STATIC_RESPONSES:
+        _static[(status, body)] = (expiry, response)
+    return response
+
+
+@functools.lru_cache(maxsize=IMAGE_HEADER_ENTRIES)
+def _image_validators(info) -> tuple:
+    '''
+    이미지 응답의 validator header. FileInfo는 catalog, file_cache가 파일이 바뀔 때만 새로 만들므로 key로 사용하여
+    Last-Modified(formatdate)를 요청마다 다시 계산하지 않음
+
+    return : (Last-Modified 값, (ETag, Last-Modified, Cache-Control header))'''
+    last_modified = formatdate(info.mtime, usegmt=True)
+    return (last_modified, (f"ETag: {info.etag}", f"Last-Modified: {last_modified}", f"Cache-Control: max-age={IMAGE_MAX_AGE}"))
+
+
+@functools.lru_cache(maxsize=IMAGE_HEADER_ENTRIES)
+def _image_headers(info, filename : str) -> tuple:
+    '''
+    이미지 200/206 응답의 header (Content-Type, Content-Disposition, Accept-Ranges와 validator)
+
+    filename : Content-Disposition에 넣을 파일 이름. 출력할 수 없는 문자와 따옴표, backslash는 뺌'''
+    filename = "".join(c for c in filename if c.isprintable() and c not in '"\\')
+    return (f"Content-Type: {info.content_type}", f'Content-Disposition: attachment; filename="{filename}"',
+            "Accept-Ranges: bytes") + _image_validators(info)[1]
+
+
+def _sendmsg(client_socket : socket.socket, head : bytes, body) -> None:
+    '''
+    head와 body(bytes, memoryview)를 이어붙이지 않고 sendmsg(writev) 한 번으로 전송. 일부만 보내졌으면 남은 부분을 sendall.
+    sendmsg가 없는 SSLSocket은 sendall 두 번'''
+    if isinstance(client_socket, ssl.SSLSocket):
+        client_socket.sendall(head)
+        client_socket.sendall(body)
+        return
+    sent = client_socket.sendmsg([head, body])
+    if sent < len(head):
+        client_socket.sendall(memoryview(head)[sent:])
+        sent = len(head)
+    if sent - len(head) < len(body):
+        client_socket.sendall(memoryview(body)[sent - len(head):])
+
+
+def _error_response(server, error : HttpError) -> tuple:
+    '''
+    router가 처리할 수 없는 request(404, 405, 400)의 응답'''
+    return server._create_response_str(error.status, error.headers, body=error.message)
+
+
+def _head_response(server, response : tuple) -> tuple:
+    '''
+    HEAD route가 없는 path의 HEAD request : GET handler의 응답에서 body를 뺌 (header와 Content-Length는 GET과 같음)'''
+    (response, bin_file) = response
+    if isinstance(bin_file, FileBody):
+        bin_file.close()
+    return (response[:response.index(b"\r\n\r\n") + 4], None)
+
+
+def _is_loopback(client : str) -> bool:
+    '''
+    client : request.client (socket 주소의 IP). None이면 주소를 모르므로 False'''
+    try:
+        return client is not None and ipaddress.ip_address(client).is_loopback
+    except ValueError:
+        return False
+
+
+router = Router(_error_response, _head_response) # Server의 route table. 아래 @router.route로 등록
+
 class Server(socket.socket):
-    def __init__(self, port : int):
+    def __init__(self, port : int=None, backlog : int=DEFAULT_BACKLOG, users=None, logger : LogWriter=None,
+                 metrics : Metrics=None, sessions : SessionTable=None, hasher : PasswordHasher=None,
+                 derivatives : DerivativeCache=None, compressor : Compressor=None, tls_context : ssl.SSLContext=None,
+                 reuseport : bool=False, idle_timeout : float=IDLE_TIMEOUT, read_timeout : float=READ_TIMEOUT,
+                 write_timeout : float=WRITE_TIMEOUT, max_requests : int=MAX_REQUESTS_PER_CONNECTION,
+                 drain_timeout : float=DRAIN_TIMEOUT, catalog : ImageCatalog=None, admission : AdmissionControl=None,
+                 metrics_access : str="local"):
+        '''
+        port : None이면 바인딩하지 않는 핸들러 전용 인스턴스 (process worker)
+        backlog : listen backlog
+        users : user database(UserStore). None이면 USER_DB를 JsonUserStore로 엶
+        logger : 로그 기록기(LogWriter). None이면 LOG_FILE에 기록
+        metrics : 지표 수집기(Metrics). None이면 새로 생성
+        sessions : 발급한 session/key token table(SessionTable). None이면 새로 생성
+        hasher : password hash 계산기(PasswordHasher). None이면 기본 설정으로 생성
+        derivatives : 변환한 이미지 cache(DerivativeCache). None이면 DERIVATIVE_DIR에 생성
+        compressor : response body 압축기(Compressor). None이면 설치된 모든 coding 사용
+        tls_context : tls.server_context(). None이면 평문 HTTP
+        reuseport : SO_REUSEPORT로 바인딩만 하여 prefork worker들이 같은 port에 각자 listen socket을 열 수 있게 함
+        idle_timeout, read_timeout, write_timeout : 연결의 timeout(초). IDLE_TIMEOUT, READ_TIMEOUT, WRITE_TIMEOUT 참고
+        max_requests : 연결 하나에서 처리하는 최대 request 수. 마지막 response에 Connection: close를 붙이고 연결을 닫음
+        drain_timeout : 종료할 때 처리 중인 연결을 기다리는 시간(초)
+        catalog : 이미지 index(ImageCatalog). None이면 현재 디렉터리(derivatives 제외)를 처음 요청할 때 훑음
+        admission : request rate와 동시 다운로드 제한(AdmissionControl). None이면 기본 제한
+        metrics_access : /metrics를 받을 client (METRICS_ACCESS). "local"이면 loopback 주소에서 온 request만'''
         socket.socket.__init__(self, socket.AF_INET, socket.SOCK_STREAM)
-        self.bind(("", port))
-        self.listen(3)
+        self.backlog = backlog
+        if port is not None:
+            self.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if reuseport:
+                self.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            self.bind(("", port))
+            if not reuseport: # reuseport이면 port만 잡아두고 listen은 prefork worker가 함
+                self.listen(backlog)
+
+        self.metrics = metrics if metrics is not None else Metrics() # /metrics 지표
+        self.logger = logger if logger is not None else LogWriter(LOG_FILE) # background 로그 기록기
 
-        self.lock_user_db = threading.Lock() # 데이터베이스 중복 접근 방지
+        users = users if users is not None else JsonUserStore(USER_DB)
+        if isinstance(users, UserStore): # process worker의 proxy는 parent process에서 기록
+            users.lock_wait_observer = self.metrics.observe_lock_wait
+        self.users = TimedStore(users, self.metrics) # user database
 
+        self.sessions = sessions if sessions is not None else SessionTable() # 로그인 session, 권한 key
+        self.hasher = hasher if hasher is not None else PasswordHasher() # password KDF (worker pool)
         self.default_key = "0" # register시 주어지는 기본 키
+        self.file_cache = FileCache() # 자주 요청되는 이미지 cache
+        self.derivatives = derivatives if derivatives is not None else DerivativeCache() # 축소/변환한 이미지 cache
+        self.catalog = catalog if catalog is not None else ImageCatalog(exclude=(self.derivatives.directory,)) # 이미지 index
+        self.compressor = compressor if compressor is not None else Compressor() # Accept-Encoding 압축
+        self.tls_context = tls_context # HTTPS (None이면 평문)
+        self.admission = admission if admission is not None else AdmissionControl() # 429 rate limit
+
+        self.idle_timeout = idle_timeout
+        self.read_timeout = read_timeout
+        self.write_timeout = write_timeout
+        self.max_requests = max_requests
+        self.drain_timeout = drain_timeout
+        self.metrics_access = metrics_access
+        self.draining = threading.Event() # set되면 accept를 멈추고, 연결은 처리 중인 request만 마치고 닫음
 
     def __exit__(self, exc_type, exc_value, traceback): # 서버 종료
         if exc_type:
             self.log_message(f"An exception occurred: {exc_value}")
+        self.users.close() # 남은 변경을 users.json에 저장
+        self.sessions.close()
+        self.hasher.close()
+        self.derivatives.close()
         self.log_message("Server closed")
+        self.logger.close() # 남은 로그를 기록
+        self.metrics.close()
         self.close()
 
     def _create_response_str(self, status : str, headers : list=None, body : str=None) -> tuple:
@@ -32,272 +238,1185 @@ class Server(socket.socket):
         headers : 헤더들을 리스트로 전달
         body : string data
         
-        return : response를 string으로 전달, None(byte 데이터가 존재하지 않음)"""
-        response = [f"HTTP/1.1 {status}"]
-        if headers:
-            response.extend(headers)
-        if body:
-            response.append(f"Content-Length: {len(body.encode())}")  # 본문 길이 추가
-            response.append("")  # 헤더 종료
-            response.append(body)  # 본문 추가
-        return ("\r\n".join(response), None)
-    
+        return : response 전체를 bytes로 전달, None(byte 데이터가 존재하지 않음).
+                 header가 없으면 미리 직렬화해 둔 bytes(_static_response)"""
+        if not headers:
+            return (_static_response(status, body or ""), None)
+        data = body.encode() if body else b""
+        response = [f"HTTP/1.1 {status}", _date_now()[1]]
+        response.extend(headers)
+        response.append(f"Content-Length: {len(data)}")  # 본문 길이 추가
+        response.append("\r\n")  # 헤더 종료
+        return ("\r\n".join(response).encode() + data, None)
+
     def _create_response_byte(self, status : str, headers : list, body : bytes) -> tuple:
-        """ HTTP 응답을 생성하는 함수 
+        """ HTTP 응답을 생성하는 함수
 
         status : 응답 상태
         headers : 헤더들을 리스트로 전달
         body : data를 byte형식으로 전달
 
-        return : response를 string으로 전달, byte data"""
-        response = [f"HTTP/1.1 {status}"]
+        return : response header를 bytes로 전달, byte data"""
+        response = [f"HTTP/1.1 {status}", _date_now()[1]]
         response.extend(headers)
 
         response.append(f"Content-Length: {len(body)}")  # 본문 길이 추가
         response.append("\r\n")  # 헤더 종료
 
-        return ("\r\n".join(response), body)
+        return ("\r\n".join(response).encode(), body)
     
     def client_handler(self, client_socket : socket.socket, addr) -> None:
         '''
         연결된 client의 data 수신 => request를 보고 response 생성 후 전송
-        response를 
         
+        recv_into로 재사용하는 buffer에 data를 받아 RequestParser에 넘김.
+        한 번의 recv에 request 일부만 오거나 여러 request가 함께 와도(pipelining) 순서대로 처리함.
+        파싱할 수 없는 request가 오면 에러 응답을 보내고 연결을 종료.
+
         client_socket : socket.socket. 통신 소켓
         addr : address'''
         self.log_message(f"[{addr[0]}] is accept.")
+        self.metrics.connection_opened()
+        reason = "tls_handshake"
+        try:
+            # header와 body를 나누어 보내도(TLS는 handshake 메세지도) Nagle로 지연되지 않도록
+            client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            if self.tls_context is not None: # handshake는 accept loop가 아닌 worker에서
+                client_socket = self.tls_context.wrap_socket(client_socket, server_side=True, do_handshake_on_connect=False)
+            if self._tls_handshake(client_socket, addr):
+                reason = self._serve_connection(client_socket, addr)
+        finally:
+            self.metrics.connection_closed(reason)
+        self.log_message(f"[{addr[0]}] 연결 종료.")
+        client_socket.close()
+
+    def _tls_handshake(self, client_socket : socket.socket, addr) -> bool:
+        '''
+        TLS 연결이면 handshake를 HANDSHAKE_TIMEOUT 안에 끝내고 시간과 session 재개 여부를 metrics에 기록
+
+        return : 요청을 처리할 수 있으면 True. handshake에 실패하면 False'''
+        if not isinstance(client_socket, ssl.SSLSocket):
+            return True
+        start = time.perf_counter()
+        client_socket.settimeout(HANDSHAKE_TIMEOUT)
+        try:
+            client_socket.do_handshake()
+        except (ssl.SSLError, OSError) as e: # socket.timeout 포함
+            self.log_message(f"[{addr[0]}] TLS handshake failed: {e}", WARNING)
+            return False
+        client_socket.settimeout(None)
+        self.metrics.observe_tls_handshake(client_socket.session_reused, time.perf_counter() - start)
+        self.log_message(f"[{addr[0]}] {client_socket.version()} {client_socket.cipher()[0]} "
+                         f"alpn={client_socket.selected_alpn_protocol()} resumed={client_socket.session_reused}", DEBUG)
+        return True
+
+    def _serve_connection(self, client_socket : socket.socket, addr) -> str:
+        '''
+        client_handler의 receive => request_handler => send 반복
+
+        - idle : 다음 request의 첫 byte를 idle_timeout까지 기다림. draining이면 바로 닫도록 ACCEPT_TIMEOUT마다 깨어남
+        - read : request의 첫 byte를 받은 뒤 read_timeout 안에 request 전체가 와야 함. 넘으면 408 응답 후 닫음
+        - write : response 전송은 write_timeout까지 기다림
+        - max_requests번째 request, Connection: close request, draining 중의 request에는
+          Connection: close를 붙여 응답한 뒤 닫음
+
+        return : 연결을 닫은 이유 (metrics의 reason label)'''
+        parser = RequestParser()
+        buffer = memoryview(bytearray(RECV_BUFFER_SIZE))
+        served = 0
+        deadline = None # 받고 있는 request의 read deadline
+        idle_since = time.monotonic()
         while True:
+            now = time.monotonic()
+            if deadline is None:
+                if self.draining.is_set() and served: # accept만 하고 아직 처리하지 않은 연결은 첫 request를 받음
+                    return "drain"
+                timeout = min(ACCEPT_TIMEOUT, idle_since + self.idle_timeout - now)
+            else:
+                timeout = deadline - now
             try:
-                request = client_socket.recv(4096).decode()  # 클라이언트로부터 데이터 수신
-                if not request:
-                    break  # 클라이언트가 연결을 종료하면 루프 종료
+                if timeout <= 0:
+                    raise socket.timeout
+                client_socket.settimeout(timeout)
+                size = client_socket.recv_into(buffer) # 클라이언트로부터 데이터 수신
+            except socket.timeout:
+                if deadline is not None:
+                    self._send_timeout_response(client_socket, addr)
+                    return "read_timeout"
+                if time.monotonic() - idle_since >= self.idle_timeout:
+                    return "idle_timeout"
+                continue # draining 확인
+            except ConnectionResetError:
+                self.log_message(f"[{addr[0]}] 연결이 강제 종료되었습니다.")
+                return "client"
+            if not size:
+                return "client" # 클라이언트가 연결을 종료하면 루프 종료
+
+            try:
+                requests = parser.feed(buffer[:size])
+            except HttpParseError as e:
+                (response, _) = self._create_response_str(e.status, body=e.message)
+                self._send_with_timeout(client_socket, addr, response, None, CONNECTION_CLOSE)
+                self.log_message(f"[{addr[0]}] bad request: {e.message}", WARNING)
+                return "bad_request"
 
+            if requests:
+                deadline = None
+            for request in requests:
+                served += 1
+                request.client = addr[0]
+                reason = self._close_reason(request, served)
                 (response, bin_file) = self.request_handler(request)
-                if bin_file is not None: # 
-                    client_socket.sendall(response.encode() + bin_file)
-                else: 
-                    client_socket.sendall(response.encode())
+                try:
+                    failed = self._send_with_timeout(client_socket, addr, response, bin_file,
+                                                     self._connection_header(request, reason))
+                finally:
+                    if request.release is not None: # 동시 다운로드 slot
+                        request.release()
+                if failed is not None:
+                    return failed
+                if reason is not None:
+                    return reason
+            if parser.in_progress():
+                if deadline is None: # 새 request의 첫 byte
+                    deadline = time.monotonic() + self.read_timeout
+            else:
+                idle_since = time.monotonic()
 
-            except ConnectionResetError:
-                self.log_message(f"[{addr[0]}] 연결이 강제 종료되었습니다.")
-                break
+    def _close_reason(self, request : HttpRequest, served : int) -> str:
+        '''
+        이 request에 응답한 뒤 연결을 닫아야 하면 그 이유, 아니면 None'''
+        if served >= self.max_requests:
+            return "max_requests"
+        if self.draining.is_set():
+            return "drain"
+        connection = request.header("connection", "").lower()
+        if connection == "close" or (request.version == "HTTP/1.0" and connection != "keep-alive"):
+            return "client"
+        return None
 
-        self.log_message(f"[{addr[0]}] 연결 종료.")
-        client_socket.close()
+    @staticmethod
+    def _connection_header(request : HttpRequest, reason : str) -> bytes:
+        '''
+        response에 붙일 Connection header line.
+        닫으면 Connection: close, HTTP/1.0 client의 keep-alive 요청을 유지하면 Connection: keep-alive,
+        HTTP/1.1은 유지가 기본이므로 붙이지 않음
+
+        request : 응답하는 request. 파싱하기 전에 닫는 연결(408, 400)은 None
+        reason : 연결을 닫는 이유 (_close_reason). 유지하면 None'''
+        if reason is not None:
+            return CONNECTION_CLOSE
+        if request.version == "HTTP/1.0":
+            return CONNECTION_KEEP_ALIVE
+        return b""
+
+    @staticmethod
+    def _response_bytes(response : bytes, bin_file, connection : bytes) -> tuple:
+        '''
+        asyncio mode(async_server)에서 write할 (header, body). _send_response와 같은 방식으로
+        connection이 있으면 response의 status line 다음에 넣고, bytes body가 SEND_COPY_LIMIT 이하이면 header에 이어붙여 body는 None (작은 response는 복사보다 send 호출이 더 비쌈)
+
+        response : header(bytes). body가 없는 응답은 전체 response
+        bin_file : None or bytes body (FileBody, BundleBody는 header 다음에 따로 보내므로 None)
+        connection : Connection header line (_connection_header). 없으면 b""'''
+        if connection:
+            response = response.replace(b"\r\n", b"\r\n" + connection, 1)
+        if bin_file is not None and len(bin_file) <= SEND_COPY_LIMIT:
+            return (response + bin_file, None)
+        return (response, bin_file)
+
+    def _send_timeout_response(self, client_socket : socket.socket, addr) -> None:
+        '''
+        read_timeout 안에 request를 다 보내지 않은 client에 408을 보냄'''
+        self.log_message(f"[{addr[0]}] request timed out", WARNING)
+        (response, _) = self._create_response_str("408 Request Timeout", body="Request timeout")
+        self._send_with_timeout(client_socket, addr, response, None, CONNECTION_CLOSE)
+
+    def _send_with_timeout(self, client_socket : socket.socket, addr, response : bytes, bin_file,
+                           connection : bytes=b"") -> str:
+        '''
+        write_timeout 안에 _send_response
+
+        return : 보냈으면 None. 보내지 못했으면 연결을 닫는 이유 ("write_timeout" or "client")'''
+        try:
+            client_socket.settimeout(self.write_timeout)
+            self._send_response(client_socket, response, bin_file, connection)
+        except socket.timeout:
+            self.log_message(f"[{addr[0]}] response timed out", WARNING)
+            return "write_timeout"
+        except OSError: # ConnectionResetError, BrokenPipeError
+            self.log_message(f"[{addr[0]}] 연결이 강제 종료되었습니다.")
+            return "client"
+        return None
+
+    def _send_response(self, client_socket : socket.socket, response : bytes, bin_file, connection : bytes=b"") -> None:
+        '''
+        response header와 body를 전송
 
-    def request_handler(self, request : str) -> tuple:
+        Connection header를 넣고 bytes body와 함께 send 한 번으로 보냄.
+        SEND_COPY_LIMIT 이하의 body는 header에 이어붙이고, 더 큰 body는 복사하지 않고 sendmsg로 (_sendmsg).
+        FileBody는 socket.sendfile(os.sendfile)로 kernel에서 바로 전송하고 파일을 닫음.
+        (TLS 연결은 암호화해야 하므로 SSLSocket.sendfile이 파일을 읽어 send로 보냄)
+
+        response : header(bytes). body가 없는 응답은 전체 response
+        bin_file : None, bytes, FileBody or BundleBody (part별로 bytes 또는 FileBody)
+        connection : Connection header line (_connection_header)'''
+        if connection: # 대부분의 keep-alive 응답은 그대로
+            response = response.replace(b"\r\n", b"\r\n" + connection, 1)
+        if bin_file is None:
+            client_socket.sendall(response)
+        elif isinstance(bin_file, (bytes, memoryview)):
+            if len(bin_file) <= SEND_COPY_LIMIT: # 작은 body는 복사하는 것이 send를 한 번 더 부르는 것보다 빠름
+                client_socket.sendall(response + bin_file)
+            else:
+                _sendmsg(client_socket, response, bin_file)
+        elif isinstance(bin_file, FileBody):
+            try:
+                client_socket.sendall(response)
+                client_socket.sendfile(bin_file.file, bin_file.offset, bin_file.length)
+            finally:
+                bin_file.close()
+        else:
+            client_socket.sendall(response)
+            for part in bin_file:
+                if isinstance(part, FileBody):
+                    try:
+                        client_socket.sendfile(part.file, part.offset, part.length)
+                    finally:
+                        part.close()
+                else:
+                    client_socket.sendall(part)
+
+    def request_handler(self, request : HttpRequest) -> tuple:
         '''
         client로부터 받은 request정보를 처리하는 함수
-        
-        request를 method, path, headers, body로 나눔.
-        method와 path를 보고 처리해야할 함수(handler)에 body data를 보냄.
-        
-        request : client로부터 받은 request
-        
-        return : handler의 return 값. client에 다시 보낼 response.
+
+        router(Router)가 method와 path로 route를 찾아 handler를 호출함.
+        handler에서 예외가 발생하면 연결을 끊지 않고 500 응답을 보냄.
+        response의 status, 크기, 처리 시간을 일치한 route pattern별로 metrics에 기록.
+
+        request : RequestParser가 파싱한 HttpRequest
+
+        return : route handler의 return 값. client에 다시 보낼 response.
                 response에 byte data가 없을 시 (response, None)
-                response에 byte data가 존재하면 (response, byte data) 형식
-                
-                일치하는 path가 없으면 404 return'''
-        self.log_message(request)
-        lines = request.split("\r\n")
-        method, path, _ = lines[0].split(" ")
-        headers = lines[1:]
-        body = lines[-1]
-
-        if path == "/register" and method == "POST": # register
-            '''
-            client로부터 입력받은 body의 username, password를 register_handler로 전달'''
-            data = json.loads(body)
-            return self.register_handler(data["username"], data["password"])
-        
-        elif path == "/login" and method == "POST": # login
-            '''
-            client로부터 입력받은 body의 username, password를 login_handler로 전달'''
-            data = json.loads(body)
-            return self.login_handler(data["username"], data["password"])
-        
-        elif path == "/privilege" and method == "PUT": # privilege
-            '''
-            client로부터 입력받은 body의 username을 id로 받아 권한 유효성 검사를 실행.
-            이후 결과와 id를 privilege_handler로 전달'''
-            data = json.loads(body)
-            id = data["username"]
-            valid = self._is_valid_key(id)
-            return self.privilege_handler(id, valid)
-        
-        elif path == "/images": # image
-            if method == "HEAD":
-                '''
-                client로부터 입력받은 body의 username을 id로 받아 권한 유효성 검사를 실행.
-                유효하다면 200, 유효하지 않다면 401 return'''
-                data = json.loads(body)
-                id = data["username"]
-                if not id:
-                    return self._create_response_str("400 Bad Request", body="Missing username")
-                
-                valid = self._is_valid_key(id) 
-                if valid: # check
-                    return self._create_response_str("200 OK", body="Valid key")
-                else:
-                    return self._create_response_str("401 Unauthorized", body="Invalid Key")
-            
-            elif method == "GET":
-                '''
-                client로부터 입력받은 body의 image_url을 받아 image_downloader로 전달'''
-                url_data = json.loads(body)
-                url = url_data["url"]
-                return self.image_downloader(url)
-        
-        return self._create_response_str("404 Not Found", body="Page not found")
-    
+                response에 byte data가 존재하면 (response, byte data) 형식'''
+        start = time.perf_counter()
+        try:
+            (response, bin_file) = router.dispatch(self, request)
+        except Exception as e:
+            self.log_message(f"{request.method} {request.path} handler error: {e!r}", ERROR)
+            (response, bin_file) = self._create_response_str("500 Internal Server Error", body="Internal server error")
+        size = len(response) + (len(bin_file) if bin_file is not None else 0)
+        self.metrics.observe_request(request.route, request.method, response[9:12].decode(), size, time.perf_counter() - start)
+        return (response, bin_file)
+
+    @router.middleware
+    def _log_request(self, request : HttpRequest, call_next) -> tuple:
+        '''
+        요청마다 "method path"를 기록하는 middleware. raw request 전체는 DEBUG level에서만 (sample_rate 비율)'''
+        self.log_message(f"{request.method} {request.path}")
+        self.log_message(request, DEBUG)
+        return call_next(self, request)
+
+    @router.middleware
+    def _admission_control(self, request : HttpRequest, call_next) -> tuple:
+        '''
+        client IP의 token bucket에서 token을 쓰고, 모자라면 route를 찾거나 body를 파싱하기 전에 429로 거절하는 middleware.
+        password hash를 계산하는 /login, /register는 AUTH_COST개를 씀.
+        사용자별 제한은 사용자를 알 수 있는 route에서 적용 (_authorize_images, _login_route)'''
+        if request.client is not None:
+            cost = AUTH_COST if request.method == "POST" and request.path in ("/login", "/register") else 1
+            wait = self.admission.ip.acquire(request.client, cost)
+            if wait:
+                return router.error_handler(self, self._throttled("ip", wait))
+        return call_next(self, request)
+
+    @router.middleware
+    def _compress_response(self, request : HttpRequest, call_next) -> tuple:
+        '''
+        Accept-Encoding에 맞춰 response body를 압축하는 middleware (content_encoding.Compressor).
+
+        압축할 형식(텍스트, JSON, BMP ...)이면 Vary: Accept-Encoding을 붙이고, 압축하면 Content-Encoding과
+        압축한 body의 Content-Length를 보냄. 압축한 body는 원본과 byte가 다르므로 ETag는 weak(W/)로 바꿈.
+        HEAD, 부분 응답(206), body가 없는 응답은 그대로 전달.
+        압축하지 않는 서버(--no-compression)이거나 body가 Compressor.min_size보다 작으면
+        응답이 Accept-Encoding에 따라 달라지지 않으므로 header를 파싱하지 않고 그대로 전달 (Vary도 붙이지 않음)'''
+        (response, bin_file) = call_next(self, request)
+        if request.method == "HEAD" or not self.compressor.codings:
+            return (response, bin_file)
+        if bin_file is None:
+            (head, _, data) = response.partition(b"\r\n\r\n")
+        else:
+            (head, data) = (response.removesuffix(b"\r\n\r\n"), bin_file)
+        if len(data) < self.compressor.min_size: # body가 없는 응답 포함
+            return (response, bin_file)
+
+        lines = head.split(b"\r\n")
+        (content_type, etag, etag_index) = ("text/plain", None, None) # 문자열 body는 Content-Type 없이 텍스트
+        for (i, line) in enumerate(lines[1:], 1):
+            (name, _, value) = line.partition(b":")
+            name = name.lower()
+            if name == b"content-type":
+                content_type = value.strip().decode()
+            elif name == b"etag":
+                (etag, etag_index) = (value.strip().decode(), i)
+            elif name in (b"content-encoding", b"content-range"):
+                return (response, bin_file)
+        if not is_compressible(content_type):
+            return (response, bin_file)
+        lines.append(b"Vary: Accept-Encoding")
+
+        encoded = None
+        coding = self.compressor.choose(request.header("Accept-Encoding"), len(data))
+        if coding is not None:
+            load = data
+            if isinstance(bin_file, FileBody): # cache에 없을 때만 파일을 읽음
+                load = lambda: os.pread(bin_file.file.fileno(), bin_file.length, bin_file.offset)
+            encoded = self.compressor.encode(coding, load, etag)
+        if encoded is None: # body는 header에 이어붙이지 않고 따로 보냄
+            return (b"\r\n".join(lines) + b"\r\n\r\n", data if bin_file is None else bin_file)
+
+        if isinstance(bin_file, FileBody):
+            bin_file.close()
+        if etag_index is not None:
+            lines[etag_index] = f"ETag: W/{etag}".encode()
+        lines = [line for line in lines if not line.lower().startswith(b"content-length:")]
+        lines += [f"Content-Encoding: {coding}".encode(), f"Content-Length: {len(encoded)}".encode()]
+        return (b"\r\n".join(lines) + b"\r\n\r\n", encoded)
+
+    @router.route("POST", "/register", fields=("username", "password"))
+    def _register_route(self, request : HttpRequest, username : str, password : str) -> tuple:
+        '''
+        client로부터 입력받은 body의 username, password를 register_handler로 전달'''
+        return self.register_handler(username, password)
+
+    @router.route("POST", "/login", fields=("username", "password"))
+    def _login_route(self, request : HttpRequest, username : str, password : str) -> tuple:
+        '''
+        client로부터 입력받은 body의 username, password를 login_handler로 전달.
+        client IP와 username 쌍마다 로그인 시도 수를 제한함 (429).
+        username만으로 제한하면 다른 client가 틀린 password를 보내 그 사용자의 로그인을 막을 수 있음'''
+        wait = self.admission.login.acquire((request.client, username))
+        if wait:
+            raise self._throttled("login", wait)
+        return self.login_handler(username, password)
+
+    @router.route("PUT", "/privilege")
+    def _privilege_route(self, request : HttpRequest) -> tuple:
+        '''
+        session cookie로 로그인한 사용자를 찾고 key cookie로 권한 유효성 검사를 실행.
+        이후 결과와 id를 privilege_handler로 전달. body의 username은 사용하지 않음'''
+        id = self._session_user(request)
+        if id is None:
+            return self._create_response_str("401 Unauthorized", body="LOGIN_REQUIRED")
+        return self.privilege_handler(id, self._is_valid_key(request))
+
+    @router.route("HEAD", "/images")
+    def _check_key_route(self, request : HttpRequest) -> tuple:
+        '''
+        key cookie로 권한 유효성 검사를 실행.
+        유효하다면 200, 유효하지 않다면 401 return'''
+        if self._is_valid_key(request):
+            return self._create_response_str("200 OK", body="Valid key")
+        return self._create_response_str("401 Unauthorized", body="Invalid Key")
+
+    @router.route("GET", "/images", fields=("url",))
+    def _images_route(self, request : HttpRequest, url : str) -> tuple:
+        '''
+        key cookie가 유효하면 client로부터 입력받은 body의 image url을 image_downloader로 전달.
+        query string에 w, h, fmt, q 중 하나라도 있으면 variant_downloader로 전달'''
+        self._authorize_images(request, download=True)
+        query = request.query()
+        if any(name in query for name in VARIANT_PARAMS):
+            return self.variant_downloader(url, query, request)
+        return self.image_downloader(url, request)
+
+    @router.route("POST", "/images/batch")
+    def _images_batch_route(self, request : HttpRequest) -> tuple:
+        '''
+        key cookie가 유효하면 body의 image url 리스트를 bundle_downloader로 전달.
+        body는 url의 JSON 배열 또는 {"urls" : [url, ...], "etags" : {url : ETag}} (etags는 조건부 요청)'''
+        self._authorize_images(request, download=True)
+        (urls, etags) = self._parse_bundle_request(request)
+        return self.bundle_downloader(urls, etags)
+
+    @router.route("GET", "/images/list")
+    def _images_list_route(self, request : HttpRequest) -> tuple:
+        '''
+        key cookie가 유효하면 query string(after, limit, prefix, q)을 list_handler로 전달'''
+        self._authorize_images(request, download=False)
+        query = request.query()
+        try:
+            limit = int(query.get("limit", LIST_LIMIT))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= MAX_LIST_LIMIT:
+            raise HttpError("400 Bad Request", f"limit must be 1 ~ {MAX_LIST_LIMIT}")
+        return self.list_handler(query.get("after", ""), limit, query.get("prefix", ""), query.get("q", ""))
+
+    @router.route("GET", "/metrics", skip=(_admission_control, _compress_response))
+    def _metrics_route(self, request : HttpRequest) -> tuple:
+        '''
+        Prometheus text format으로 서버 지표 전달.
+
+        지표에는 route별 traffic과 연결 상태가 있으므로 metrics_access가 "local"이면 loopback 주소에서 온 request만,
+        "off"이면 받지 않음 (둘 다 route가 없는 것처럼 404).
+        scrape가 client IP의 token을 쓰거나 매번 압축되지 않도록 admission, 압축 middleware를 거치지 않음'''
+        if self.metrics_access == "off" or (self.metrics_access == "local" and not _is_loopback(request.client)):
+            raise HttpError("404 Not Found", "Page not found")
+        return self._create_response_str("200 OK", headers=["Content-Type: text/plain; version=0.0.4; charset=utf-8"],
+                                         body=self.metrics.render())
+
+    @timed("register_handler")
     def register_handler(self, id : str, password : str) -> tuple:
         '''
         client가 /register로 접근했을 때 처리하는 함수.
 
-        user.json에서 user database를 받아옴 -> 입력받은 id가 존재하는 지 확인.
-        존재하지 않으면 id, pw 쌍으로 계정 생성하고 계정 정보를 user database에 저장.
+        user database에 입력받은 id가 존재하지 않으면 id, pw 쌍으로 계정 생성하고 계정 정보를 저장.
+        password는 평문이 아닌 PasswordHasher의 hash(scrypt)로 저장.
         
         id : client id. 등록하고자 하는 id
         password : client password. 등록하고자 하는 pw
         
         return : tuple(response, None). register_handler는  byte data를 생성하지 않으므로 None.'''
-        users = self.load_users()
-        if id in users: # 이미 user가 있을 때
+        if self.users.get(id) is not None: # 이미 user가 있을 때 (hash 계산 전에 확인)
+            return self._create_response_str("400 Bad Request", body="REGISTER_FAILED: User already exists")
+
+        user = {"pw" : self.hasher.hash(password), "key" : {"value" : self.default_key, "expiry_time" : 0} }
+        if not self.users.create(id, user): # 그 사이에 같은 id가 등록됨
             return self._create_response_str("400 Bad Request", body="REGISTER_FAILED: User already exists")
         
-        users[id] = {"pw" : password, "key" : {"value" : self.default_key, "expiry_time" : 0} }
-        self.save_users(users)
         return self._create_response_str("200 OK", body="REGISTER_SUCCESS") # 등록 완료
 
+    @timed("login_handler")
     def login_handler(self, id : str, password : str) -> tuple:
         '''
         client가 /login로 접근했을 때 처리하는 함수.
 
-        users.json에서 user database를 받아옴 -> 입력받은 id와 pw 쌍이 존재하는 지 확인
+        user database에서 입력받은 id의 password hash와 pw가 일치하는 지 확인.
+        성공하면 session token을 발급하여 session cookie로 전달.
+        이전에 발급된 권한이 아직 유효하면 key token도 새로 발급하여 key cookie로 전달 (남은 유효시간만큼).
+        평문이나 이전 parameter로 저장된 password는 현재 설정으로 다시 hash하여 저장.
         
         id : login id. 로그인하고자 하는 id
         password : login password. 로그인하고자 하는 pw
         
         return : tuple(response, None). login_handler는  byte data를 생성하지 않으므로 None.'''
-        users = self.load_users()
-        try:
-            if users.get(id)["pw"] == password: # login success
-                return self._create_response_str("200 OK", body="LOGIN_SUCCESS")
-        except: # get(id) == None or get(id) != password
+        user = self.users.get(id)
+        (matched, needs_rehash) = self.hasher.verify(password, user["pw"] if user is not None else None)
+        if not matched:
             '''
             보안을 위해 login success 제외 모든 경우를 401로 return'''
-            pass
-        return self._create_response_str("401 Unauthorized", body="LOGIN_FAILED")
+            return self._create_response_str("401 Unauthorized", body="LOGIN_FAILED")
+
+        if needs_rehash:
+            self.users.update(id, {"pw" : self.hasher.hash(password)})
+
+        headers = [f"Set-Cookie: session={self.sessions.issue(id, 'session', SESSION_MAX_AGE)}; Max-Age={SESSION_MAX_AGE}"]
+        key = user["key"]
+        remaining = int(key["expiry_time"] - time.time())
+        if key["value"] != self.default_key and remaining > 0: # 권한이 남아 있음
+            headers.append(f"Set-Cookie: key={self.sessions.issue(id, 'key', remaining)}; Max-Age={remaining}")
+        return self._create_response_str("200 OK", headers, body="LOGIN_SUCCESS")
     
+    @timed("privilege_handler")
     def privilege_handler(self, id : dict, key_is_valid : bool=True) -> tuple:
         '''
         client가 /privilege로 접근했을 때 처리하는 함수.
 
         키가 유효하다면 이미 권한이 상승된 상태이므로 409 도출.
         키가 유효하지 않다면 권한이 상승되지 않았거나 키의 유효기간이 만료된 상태이므로 키를 새로 발급해줌.
+        key는 SessionTable이 발급한 임의의 token이며, user database에는 token의 hash와 만료 시각만 저장함
+        (다시 로그인했을 때 권한을 이어서 주기 위해).
         
         id : login id. 권한을 상승하고자 하는 id
         key_is_vaild : client key의 유효 여부
         
         return : tuple(response, None). login_handler는  byte data를 생성하지 않으므로 None.'''
-        users = self.load_users()  
-
         if key_is_valid: # 이전에 키가 발급되었음
             return self._create_response_str("409 Conflict", body="PRIVILEGE_ALREADY_CHANGED")
         
         # 키 발급
-        users.get(id)["key"]["value"] = "ABCD"
-        users.get(id)["key"]["expiry_time"] = time.time() + 3600 # 유효시간 : 1시간
-        self.save_users(users)
+        token = self.sessions.issue(id, "key", KEY_MAX_AGE)
+        self.users.update(id, {"key" : {"value" : hashlib.sha256(token.encode()).hexdigest(),
+                                        "expiry_time" : time.time() + KEY_MAX_AGE}}) # 유효시간 : 1시간
 
-        headers = [f"Set-Cookie: key=ABCD; Max-Age=3600"]
+        headers = [f"Set-Cookie: key={token}; Max-Age={KEY_MAX_AGE}"]
         return self._create_response_str("200 OK", headers, body="PRIVILEGE_CHANGED")
     
-    def image_downloader(self, url : str) -> tuple:
+    @timed("image_downloader")
+    def image_downloader(self, url : str, request : HttpRequest=None) -> tuple:
         '''
         client가 /images로 접근했을 때 처리하는 함수
 
-        client가 요청한 이미지 url이 존재하면 이미지를 byte data로 전달 
+        client가 요청한 이미지 url이 존재하면 이미지를 전달 
         존재하지 않으면 404 도출
 
+        url은 catalog(ImageCatalog)의 이름으로만 찾으므로 image root 밖의 파일에는 접근할 수 없음.
+        작은 이미지는 file_cache에 유지한 byte data로, 큰 이미지는 FileBody(sendfile)로 전달.
+        ETag(파일 내용 hash)와 Content-Type은 catalog가 파일이 바뀔 때만 다시 계산함.
+        client의 cache가 아직 유효하면(If-None-Match/If-Modified-Since) body 없이 304 Not Modified를 전달.
+        Range 요청(bytes, 단일 구간)이면 해당 구간만 206 Partial Content로 전달.
+
         url : client가 요청한 image file
+        request : 조건부 요청(If-None-Match, If-Modified-Since)과 Range, If-Range header를 확인할 request
 
-        return : image가 존재하면 response와 byte data를 튜플로 전달.
-                 image가 존재하지 않으면 response와 None을 전달.
+        return : image가 존재하면 response와 byte data(또는 FileBody)를 튜플로 전달.
+                 image가 존재하지 않거나 바뀌지 않았으면 response와 None을 전달.
         '''
-        if os.path.exists(url):
-            with open(url, "rb") as f:
-                image_data = f.read()
-            return self._create_response_byte("200 OK", headers=["Content-Type: image/jpg", "Content-Disposition: attachment",f"filename={url}"], body=image_data)
-        return self._create_response_str("404 Not Found", body="Image not found")
+        if request is None: # header 없는 일반 GET
+            request = HttpRequest("GET", "/images", "HTTP/1.1", {}, "")
+        try:
+            (entry, file) = self.catalog.open(url)
+        except KeyError:
+            return self._create_response_str("404 Not Found", body="Image not found")
+        return self._file_response(entry.path, file, entry.info, request, os.path.basename(entry.path))
 
-    def load_users(self) -> dict:
+    @timed("list_handler")
+    def list_handler(self, after : str="", limit : int=LIST_LIMIT, prefix : str="", query : str="") -> tuple:
         '''
-        유저 데이터베이스에 있는 내용을 load함'''
-        with self.lock_user_db:
-            if not os.path.exists(USER_DB):
-                return {} 
-            with open(USER_DB, "r") as file:
-                return json.load(file)
+        client가 /images/list로 접근했을 때 처리하는 함수
+
+        catalog(ImageCatalog)에 등록된 이미지를 이름 순서로 limit개씩 전달 (파일 시스템을 읽지 않음).
+        다음 page는 응답의 next를 after로 보내 요청함.
+
+        after : 이전 page의 마지막 이름. 빈 문자열이면 처음부터
+        limit : page의 이미지 수
+        prefix : 이 문자열로 시작하는 이름만 (디렉터리 EX) "gallery/")
+        query : 이름에 이 문자열이 포함된 이미지만 (대소문자 무시)
 
-    def save_users(self, users : dict) -> None:
+        return : tuple(response, None). body는 JSON
+                 {"images" : [{name, size, mtime, width, height, content_type, etag}, ...], "next" : str or null, "total" : int}'''
+        (entries, next) = self.catalog.list(after, limit, prefix, query)
+        body = json.dumps({"images" : [entry.to_dict() for entry in entries], "next" : next, "total" : len(self.catalog)})
+        return self._create_response_str("200 OK", headers=["Content-Type: application/json"], body=body)
+
+    @timed("bundle_downloader")
+    def bundle_downloader(self, urls : list, etags : dict=None) -> tuple:
         '''
-        user에 있는 내용을 유저 데이터베이스에 업데이트
-        
-        users : dict'''
-        with self.lock_user_db:
-            with open(USER_DB, "w") as file:
-                json.dump(users, file, indent=4)
-    
-    def _is_valid_key(self, id : str) -> bool:
+        client가 POST /images/batch로 접근했을 때 처리하는 함수
+
+        여러 이미지를 multipart/mixed response 하나로 전달하여 이미지마다 request를 보내는 비용을 줄임.
+        part마다 Content-Location(요청한 url)과 Status(200 OK, 304 Not Modified, 404 Not Found) header를 붙이고,
+        200 part에는 image_downloader와 같은 Content-Type, ETag, Last-Modified, Cache-Control을 붙임.
+        모든 part에 Content-Length가 있으므로 client는 boundary를 찾지 않고 길이로 나눌 수 있음.
+        파일 내용은 BundleBody가 보낼 차례에 하나씩 읽으므로(큰 파일은 sendfile) response 전체를 메모리에 만들지 않음.
+
+        urls : client가 요청한 image file 리스트
+        etags : url -> client가 가진 ETag. 현재 파일과 같으면 body 없는 304 part
+
+        return : response와 BundleBody'''
+        etags = etags or {}
+        boundary = secrets.token_hex(16)
+        parts = []
+        pending = b"" # 다음 파일 앞까지의 구분자와 part header
+        for url in urls:
+            lines = [f"--{boundary}", f"Content-Location: {url}"]
+            try:
+                (entry, file) = self.catalog.open(url)
+                file.close()
+                (path, info) = (entry.path, entry.info)
+            except KeyError:
+                info = None
+            if info is None:
+                lines += ["Status: 404 Not Found", "Content-Length: 0"]
+            else:
+                validators = list(_image_validators(info)[1])
+                if self._is_not_modified(info.etag, int(info.mtime), etags.get(url), None):
+                    lines += ["Status: 304 Not Modified"] + validators + ["Content-Length: 0"]
+                    info = None
+                else:
+                    lines += ["Status: 200 OK", f"Content-Type: {info.content_type}"] + validators + [f"Content-Length: {info.size}"]
+            pending += ("\r\n".join(lines) + "\r\n\r\n").encode()
+            if info is not None:
+                parts += [pending, (path, info)]
+                pending = b""
+            pending += b"\r\n" # part body 끝
+        parts.append(pending + f"--{boundary}--\r\n".encode())
+        return self._create_response_byte("200 OK", headers=[f"Content-Type: multipart/mixed; boundary={boundary}"],
+                                          body=BundleBody(parts, self.file_cache))
+
+    def _parse_bundle_request(self, request : HttpRequest) -> tuple:
+        '''
+        POST /images/batch의 body에서 url 리스트와 etags를 꺼냄
+
+        return : (urls, etags). urls는 순서를 유지한 채 중복을 제거함
+        raise : HttpError (400) body 형식이 잘못되었거나 url이 MAX_BUNDLE_IMAGES개보다 많음'''
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            raise HttpError("400 Bad Request", "Invalid JSON body") from None
+        (urls, etags) = (data, {}) if isinstance(data, list) else (None, None)
+        if isinstance(data, dict):
+            (urls, etags) = (data.get("urls"), data.get("etags") or {})
+        if not isinstance(urls, list) or not all(isinstance(url, str) and url.isprintable() for url in urls):
+            raise HttpError("400 Bad Request", "Body must be a list of image urls")
+        if not isinstance(etags, dict) or not all(isinstance(etag, str) for etag in etags.values()):
+            raise HttpError("400 Bad Request", "etags must be an object of url : ETag")
+        urls = list(dict.fromkeys(urls))
+        if len(urls) > MAX_BUNDLE_IMAGES:
+            raise HttpError("400 Bad Request", f"Too many images (max {MAX_BUNDLE_IMAGES})")
+        return (urls, etags)
+
+    @timed("variant_downloader")
+    def variant_downloader(self, url : str, query : dict, request : HttpRequest) -> tuple:
+        '''
+        client가 /images?w=&h=&fmt=&q= 로 접근했을 때 처리하는 함수
+
+        원본 이미지를 w x h 안에 들어가도록 축소하고 fmt(jpeg, png, webp)로 다시 인코딩한 variant를 전달.
+        variant는 derivatives(DerivativeCache)에 원본 내용 hash + parameter로 저장되므로 같은 요청은 한 번만 변환함.
+        변환한 파일은 원본과 같이 ETag/304, Range를 지원함.
+
+        url : client가 요청한 원본 image file
+        query : request.query() (w, h : 최대 크기, fmt : 형식, q : 품질)
+        request : 조건부 요청과 Range header를 확인할 request
+
+        return : variant가 존재하면 response와 byte data(또는 FileBody)를 튜플로 전달.
+                 원본이 없으면 404, parameter가 잘못되었으면 400, 이미지로 읽을 수 없으면 415,
+                 변환한 파일을 저장할 수 없으면 500, 서버에 Pillow가 없으면 501 response와 None을 전달.
         '''
-        client id의 key가 유효한 지 검사하는 함수
+        try:
+            (entry, file) = self.catalog.open(url)
+            file.close()
+        except KeyError:
+            return self._create_response_str("404 Not Found", body="Image not found")
+        source = entry.info
+        try:
+            variant = parse_variant(query, source.content_type)
+        except ValueError as e:
+            return self._create_response_str("400 Bad Request", body=str(e))
+        if not PILLOW_AVAILABLE:
+            return self._create_response_str("501 Not Implemented", body="Image transforms are not available")
+
+        for _ in range(2): # 다른 process가 cache에서 지웠으면 한 번 더 변환
+            try:
+                path = self.derivatives.get(entry.path, source.etag, variant)
+            except ValueError as e:
+                return self._create_response_str("415 Unsupported Media Type", body=str(e))
+            except OSError as e: # 변환한 파일을 저장하지 못함 (디스크 부족 등)
+                self.log_message(f"cannot store variant of {url}: {e!r}", ERROR)
+                return self._create_response_str("500 Internal Server Error", body="Cannot store image variant")
+            try:
+                file = open(path, "rb")
+                info = self.file_cache.info(path, file)
+                break
+            except FileNotFoundError:
+                self.derivatives.forget(path)
+        else:
+            return self._create_response_str("503 Service Unavailable", body="Image variant was evicted")
+
+        stem = os.path.splitext(os.path.basename(entry.path))[0]
+        filename = f"{stem}_{variant.width or ''}x{variant.height or ''}.{variant.extension()}"
+        return self._file_response(path, file, info, request, filename)
+
+    def _file_response(self, path : str, file, info, request : HttpRequest, filename : str) -> tuple:
+        '''
+        열린 이미지 파일의 응답 (304, 200, 206 or 416). 200/206이면 file은 body로 전달되고, 아니면 닫음
+
+        path : file_cache key
+        info : file_cache.info(path, file)
+        filename : Content-Disposition에 넣을 파일 이름'''
+        header = request.header
+        (last_modified, validators) = _image_validators(info)
+        if self._is_not_modified(info.etag, int(info.mtime), header("If-None-Match"), header("If-Modified-Since")):
+            file.close()
+            return ("\r\n".join(("HTTP/1.1 304 Not Modified", _date_now()[1]) + validators + ("", "")).encode(), None)
+
+        headers = _image_headers(info, filename)
+
+        byte_range = None
+        if_range = header("If-Range")
+        if if_range is None or if_range.strip() in (info.etag, last_modified): # If-Range가 다르면 전체 전송
+            try:
+                byte_range = self._byte_range(header("Range"), info.size)
+            except ValueError:
+                file.close()
+                return self._create_response_str("416 Range Not Satisfiable", headers=[f"Content-Range: bytes */{info.size}"],
+                                                 body="Range not satisfiable")
+        if byte_range is None:
+            body = self.file_cache.body(path, file)
+            return self._create_response_byte("200 OK", headers=headers, body=body)
+
+        (offset, length) = byte_range
+        body = self.file_cache.body(path, file, offset, length)
+        headers += (f"Content-Range: bytes {offset}-{offset + length - 1}/{info.size}",)
+        return self._create_response_byte("206 Partial Content", headers=headers, body=body)
+
+    def _is_not_modified(self, etag : str, mtime : int, if_none_match : str, if_modified_since : str) -> bool:
+        '''
+        client가 가진 cache가 현재 파일과 같은 지 검사하는 함수
+
+        If-None-Match가 있으면 ETag만 비교하고, 없을 때 If-Modified-Since와 mtime(초 단위)을 비교'''
+        if if_none_match is not None:
+            return if_none_match.strip() == "*" or etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if if_modified_since is not None:
+            try:
+                return mtime <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _byte_range(self, range_header : str, size : int) -> tuple:
+        '''
+        Range header에서 보낼 구간을 계산하는 함수
+
+        "bytes=start-end", "bytes=start-", "bytes=-suffix" 형식의 단일 구간만 처리.
+        header가 없거나, 형식이 잘못되었거나, 여러 구간이면 None(전체 전송)
+
+        return : (offset, length) 또는 None
+        raise : ValueError (파일 범위를 벗어난 구간 => 416)'''
+        if range_header is None:
+            return None
+        unit, _, spec = range_header.strip().partition("=")
+        if unit.strip().lower() != "bytes" or "," in spec:
+            return None
+        start, sep, end = spec.strip().partition("-")
+        if not sep or not (start.isdigit() or end.isdigit()) or (start and not start.isdigit()) or (end and not end.isdigit()):
+            return None
+
+        if not start: # 마지막 suffix 바이트
+            suffix = int(end)
+            if suffix == 0 or size == 0:
+                raise ValueError("unsatisfiable range")
+            suffix = min(suffix, size)
+            return (size - suffix, suffix)
+
+        first = int(start)
+        if end and int(end) < first: # 잘못된 구간
+            return None
+        if first >= size:
+            raise ValueError("unsatisfiable range")
+        last = min(int(end), size - 1) if end else size - 1
+        return (first, last - first + 1)
+
+    def _cookies(self, request : HttpRequest) -> dict:
+        '''
+        request의 Cookie header를 이름 -> 값 dict로 반환'''
+        cookies = {}
+        for cookie in request.header("Cookie", "").split(";"):
+            (name, _, value) = cookie.strip().partition("=")
+            if name:
+                cookies[name] = value
+        return cookies
+
+    def _session_user(self, request : HttpRequest) -> str:
+        '''
+        session cookie로 로그인한 사용자 id를 찾음
+
+        return : user id. session이 없거나 만료되었으면 None'''
+        token = self._cookies(request).get("session")
+        return self.sessions.lookup(token, "session") if token else None
+
+    def _is_valid_key(self, request : HttpRequest) -> bool:
+        '''
+        request의 key cookie가 유효한 지 검사하는 함수
         
-        users.json에서 id를 보고 user key 정보를 받아옴
+        SessionTable에서 token을 찾으므로 O(1)이며 user database를 읽지 않음.
 
         False :
-        key["value"] == self.default_key => 권한 상승하지 않음
-        time.time() > key["expiry_time"] => key의 유효 기간이 지남
+        key cookie가 없음
+        발급되지 않은 key
+        key의 유효 기간이 지남
 
-        id : user id
+        request : RequestParser가 파싱한 HttpRequest
 
         return : bool
         '''
-        users = self.load_users()
-        key = users.get(id)["key"]
+        return self._key_user(request) is not None
 
-        if key["value"] == self.default_key or time.time() > key["expiry_time"]: # Invalid
-            return False
-        
-        return True
+    def _key_user(self, request : HttpRequest) -> str:
+        '''
+        key cookie의 사용자 id. key가 없거나 유효하지 않으면 None'''
+        token = self._cookies(request).get("key")
+        return self.sessions.lookup(token, "key") if token else None
+
+    def _authorize_images(self, request : HttpRequest, download : bool) -> str:
+        '''
+        이미지 route의 권한 검사와 사용자별 제한.
+
+        key cookie의 사용자마다 이미지 request 수(token bucket)를 제한하고,
+        download이면 동시에 보내는 이미지 response 수도 제한함.
+        잡은 다운로드 slot은 response를 다 보낸 뒤 연결 loop가 request.release()로 돌려줌.
+
+        return : user id
+        raise : HttpError 401 key가 유효하지 않음, 429 제한을 넘음'''
+        user = self._key_user(request)
+        if user is None:
+            raise HttpError("401 Unauthorized", "Invalid Key")
+        wait = self.admission.user.acquire(user)
+        if wait:
+            raise self._throttled("user", wait)
+        if download and request.release is None:
+            if not self.admission.downloads.acquire(user):
+                raise self._throttled("downloads", 1)
+            request.release = functools.partial(self.admission.downloads.release, user)
+        return user
+
+    def _throttled(self, reason : str, wait : float) -> HttpError:
+        '''
+        admission control이 거절한 request의 429 응답. wait초 뒤에 다시 시도하도록 Retry-After를 붙임'''
+        self.metrics.throttled(reason)
+        return HttpError("429 Too Many Requests", "Too many requests", [f"Retry-After: {retry_after(wait)}"])
     
-    def log_message(self, message):
+    def log_message(self, message, level : int=INFO) -> None:
         '''
         서버가 생성한 메세지들을 LOG_FILE에 저장.
 
-        timestamp message 형태로 저장
+        timestamp [level] message 형태로 저장.
+        요청을 처리하는 thread는 대기열에 넣기만 하고, 파일 쓰기와 화면 출력은 LogWriter의 background thread가 모아서 함.
         
-        message : 서버가 생성한 메세지'''
-        timestamp = datetime.now().strftime("[%Y-%m-%d %H:%M:%S]")
-        log_entry = f"{timestamp} {message}\n"
-        with open(LOG_FILE, "a", encoding="utf-8") as f:
-            f.write(log_entry)
-        print(message)
+        message : 서버가 생성한 메세지
+        level : DEBUG, INFO, WARNING, ERROR'''
+        self.logger.log(message, level)
+
+    def serve(self, mode : str="thread", workers : int=DEFAULT_WORKERS, max_connections : int=DEFAULT_MAX_CONNECTIONS,
+              threads : int=DEFAULT_WORKERS, reuseport : bool=False) -> None:
+        '''
+        accept loop. 연결을 accept한 뒤 worker pool에 client_handler를 맡김.
+
+        thread : ThreadPoolExecutor에서 client_handler 실행
+        process : ProcessPoolExecutor로 client socket을 넘겨 worker process에서 client_handler 실행
+        prefork : worker process들이 각자 accept하고 자기 thread pool에서 처리 (_serve_prefork)
+
+        max_connections개의 연결이 처리 중(또는 대기 중)이면 연결이 끝날 때까지 accept하지 않음.
+        그 이후의 연결은 kernel의 listen backlog에서 대기.
+        draining이 set되면 accept를 멈추고 처리 중인 연결을 drain_timeout까지 기다린 뒤 반환.
+
+        mode : "thread", "process" or "prefork"
+        workers : pool의 worker 수 (prefork는 worker process 수)
+        max_connections : 동시에 유지하는 최대 연결 수 (prefork는 worker process마다)
+        threads : prefork worker process마다의 thread 수
+        reuseport : prefork worker가 SO_REUSEPORT로 각자 listen socket을 엶. Server(reuseport=True)로 열어야 함'''
+        if mode == "prefork":
+            self._serve_prefork(workers, threads, max_connections, reuseport)
+            return
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown concurrency mode: {mode}")
+
+        metrics_dir = None
+        if mode == "process": # worker process들도 같은 user database와 session table을 사용
+            metrics_dir = tempfile.mkdtemp(prefix="server-metrics-") # worker들의 지표를 합치기 위한 snapshot 디렉터리
+            self.metrics.share(metrics_dir)
+            # fork : worker가 parent의 tls_context(session ticket key 포함)를 그대로 물려받아 어느 worker로 다시 연결해도 재개됨
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"),
+                                           initializer=_init_process_worker, initargs=self._worker_initargs(metrics_dir))
+            # fork는 첫 submit에서 worker를 모두 띄움. client socket을 연 뒤에 fork하면 worker들이
+            # 그 fd를 물려받아 연결을 닫아도 client에 FIN이 가지 않으므로 accept 전에 띄움
+            executor.submit(os.getpid).result()
+            handler = _process_client_handler
+        else:
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="client")
+            handler = self.client_handler
+
+        self.log_message(f"Server started ({mode} mode, workers={workers}, max_connections={max_connections})")
+        slots = threading.BoundedSemaphore(max_connections)
+        try:
+            self._accept_loop(self, executor, handler, slots, self.draining)
+            if mode == "process": # worker도 처리 중인 request만 마치고 연결을 닫도록
+                for process in list(executor._processes.values()):
+                    os.kill(process.pid, signal.SIGUSR1)
+            self._wait_connections(slots, max_connections)
+        finally:
+            processes = list(executor._processes.values()) if mode == "process" else [] # shutdown이 비움
+            executor.shutdown(wait=False, cancel_futures=True)
+            for process in processes: # keep-alive 연결을 잡고 있는 worker가 종료를 막지 않도록
+                process.terminate()
+            if metrics_dir is not None:
+                self.metrics.close()
+                shutil.rmtree(metrics_dir, ignore_errors=True)
+
+    def _accept_loop(self, listener : socket.socket, executor, handler, slots : threading.BoundedSemaphore,
+                     stop : threading.Event=None) -> None:
+        '''
+        listener에서 accept한 연결을 executor의 handler에 맡김. stop이 set되면 반환
+
+        slots : 동시에 처리하는 연결 수 제한. 연결 처리가 끝나면 반환됨'''
+        def on_done(future, client_socket=None, addr=None):
+            '''
+            연결 처리가 끝나면 slot을 반환하고 parent 쪽 socket을 닫음'''
+            slots.release()
+            client_socket.close()
+            if not future.cancelled() and future.exception() is not None:
+                self.log_message(f"[{addr[0]}] handler error: {future.exception()}", ERROR)
+
+        listener.settimeout(ACCEPT_TIMEOUT)
+        while stop is None or not stop.is_set():
+            if not slots.acquire(timeout=ACCEPT_TIMEOUT):
+                continue
+            try:
+                client_socket, addr = listener.accept()
+            except socket.timeout:
+                slots.release()
+                continue
+            except BaseException:
+                slots.release()
+                raise
+            future = executor.submit(handler, client_socket, addr)
+            future.add_done_callback(lambda f, s=client_socket, a=addr: on_done(f, s, a))
+
+    def _wait_connections(self, slots : threading.BoundedSemaphore, max_connections : int) -> None:
+        '''
+        drain : _accept_loop가 멈춘 뒤 처리 중인 연결이 모두 끝나기를(slot이 모두 반환되기를) drain_timeout까지 기다림'''
+        self.log_message(f"Draining connections (timeout {self.drain_timeout}s)")
+        deadline = time.monotonic() + self.drain_timeout
+        busy = max_connections
+        while busy and slots.acquire(timeout=max(0, deadline - time.monotonic())):
+            busy -= 1
+        if busy:
+            self.log_message(f"closing {busy} unfinished connections", WARNING)
+
+    def _worker_initargs(self, metrics_dir : str) -> tuple:
+        '''
+        _init_process_worker에 넘길 인자. user database와 session table은 이 process가 가지고 worker는 proxy로 접근함'''
+        return (self.users.worker_opener(), self.sessions.worker_opener(), self.hasher.options(),
+                self.logger.worker_options(), metrics_dir, self.derivatives.worker_options(), self.compressor.options(),
+                self.tls_context, self.connection_options(), self.catalog, self.admission.options())
+
+    def connection_options(self) -> dict:
+        '''
+        process worker의 Server에 같은 timeout과 연결 제한, /metrics 공개 범위를 주는 인자'''
+        return {"idle_timeout" : self.idle_timeout, "read_timeout" : self.read_timeout,
+                "write_timeout" : self.write_timeout, "max_requests" : self.max_requests,
+                "drain_timeout" : self.drain_timeout, "metrics_access" : self.metrics_access}
+
+    def _serve_prefork(self, workers : int, threads : int, max_connections : int, reuseport : bool) -> None:
+        '''
+        prefork mode supervisor.
+
+        worker process workers개를 fork하고, 각 worker는 listen socket에서 직접 accept하여 자기 thread pool에서 처리함.
+        request 처리(JSON 파싱, response 생성, 압축)가 process마다 따로 실행되므로 GIL에 묶이지 않음.
+        - reuseport : worker마다 SO_REUSEPORT socket을 열어 kernel이 연결을 worker들에 나눔.
+          이 process의 socket은 port를 잡아두기만 하고 listen하지 않으므로 연결이 배정되지 않음
+        - 아니면 이 process의 listen socket을 fork로 물려받아 모든 worker가 같은 socket에서 accept
+
+        user database, session table은 이 process가 가지고 worker는 manager proxy로(sqlite는 파일을 직접) 접근함.
+        로그는 모든 process가 같은 파일에 append하고 rotation은 이 process만 함. /metrics는 snapshot 디렉터리로 합침.
 
+        죽은 worker는 다시 띄우고(PREFORK_RESTART_DELAY보다 빨리 죽었으면 그만큼 기다림),
+        draining이 set되면 worker에 SIGTERM을 보내 accept를 멈추고 처리 중인 연결을
+        drain_timeout까지 마치게 한 뒤 종료를 기다림. KeyboardInterrupt이면 바로 SIGTERM을 보냄.'''
+        context = multiprocessing.get_context("fork") # listen socket과 tls_context를 그대로 물려줌
+        metrics_dir = tempfile.mkdtemp(prefix="server-metrics-")
+        self.metrics.share(metrics_dir)
+        initargs = self._worker_initargs(metrics_dir)
+        port = self.getsockname()[1]
+        ready = context.Semaphore(0) # worker가 listen을 시작하면 release
 
-def main(port):
+        def spawn():
+            process = context.Process(target=_prefork_worker, name="prefork-worker",
+                                      args=(self, port, initargs, threads, max_connections, reuseport, ready))
+            process.start()
+            return (process, time.monotonic())
+
+        children = {}
+        try:
+            for _ in range(workers):
+                (process, started) = spawn()
+                children[process.sentinel] = (process, started)
+            for _ in range(workers):
+                ready.acquire(timeout=PREFORK_START_TIMEOUT)
+            self.log_message(f"Server started (prefork mode, workers={workers}, threads={threads}, "
+                             f"max_connections={max_connections}, reuseport={reuseport})")
+
+            while not self.draining.is_set():
+                for sentinel in multiprocessing.connection.wait(list(children), ACCEPT_TIMEOUT):
+                    (process, started) = children.pop(sentinel)
+                    process.join()
+                    self.log_message(f"worker {process.pid} exited with {process.exitcode}, restarting", WARNING)
+                    if time.monotonic() - started < PREFORK_RESTART_DELAY:
+                        time.sleep(PREFORK_RESTART_DELAY)
+                    (process, started) = spawn()
+                    children[process.sentinel] = (process, started)
+        finally:
+            for (process, _) in children.values():
+                if process.is_alive():
+                    process.terminate() # SIGTERM : drain
+            deadline = time.monotonic() + self.drain_timeout + 1
+            for (process, _) in children.values():
+                process.join(max(0, deadline - time.monotonic()))
+                if process.is_alive():
+                    process.kill()
+                    process.join()
+            self.metrics.close()
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+_worker_server = None # process worker마다 생성되는 핸들러 전용 Server
+
+def _init_process_worker(store_opener : tuple, session_opener : tuple, kdf_options : dict, log_options : dict,
+                         metrics_dir : str, derivative_options : dict, compress_options : dict,
+                         tls_context : ssl.SSLContext, connection_options : dict, catalog : ImageCatalog,
+                         admission_options : dict) -> None:
+    '''
+    ProcessPoolExecutor의 initializer. worker process에서 사용할 Server 인스턴스 생성
+
+    store_opener : UserStore.worker_opener()가 반환한 (factory, args)
+    session_opener : SessionTable.worker_opener()가 반환한 (factory, args)
+    kdf_options : PasswordHasher.options()
+    log_options : LogWriter.worker_options()
+    metrics_dir : Metrics snapshot을 공유하는 디렉터리
+    derivative_options : DerivativeCache.worker_options()
+    compress_options : Compressor.options()
+    tls_context : parent의 Server.tls_context (fork로 전달되므로 pickle하지 않음)
+    connection_options : Server.connection_options()
+    catalog : parent의 Server.catalog (fork로 전달되므로 처음 훑은 index를 그대로 이어서 갱신함)
+    admission_options : AdmissionControl.options() (제한은 worker process마다 따로 적용)'''
+    global _worker_server
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # 종료는 parent process가 처리
+    signal.signal(signal.SIGTERM, _terminate_process_worker)
+    signal.signal(signal.SIGUSR1, _drain_process_worker)
+    factory, args = store_opener
+    session_factory, session_args = session_opener
+    _worker_server = Server(users=factory(*args), logger=LogWriter(**log_options), metrics=Metrics(metrics_dir),
+                            sessions=session_factory(*session_args), hasher=PasswordHasher(**kdf_options),
+                            derivatives=DerivativeCache(**derivative_options), compressor=Compressor(**compress_options),
+                            tls_context=tls_context, catalog=catalog, admission=AdmissionControl(**admission_options),
+                            **connection_options)
+
+def _drain_process_worker(signum, frame) -> None:
+    '''
+    parent가 drain을 시작하면(SIGUSR1) 처리 중인 연결은 request를 마치고 닫게 함.
+    worker는 종료하지 않음 (pool의 worker가 먼저 종료하면 executor가 다른 worker들도 종료함)'''
+    _worker_server.draining.set()
+
+def _terminate_process_worker(signum, frame) -> None:
+    '''
+    parent가 worker를 terminate하면 남은 로그와 지표를 기록하고 종료'''
+    _worker_server.logger.flush()
+    _worker_server.metrics.flush()
+    os._exit(0)
+
+def _process_client_handler(client_socket : socket.socket, addr) -> None:
+    '''
+    worker process에서 실행되는 client_handler.
+    client_socket은 multiprocessing이 fd를 복제하여 전달함.'''
+    _worker_server.client_handler(client_socket, addr)
+
+def _prefork_worker(listener : socket.socket, port : int, initargs : tuple, threads : int, max_connections : int,
+                    reuseport : bool, ready) -> None:
+    '''
+    prefork worker process의 main.
+
+    listener : parent의 listen socket (fork로 물려받음)
+    port : listen port
+    initargs : _init_process_worker의 인자
+    threads : 연결을 처리하는 thread 수
+    max_connections : 이 process가 동시에 유지하는 최대 연결 수
+    reuseport : True이면 같은 port에 SO_REUSEPORT로 자기 listen socket을 엶
+    ready : listen을 시작하면 release하는 semaphore
+
+    SIGTERM을 받으면 accept를 멈추고 listen socket을 닫은 뒤, 처리 중인 연결이 끝나기를
+    drain_timeout까지 기다리고 남은 로그와 지표를 기록하고 종료.'''
+    _init_process_worker(*initargs)
+    server = _worker_server
+    signal.signal(signal.SIGTERM, lambda signum, frame: server.draining.set())
+
+    if reuseport: # 같은 port에 자기 listen socket을 엶 (물려받은 parent의 socket은 listen하지 않음)
+        listener.close()
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        server.bind(("", port))
+        server.listen(listener.backlog)
+        listener = server
+    ready.release()
+
+    executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="client")
+    slots = threading.BoundedSemaphore(max_connections)
+    server.log_message(f"worker {os.getpid()} started", DEBUG)
+    try:
+        server._accept_loop(listener, executor, server.client_handler, slots, server.draining)
+    finally:
+        listener.close() # 새 연결은 다른 worker가 받음 (SO_REUSEPORT socket의 accept 대기열에 남은 연결은 끊김)
+        server._wait_connections(slots, max_connections)
+        server.logger.flush()
+        server.metrics.flush() # 종료한 worker의 지표도 /metrics에 남도록
+        os._exit(0)
+
+
+def open_user_store(kind : str="json"):
+    '''
+    user database를 엶
+
+    kind : "json"(USER_DB, JsonUserStore) or "sqlite"(SQLITE_DB, SqliteUserStore)'''
+    if kind == "sqlite":
+        from sqlite_store import SqliteUserStore
+        return SqliteUserStore(SQLITE_DB)
+    return JsonUserStore(USER_DB)
+
+
+def _drain_on_signal(server : Server) -> None:
+    '''
+    SIGTERM, SIGINT(Ctrl+C)를 받으면 server.draining을 set하여 새 연결을 받지 않고 처리 중인 연결을 마친 뒤 종료하게 함.
+    drain 중에 다시 받으면 KeyboardInterrupt로 바로 종료'''
+    def on_signal(signum, frame):
+        if server.draining.is_set():
+            raise KeyboardInterrupt
+        server.log_message(f"{signal.Signals(signum).name} received, stop accepting")
+        server.draining.set()
+    signal.signal(signal.SIGTERM, on_signal)
+    signal.signal(signal.SIGINT, on_signal)
+
+
+def main(port : int, mode : str="thread", workers : int=None,
+         max_connections : int=None, backlog : int=DEFAULT_BACKLOG, store : str="json",
+         log_level : str="info", log_sample : float=1.0, quiet : bool=False,
+         kdf_n : int=KDF_N, kdf_workers : int=KDF_WORKERS, compression : bool=True,
+         tls : bool=False, certfile : str=CERT_FILE, keyfile : str=KEY_FILE,
+         threads : int=DEFAULT_WORKERS, reuseport : bool=True, idle_timeout : float=IDLE_TIMEOUT,
+         read_timeout : float=READ_TIMEOUT, write_timeout : float=WRITE_TIMEOUT,
+         max_requests : int=MAX_REQUESTS_PER_CONNECTION, drain_timeout : float=DRAIN_TIMEOUT,
+         image_root : str=IMAGE_ROOT, ip_rate : float=IP_RATE, user_rate : float=USER_RATE,
+         login_rate : float=LOGIN_RATE, max_downloads : int=MAX_DOWNLOADS, rate_limit : bool=True,
+         metrics_access : str="local"):
     '''
     Start Server
     
     서버를 열고 client를 기다림.
-    클라이언트가 접근 => client_handler 실행
-    을 무한 반복'''
-    with Server(port) as server:
+    클라이언트가 접근 => worker pool(thread, process) 또는 event loop(asyncio)에서 연결 처리
+    을 SIGTERM 또는 Ctrl+C를 받을 때까지 반복. 받으면 처리 중인 연결을 drain_timeout까지 마치고 종료
+
+    workers : None이면 mode별 기본값 사용 (prefork는 CPU 수, 그 외는 DEFAULT_WORKERS)
+    max_connections : None이면 mode별 기본값 사용
+    store : user database 종류 ("json" or "sqlite")
+    log_level : 기록할 최소 로그 level ("debug", "info", "warning", "error"). debug이면 raw request도 기록
+    log_sample : debug level에서 raw request를 기록할 비율
+    quiet : True이면 로그를 화면에 출력하지 않음
+    kdf_n : password hash(scrypt)의 cost. 2의 거듭제곱
+    kdf_workers : password hash를 계산하는 thread 수 (process mode에서는 worker process마다)
+    compression : False이면 response body를 압축하지 않음
+    tls : True이면 certfile, keyfile로 HTTPS 서버를 엶
+    threads : prefork mode에서 worker process마다의 thread 수
+    reuseport : prefork mode에서 worker마다 SO_REUSEPORT listen socket을 엶 (지원하지 않는 OS에서는 무시)
+    idle_timeout, read_timeout, write_timeout, max_requests, drain_timeout : 연결 timeout과 제한 (Server 참고)
+    image_root : 이미지를 찾는 디렉터리. 시작할 때 훑어 catalog를 만듦
+    ip_rate, user_rate, login_rate : IP, 사용자, username(로그인)마다의 초당 request 수. 0이면 제한하지 않음
+    max_downloads : 사용자마다 동시에 보내는 이미지 response 수. 0이면 제한하지 않음
+    rate_limit : False이면 위 제한을 모두 끔 (부하 측정용)
+    metrics_access : /metrics를 받을 client (METRICS_ACCESS)'''
+    if workers is None:
+        workers = (os.cpu_count() or 1) if mode == "prefork" else DEFAULT_WORKERS
+    reuseport = reuseport and mode == "prefork" and hasattr(socket, "SO_REUSEPORT")
+    logger = LogWriter(LOG_FILE, level=LEVELS[log_level], echo=not quiet, sample_rate=log_sample)
+    hasher = PasswordHasher(n=kdf_n, workers=kdf_workers)
+    compressor = Compressor() if compression else Compressor(codings=())
+    tls_context = server_context(certfile, keyfile) if tls else None
+    admission = AdmissionControl(ip_rate=ip_rate, user_rate=user_rate, login_rate=login_rate,
+                                 max_downloads=max_downloads) if rate_limit else AdmissionControl.disabled()
+    catalog = ImageCatalog(image_root, exclude=(DERIVATIVE_DIR,))
+    started = time.perf_counter()
+    catalog.refresh() # fork 전에 훑어서 worker process들이 index를 물려받음
+    logger.log(f"{len(catalog)} images in {os.path.abspath(image_root)} ({time.perf_counter() - started:.2f}s)")
+    with Server(port, backlog, open_user_store(store), logger, hasher=hasher, compressor=compressor,
+                tls_context=tls_context, reuseport=reuseport, idle_timeout=idle_timeout, read_timeout=read_timeout,
+                write_timeout=write_timeout, max_requests=max_requests, drain_timeout=drain_timeout,
+                catalog=catalog, admission=admission, metrics_access=metrics_access) as server:
+        _drain_on_signal(server)
         try:
-            while True:
-                client_socket, addr = server.accept()
-                server.client_handler(client_socket, addr)
+            if mode == "asyncio":
+                from async_server import serve_async, DEFAULT_ASYNC_MAX_CONNECTIONS
+                serve_async(server, max_connections or DEFAULT_ASYNC_MAX_CONNECTIONS)
+            else:
+                server.serve(mode, workers, max_connections or DEFAULT_MAX_CONNECTIONS, threads, reuseport)
         except KeyboardInterrupt:
             print("서버 종료 중...")
 
@@ -305,12 +1424,67 @@ def main(port):
 if __name__ == "__main__":
     '''
     argv[1] : port
-    threading을 통해 client마다 socket을 새로 생성'''
-    if len(sys.argv) != 2:
-        print(f"Usage: {sys.argv[0]} <port>")
-        sys.exit(1)
-
-    port = int(sys.argv[1])
-    threading_socket = threading.Thread(target=main, args=(port,)) # threading socket
-    print(f"Server started at {port}")
-    threading_socket.start()
+    --mode : thread(기본값), process, asyncio or prefork
+    --workers : 동시에 처리하는 연결 수 (prefork는 worker process 수, 기본값 CPU 수)
+    --threads : prefork mode에서 worker process마다의 thread 수
+    --max-connections : 동시에 유지하는 최대 연결 수
+    --backlog : listen backlog
+    --store : user database. json(기본값, users.json) or sqlite(users.db)
+    --log-level : debug, info(기본값), warning, error
+    --log-sample : debug level에서 raw request를 기록할 비율 (기본값 1.0)
+    --quiet : 로그를 화면에 출력하지 않음
+    --kdf-n : password hash(scrypt) cost (기본값 16384)
+    --kdf-workers : password hash를 계산하는 thread 수 (기본값 CPU 수)
+    --no-compression : Accept-Encoding이 있어도 response body를 압축하지 않음
+    --tls : HTTPS. --cert, --key로 인증서 지정 (기본값 cert.pem, key.pem. python tls.py로 생성)
+    --no-reuseport : prefork worker들이 SO_REUSEPORT 대신 parent의 listen socket을 함께 사용
+    --idle-timeout : keep-alive 연결에서 다음 request를 기다리는 시간(초, 기본값 15)
+    --read-timeout : request 전체를 받는 시간(초, 기본값 10). 넘으면 408
+    --write-timeout : response를 보내는 시간(초, 기본값 30)
+    --max-requests : 연결 하나에서 처리하는 최대 request 수 (기본값 1000)
+    --drain-timeout : 종료할 때 처리 중인 연결을 기다리는 시간(초, 기본값 10)
+    --image-root : 이미지를 찾는 디렉터리 (기본값 현재 디렉터리)
+    --ip-rate : IP마다 초당 request 수 (기본값 100, 0이면 제한 없음)
+    --user-rate : 사용자마다 초당 이미지 request 수 (기본값 50)
+    --login-rate : username마다 초당 로그인 시도 수 (기본값 0.5)
+    --max-downloads : 사용자마다 동시에 보내는 이미지 response 수 (기본값 8)
+    --no-rate-limit : 위 제한을 모두 끔
+    --metrics : /metrics를 받을 client. local(기본값, loopback만), public, off'''
+    parser = argparse.ArgumentParser()
+    parser.add_argument("port", type=int)
+    parser.add_argument("--mode", choices=CONCURRENCY_MODES, default="thread")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--threads", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--max-connections", type=int, default=None)
+    parser.add_argument("--backlog", type=int, default=DEFAULT_BACKLOG)
+    parser.add_argument("--store", choices=USER_STORES, default="json")
+    parser.add_argument("--log-level", choices=list(LEVELS), default="info")
+    parser.add_argument("--log-sample", type=float, default=1.0)
+    parser.add_argument("--quiet", action="store_true")
+    parser.add_argument("--kdf-n", type=int, default=KDF_N)
+    parser.add_argument("--kdf-workers", type=int, default=KDF_WORKERS)
+    parser.add_argument("--no-compression", dest="compression", action="store_false")
+    parser.add_argument("--tls", action="store_true")
+    parser.add_argument("--cert", default=CERT_FILE)
+    parser.add_argument("--key", default=KEY_FILE)
+    parser.add_argument("--no-reuseport", dest="reuseport", action="store_false")
+    parser.add_argument("--idle-timeout", type=float, default=IDLE_TIMEOUT)
+    parser.add_argument("--read-timeout", type=float, default=READ_TIMEOUT)
+    parser.add_argument("--write-timeout", type=float, default=WRITE_TIMEOUT)
+    parser.add_argument("--max-requests", type=int, default=MAX_REQUESTS_PER_CONNECTION)
+    parser.add_argument("--drain-timeout", type=float, default=DRAIN_TIMEOUT)
+    parser.add_argument("--image-root", default=IMAGE_ROOT)
+    parser.add_argument("--ip-rate", type=float, default=IP_RATE)
+    parser.add_argument("--user-rate", type=float, default=USER_RATE)
+    parser.add_argument("--login-rate", type=float, default=LOGIN_RATE)
+    parser.add_argument("--max-downloads", type=int, default=MAX_DOWNLOADS)
+    parser.add_argument("--no-rate-limit", dest="rate_limit", action="store_false")
+    parser.add_argument("--metrics", choices=METRICS_ACCESS, default="local")
+    args = parser.parse_args()
+
+    print(f"Server started at {args.port}")
+    main(args.port, args.mode, args.workers, args.max_connections, args.backlog, args.store,
+         args.log_level, args.log_sample, args.quiet, args.kdf_n, args.kdf_workers, args.compression,
+         args.tls, args.cert, args.key, args.threads, args.reuseport, args.idle_timeout, args.read_timeout,
+         args.write_timeout, args.max_requests, args.drain_timeout, args.image_root, args.ip_rate, args.user_rate,
+         args.login_rate, args.max_downloads, args.rate_limit, args.metrics)
@@ -0,0 +1,107 @@
+import heapq
+import secrets
+import threading
+import time
+from multiprocessing.managers import BaseManager
+
+SESSION_MAX_AGE = 3600 # 로그인 session 유효시간(초)
+KEY_MAX_AGE = 3600 # 권한 key 유효시간(초)
+TOKEN_BYTES = 32
+
+
+class SessionTable:
+    '''
+    발급한 token을 메모리에 보관하는 만료 table.
+
+    token -> (username, kind, expiry_time) dict이므로 검증은 dict lookup 한 번(O(1))이며 파일을 읽지 않음.
+    kind는 token의 용도 ("session" : 로그인, "key" : 이미지 권한).
+    만료 시각은 (expiry_time, token) heap에도 넣어 두고, 발급할 때마다 heap의 앞에서 만료된 token만 꺼내 지움.
+    따라서 만료 정리는 지울 token 수에 비례하고 table 전체를 훑지 않음.
+
+    검증(lookup)은 lock 없이 dict를 읽고, 발급/삭제만 lock을 잡음.
+    '''
+    def __init__(self):
+        self._tokens = {}
+        self._expiries = [] # (expiry_time, token) heap
+        self._lock = threading.Lock()
+
+    def issue(self, username : str, kind : str, max_age : float) -> str:
+        '''
+        username의 새 token을 발급
+
+        kind : "session" or "key"
+        max_age : 유효시간(초)
+
+        return : token (URL-safe 문자열)'''
+        token = secrets.token_urlsafe(TOKEN_BYTES)
+        now = time.time()
+        expiry = now + max_age
+        with self._lock:
+            self._purge(now)
+            self._tokens[token] = (username, kind, expiry)
+            heapq.heappush(self._expiries, (expiry, token))
+        return token
+
+    def lookup(self, token : str, kind : str) -> str:
+        '''
+        token이 kind 용도로 발급되었고 만료되지 않았으면 username을 반환. 아니면 None'''
+        entry = self._tokens.get(token)
+        if entry is None or entry[1] != kind or entry[2] <= time.time():
+            return None
+        return entry[0]
+
+    def revoke(self, token : str) -> None:
+        '''
+        token을 무효화. heap에 남은 항목은 만료 시각에 정리됨'''
+        with self._lock:
+            self._tokens.pop(token, None)
+
+    def _purge(self, now : float) -> None:
+        '''
+        만료된 token을 heap 앞에서부터 지움. 호출 전에 lock을 잡고 있어야 함'''
+        expiries = self._expiries
+        while expiries and expiries[0][0] <= now:
+            (_, token) = heapq.heappop(expiries)
+            entry = self._tokens.get(token)
+            if entry is not None and entry[2] <= now:
+                del self._tokens[token]
+
+    def __len__(self) -> int:
+        return len(self._tokens)
+
+    def worker_opener(self) -> tuple:
+        '''
+        process mode의 worker process에서 같은 table을 사용하는 방법.
+        table은 parent process의 메모리에 있으므로 manager proxy로 접근하게 함
+
+        return : (factory, args). worker에서 factory(*args)로 table을 엶'''
+        return (connect_sessions, share_sessions(self))
+
+    def close(self) -> None:
+        pass
+
+
+class _SessionManager(BaseManager):
+    pass
+
+
+def share_sessions(sessions : SessionTable) -> tuple:
+    '''
+    worker process들이 같은 SessionTable을 사용하도록 manager로 공유함 (user_store.share_store 참고)
+
+    return : (address, authkey). worker에서 connect_sessions에 전달'''
+    authkey = secrets.token_bytes(16)
+    _SessionManager.register("SessionTable", callable=lambda: sessions, exposed=("issue", "lookup", "revoke", "__len__"))
+    manager = _SessionManager(address=("127.0.0.1", 0), authkey=authkey)
+    server = manager.get_server()
+    threading.Thread(target=server.serve_forever, name="session-manager", daemon=True).start()
+    return (server.address, authkey)
+
+
+def connect_sessions(address : tuple, authkey : bytes):
+    '''
+    share_sessions로 공유된 SessionTable의 proxy를 반환'''
+    _SessionManager.register("SessionTable")
+    manager = _SessionManager(address=address, authkey=authkey)
+    manager.connect()
+    return manager.SessionTable()
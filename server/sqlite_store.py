@@ -0,0 +1,143 @@
+import json
+import sqlite3
+import sys
+import threading
+
+from user_store import UserStore
+
+SQLITE_BUSY_TIMEOUT = 5000 # ms. 다른 process가 쓰는 중일 때 대기 시간
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY,
+        username TEXT NOT NULL,
+        pw TEXT NOT NULL,
+        key_value TEXT NOT NULL,
+        key_expiry REAL NOT NULL
+    )""",
+    "CREATE UNIQUE INDEX IF NOT EXISTS users_username ON users (username)",
+)
+
+# sqlite3 module은 connection마다 같은 SQL 문자열의 compile 결과를 cache하므로
+# 아래 문장들은 처음 한 번만 prepare되고 이후에는 재사용됨
+_SELECT_USER = "SELECT pw, key_value, key_expiry FROM users WHERE username = ?"
+_INSERT_USER = "INSERT INTO users (username, pw, key_value, key_expiry) VALUES (?, ?, ?, ?) ON CONFLICT (username) DO NOTHING"
+_UPSERT_USER = ("INSERT INTO users (username, pw, key_value, key_expiry) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (username) DO UPDATE SET pw = excluded.pw, key_value = excluded.key_value, key_expiry = excluded.key_expiry")
+_UPDATE_PW = "UPDATE users SET pw = ? WHERE username = ?"
+_UPDATE_KEY = "UPDATE users SET key_value = ?, key_expiry = ? WHERE username = ?"
+_COUNT_USERS = "SELECT COUNT(*) FROM users"
+
+
+def _to_row(id : str, record : dict) -> tuple:
+    return (id, record["pw"], record["key"]["value"], record["key"]["expiry_time"])
+
+
+class SqliteUserStore(UserStore):
+    '''
+    SQLite user database.
+
+    WAL mode를 사용하므로 읽기는 쓰기와 동시에 진행되고, 읽기끼리도 서로 기다리지 않음.
+    connection은 thread마다 하나씩 열어 Python lock 없이 사용함.
+    username에 unique index가 있어 조회/중복 검사가 O(log N)이며, 변경은 해당 row만 씀.
+    여러 process가 같은 파일을 열어도 SQLite가 동시성을 처리함.
+    '''
+    def __init__(self, path : str):
+        '''
+        path : database 파일 경로 (users.db)'''
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        for statement in _SCHEMA:
+            conn.execute(statement)
+
+    def _connection(self) -> sqlite3.Connection:
+        '''
+        현재 thread의 connection. 없으면 새로 엶'''
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT / 1000, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL") # WAL에서는 commit마다 fsync하지 않아도 손상되지 않음
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def get(self, id : str) -> dict:
+        row = self._connection().execute(_SELECT_USER, (id,)).fetchone()
+        if row is None:
+            return None
+        return {"pw" : row[0], "key" : {"value" : row[1], "expiry_time" : row[2]}}
+
+    def create(self, id : str, record : dict) -> bool:
+        return self._connection().execute(_INSERT_USER, _to_row(id, record)).rowcount == 1
+
+    def update(self, id : str, fields : dict) -> bool:
+        conn = self._connection()
+        updated = True
+        if "pw" in fields:
+            updated = conn.execute(_UPDATE_PW, (fields["pw"], id)).rowcount == 1 and updated
+        if "key" in fields:
+            key = fields["key"]
+            updated = conn.execute(_UPDATE_KEY, (key["value"], key["expiry_time"], id)).rowcount == 1 and updated
+        return updated
+
+    def __len__(self) -> int:
+        return self._connection().execute(_COUNT_USERS).fetchone()[0]
+
+    def worker_opener(self) -> tuple:
+        '''
+        worker process는 같은 파일을 직접 엶'''
+        return (SqliteUserStore, (self.path,))
+
+    def close(self) -> None:
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+
+
+def migrate_json(json_path : str, db_path : str) -> int:
+    '''
+    users.json의 사용자들을 SQLite database로 옮김. 이미 있는 사용자는 users.json 내용으로 덮어씀.
+    한 transaction으로 처리하므로 중간에 실패하면 아무것도 바뀌지 않음.
+
+    json_path : users.json 경로
+    db_path : users.db 경로
+
+    return : 옮긴 사용자 수'''
+    with open(json_path, "r") as file:
+        users = json.load(file)
+
+    store = SqliteUserStore(db_path)
+    try:
+        conn = store._connection()
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(_UPSERT_USER, (_to_row(id, record) for id, record in users.items()))
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+    finally:
+        store.close()
+    return len(users)
+
+
+if __name__ == "__main__":
+    '''
+    users.json -> users.db 일회성 migration
+    argv[1] : users.json
+    argv[2] : users.db'''
+    if len(sys.argv) != 3:
+        print(f"Usage: {sys.argv[0]} <users.json> <users.db>")
+        sys.exit(1)
+
+    count = migrate_json(sys.argv[1], sys.argv[2])
+    print(f"{count} users migrated to {sys.argv[2]}")
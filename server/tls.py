@@ -0,0 +1,68 @@
+import argparse
+import ipaddress
+import os
+import ssl
+import subprocess
+
+CERT_FILE = "cert.pem" # TLS 인증서 (PEM)
+KEY_FILE = "key.pem" # TLS 개인 키 (PEM)
+ALPN_PROTOCOLS = ["http/1.1"] # 서버가 지원하는 application protocol
+HANDSHAKE_TIMEOUT = 10 # handshake를 끝내지 않는 client를 기다리는 시간(초)
+SESSION_TICKETS = 2 # TLS 1.3 handshake 후 client에 보내는 session ticket 수
+CERT_DAYS = 365 # generate_self_signed로 만드는 인증서 유효 기간(일)
+
+
+def server_context(certfile : str=CERT_FILE, keyfile : str=KEY_FILE) -> ssl.SSLContext:
+    '''
+    TLS 서버용 SSLContext
+
+    TLS 1.2 이상만 허용하고 ALPN으로 http/1.1을 알림.
+    session 재개(resumption)를 위해 TLS 1.3은 session ticket을, TLS 1.2는 session id cache와 ticket을 사용함.
+    ticket을 암호화하는 key는 context마다 만들어지므로 process mode에서는 parent에서 만든 context를
+    worker process가 fork로 물려받아 모든 worker가 같은 ticket을 받아들이게 함.
+
+    certfile, keyfile : PEM 인증서와 개인 키 경로
+    raise : OSError, ssl.SSLError 인증서를 읽을 수 없음'''
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    context.load_cert_chain(certfile, keyfile)
+    context.set_alpn_protocols(ALPN_PROTOCOLS)
+    context.num_tickets = SESSION_TICKETS
+    context.options |= ssl.OP_NO_COMPRESSION # CRIME
+    return context
+
+
+def generate_self_signed(certfile : str=CERT_FILE, keyfile : str=KEY_FILE, hostname : str="localhost",
+                         days : int=CERT_DAYS) -> None:
+    '''
+    로컬 테스트용 self-signed 인증서와 개인 키(EC P-256)를 openssl 명령으로 생성.
+    client는 이 인증서를 cafile로 지정하여 서버를 검증함
+
+    hostname : 인증서의 CN과 subjectAltName. domain 또는 IP (127.0.0.1은 항상 포함)
+    raise : OSError openssl 명령이 없음, subprocess.CalledProcessError 생성 실패'''
+    try:
+        names = {f"IP:{ipaddress.ip_address(hostname)}", "IP:127.0.0.1"}
+    except ValueError: # domain
+        names = {f"DNS:{hostname}", "IP:127.0.0.1"}
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "ec", "-pkeyopt", "ec_paramgen_curve:prime256v1",
+                    "-nodes", "-keyout", keyfile, "-out", certfile, "-days", str(days), "-subj", f"/CN={hostname}",
+                    "-addext", f"subjectAltName={','.join(sorted(names))}"],
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.chmod(keyfile, 0o600)
+
+
+if __name__ == "__main__":
+    '''
+    self-signed 인증서 생성
+    --cert : 인증서 경로 (기본값 cert.pem)
+    --key : 개인 키 경로 (기본값 key.pem)
+    --hostname : 인증서 이름 (기본값 localhost)'''
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cert", default=CERT_FILE)
+    parser.add_argument("--key", default=KEY_FILE)
+    parser.add_argument("--hostname", default="localhost")
+    parser.add_argument("--days", type=int, default=CERT_DAYS)
+    args = parser.parse_args()
+
+    generate_self_signed(args.cert, args.key, args.hostname, args.days)
+    print(f"created {args.cert}, {args.key} (CN={args.hostname})")
@@ -0,0 +1,274 @@
+import json
+import os
+import threading
+import time
+import secrets
+from multiprocessing.managers import BaseManager
+
+LOCK_STRIPES = 64 # 사용자별 lock 개수 (id hash로 나눔)
+FLUSH_INTERVAL = 0.5 # journal flush 주기(초)
+FLUSH_BATCH = 256 # pending 변경이 이만큼 쌓이면 주기를 기다리지 않고 flush
+COMPACT_THRESHOLD = 10000 # journal에 쌓인 변경이 이만큼 넘으면 snapshot을 새로 쓰고 journal을 비움
+
+
+def _write_atomic(path : str, data : str) -> None:
+    '''
+    임시 파일에 쓰고 fsync한 뒤 os.replace로 교체. 중간에 죽어도 이전 파일 또는 새 파일 중 하나만 남음'''
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+    dir_fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+class UserStore:
+    '''
+    user database interface. Server의 handler들은 이 interface로만 사용자 정보에 접근함.
+
+    record 형식 : {"pw" : password, "key" : {"value" : key, "expiry_time" : time}}
+    반환된 record는 수정하지 않아야 함. 변경은 create/update를 사용.
+    '''
+    lock_wait_observer = None # lock 대기 시간(초)을 받는 callable (Metrics.observe_lock_wait)
+
+    def get(self, id : str) -> dict:
+        '''
+        id의 record를 반환. 없으면 None'''
+        raise NotImplementedError
+
+    def create(self, id : str, record : dict) -> bool:
+        '''
+        id가 없을 때만 record를 추가
+
+        return : 추가했으면 True, 이미 존재하면 False'''
+        raise NotImplementedError
+
+    def update(self, id : str, fields : dict) -> bool:
+        '''
+        id의 record에 fields를 덮어씀 (top-level key 단위)
+
+        return : 변경했으면 True, id가 없으면 False'''
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def worker_opener(self) -> tuple:
+        '''
+        process mode의 worker process에서 같은 database를 여는 방법
+
+        return : (factory, args). worker에서 factory(*args)로 store를 엶'''
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class JsonUserStore(UserStore):
+    '''
+    메모리에 사용자 정보를 유지하는 user database.
+
+    조회는 dict lookup(O(1))이며 파일을 읽지 않음.
+    변경은 메모리에 바로 반영하고, background thread가 모아서 journal 파일(<path>.journal)에 append함 (write-behind).
+    journal이 COMPACT_THRESHOLD를 넘으면 전체 snapshot(<path>, 기존 users.json 형식)을 원자적으로 새로 쓰고 journal을 비움.
+
+    시작 시 snapshot을 읽고 journal을 순서대로 replay하여 복구함.
+    마지막 줄이 잘린 journal(쓰는 도중 종료)은 잘린 줄만 무시함.
+    '''
+    def __init__(self, path : str, flush_interval : float=FLUSH_INTERVAL, compact_threshold : int=COMPACT_THRESHOLD,
+                 fsync : bool=True):
+        '''
+        path : snapshot 파일 경로 (users.json)
+        flush_interval : journal flush 주기(초)
+        compact_threshold : snapshot을 새로 쓰는 journal 변경 수
+        fsync : journal flush마다 fsync 여부'''
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.flush_interval = flush_interval
+        self.compact_threshold = compact_threshold
+        self.fsync = fsync
+
+        self._users = {}
+        self._locks = [threading.Lock() for _ in range(LOCK_STRIPES)] # 사용자별 lock
+        self._pending_lock = threading.Lock() # 메모리 변경과 pending 추가를 함께 묶는 짧은 lock
+        self._flush_lock = threading.Lock() # journal 파일 쓰기는 한 번에 하나만
+        self._pending = []
+        self._journal_entries = 0
+        self._wakeup = threading.Event()
+        self._closed = False
+
+        self._load()
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        self._writer = threading.Thread(target=self._writer_loop, name="user-store-writer", daemon=True)
+        self._writer.start()
+
+    def _lock_for(self, id : str) -> threading.Lock:
+        return self._locks[hash(id) % LOCK_STRIPES]
+
+    def get(self, id : str) -> dict:
+        return self._users.get(id)
+
+    def create(self, id : str, record : dict) -> bool:
+        lock = self._acquire(id)
+        try:
+            if id in self._users:
+                return False
+            self._put(id, record)
+            return True
+        finally:
+            lock.release()
+
+    def update(self, id : str, fields : dict) -> bool:
+        lock = self._acquire(id)
+        try:
+            record = self._users.get(id)
+            if record is None:
+                return False
+            self._put(id, {**record, **fields})
+            return True
+        finally:
+            lock.release()
+
+    def _acquire(self, id : str) -> threading.Lock:
+        '''
+        id의 lock을 잡고 반환. lock_wait_observer가 있으면 대기 시간을 기록'''
+        lock = self._lock_for(id)
+        if self.lock_wait_observer is None:
+            lock.acquire()
+        elif lock.acquire(blocking=False): # 대기 없음
+            self.lock_wait_observer(0.0)
+        else:
+            start = time.perf_counter()
+            lock.acquire()
+            self.lock_wait_observer(time.perf_counter() - start)
+        return lock
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def worker_opener(self) -> tuple:
+        '''
+        메모리 database는 process 간에 공유되지 않으므로 manager proxy로 접근하게 함'''
+        return (connect_store, share_store(self))
+
+    def _put(self, id : str, record : dict) -> None:
+        '''
+        메모리에 반영하고 journal 대기열에 추가. 호출 전에 id의 lock을 잡고 있어야 함'''
+        with self._pending_lock:
+            self._users[id] = record
+            self._pending.append({"id" : id, "user" : record})
+            if len(self._pending) >= FLUSH_BATCH:
+                self._wakeup.set()
+
+    def _load(self) -> None:
+        '''
+        snapshot과 journal(.old, 현재)을 읽어 메모리에 복구. 남아있던 journal은 snapshot에 합침'''
+        if os.path.exists(self.path):
+            with open(self.path, "r") as file:
+                self._users = json.load(file)
+
+        replayed = False
+        for journal_path in (self.journal_path + ".old", self.journal_path):
+            if not os.path.exists(journal_path):
+                continue
+            with open(journal_path, "r", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError: # 쓰는 도중 종료되어 잘린 줄
+                        continue
+                    self._users[entry["id"]] = entry["user"]
+                    replayed = True
+
+        if replayed:
+            _write_atomic(self.path, json.dumps(self._users, indent=4))
+        for journal_path in (self.journal_path + ".old", self.journal_path):
+            if os.path.exists(journal_path):
+                os.remove(journal_path)
+
+    def _writer_loop(self) -> None:
+        '''
+        flush_interval마다(또는 FLUSH_BATCH개가 쌓이면) pending 변경을 journal에 기록'''
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        '''
+        pending 변경을 journal에 쓰고, journal이 compact_threshold를 넘으면 compaction'''
+        with self._flush_lock:
+            with self._pending_lock:
+                batch, self._pending = self._pending, []
+                compact = self._journal_entries + len(batch) >= self.compact_threshold
+                snapshot = dict(self._users) if compact else None
+
+            if batch:
+                self._journal.write("".join(json.dumps(entry) + "\n" for entry in batch))
+                self._journal.flush()
+                if self.fsync:
+                    os.fsync(self._journal.fileno())
+                self._journal_entries += len(batch)
+
+            if compact:
+                self._compact(snapshot)
+
+    def _compact(self, snapshot : dict) -> None:
+        '''
+        현재 journal을 .old로 옮기고 새 journal을 연 뒤 snapshot을 원자적으로 씀.
+        snapshot 쓰기가 끝나면 .old를 삭제. 도중에 종료되어도 시작 시 .old와 journal을 replay하여 복구함'''
+        self._journal.close()
+        os.replace(self.journal_path, self.journal_path + ".old")
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        self._journal_entries = 0
+
+        _write_atomic(self.path, json.dumps(snapshot, indent=4))
+        os.remove(self.journal_path + ".old")
+
+    def close(self) -> None:
+        '''
+        writer thread를 멈추고 남은 변경을 snapshot으로 저장'''
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        self._writer.join()
+        with self._flush_lock:
+            with self._pending_lock:
+                self._pending = []
+                snapshot = dict(self._users)
+            self._compact(snapshot)
+            self._journal.close()
+            os.remove(self.journal_path)
+
+
+class _StoreManager(BaseManager):
+    pass
+
+
+def share_store(store) -> tuple:
+    '''
+    process mode에서 worker process들이 같은 store를 사용하도록
+    현재 process에서 store를 multiprocessing manager로 공유함.
+
+    return : (address, authkey). worker에서 connect_store에 전달'''
+    authkey = secrets.token_bytes(16)
+    _StoreManager.register("UserStore", callable=lambda: store, exposed=("get", "create", "update", "__len__"))
+    manager = _StoreManager(address=("127.0.0.1", 0), authkey=authkey)
+    server = manager.get_server()
+    threading.Thread(target=server.serve_forever, name="user-store-manager", daemon=True).start()
+    return (server.address, authkey)
+
+
+def connect_store(address : tuple, authkey : bytes):
+    '''
+    share_store로 공유된 store의 proxy를 반환'''
+    _StoreManager.register("UserStore")
+    manager = _StoreManager(address=address, authkey=authkey)
+    manager.connect()
+    return manager.UserStore()
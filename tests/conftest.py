@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+from catalog import ImageCatalog
+from derivatives import DerivativeCache
+from http_parser import RequestParser
+from log_writer import LogWriter, ERROR
+from password import PasswordHasher
+from rate_limit import AdmissionControl
+from server import Server
+from user_store import JsonUserStore
+
+
+@pytest.fixture
+def server(tmp_path):
+    '''
+    port에 바인딩하지 않는 Server. 이미지는 tmp_path/images, 변환 cache는 tmp_path/derivatives'''
+    images = tmp_path / "images"
+    images.mkdir()
+    with Server(users=JsonUserStore(str(tmp_path / "users.json")),
+                logger=LogWriter(str(tmp_path / "log.txt"), level=ERROR, echo=False),
+                hasher=PasswordHasher(n=1024), derivatives=DerivativeCache(str(tmp_path / "derivatives"), workers=0),
+                catalog=ImageCatalog(str(images)), admission=AdmissionControl()) as server:
+        yield server
+
+
+def send(server : Server, raw : str, client : str="127.0.0.1") -> tuple:
+    '''
+    raw request 하나를 Server.request_handler로 처리
+
+    return : (status, header dict, body bytes)'''
+    (request,) = RequestParser().feed(raw.encode())
+    request.client = client
+    (response, body) = server.request_handler(request)
+    (head, _, rest) = response.partition(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    headers = dict(line.split(": ", 1) for line in lines[1:])
+    return (lines[0][9:], headers, rest + bytes(body or b""))
@@ -0,0 +1,32 @@
+import os
+import struct
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+from catalog import ImageCatalog
+
+
+def _webp_lossless(width : int, height : int) -> bytes:
+    bits = (width - 1) | (height - 1) << 14
+    return b"RIFF" + struct.pack("<I", 30) + b"WEBPVP8L" + struct.pack("<I", 5) + b"\x2f" + struct.pack("<I", bits)
+
+
+def test_webp_size(tmp_path):
+    (tmp_path / "a.webp").write_bytes(_webp_lossless(640, 480))
+    catalog = ImageCatalog(str(tmp_path))
+    catalog.refresh()
+    (entry, file) = catalog.open("a.webp")
+    file.close()
+    assert (entry.width, entry.height) == (640, 480)
+
+
+def test_truncated_webp(tmp_path):
+    (tmp_path / "a.webp").write_bytes(_webp_lossless(640, 480)[:20]) # VP8L signature 앞에서 잘림
+    (tmp_path / "b.webp").write_bytes(_webp_lossless(640, 480)[:23])
+    (tmp_path / "c.webp").write_bytes(_webp_lossless(640, 480))
+    catalog = ImageCatalog(str(tmp_path))
+    catalog.refresh()
+    assert len(catalog) == 3
+    (entry, file) = catalog.open("a.webp")
+    file.close()
+    assert (entry.width, entry.height) == (None, None)
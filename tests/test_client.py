@@ -0,0 +1,79 @@
+import gzip
+import hashlib
+import os
+import socket
+import sys
+import threading
+import zlib
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "client"))
+from response_reader import read_response, DecodingSink
+
+IMAGE = os.urandom(200 * 1024) + b"\0" * (800 * 1024) # 압축되는 부분이 있는 1MB body
+
+
+class _Connection(socket.socket):
+    '''
+    다음 response의 앞부분(buffered)을 붙일 수 있는 socket (ConnectionPool의 연결처럼)'''
+
+
+def _respond(response : bytes, chunk : int=7000) -> socket.socket:
+    '''
+    response를 조각내어 보내는 연결의 받는 쪽'''
+    (server, client) = socket.socketpair()
+    client = _Connection(fileno=client.detach())
+
+    def send():
+        for i in range(0, len(response), chunk):
+            server.sendall(response[i:i + chunk])
+        server.close()
+    threading.Thread(target=send, daemon=True).start()
+    return client
+
+
+def _gzip_response(body : bytes) -> bytes:
+    return (b"HTTP/1.1 200 OK\r\nContent-Type: image/png\r\nContent-Encoding: gzip\r\n"
+            + f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+
+
+class _RecordingFile:
+    def __init__(self):
+        self.hash = hashlib.sha256()
+        self.largest = 0
+
+    def write(self, data) -> None:
+        self.largest = max(self.largest, len(data))
+        self.hash.update(data)
+
+
+def test_gzip_body_is_decoded_while_streaming():
+    file = _RecordingFile()
+    sink = DecodingSink(file)
+    response = read_response(_respond(_gzip_response(gzip.compress(IMAGE))), sink=sink)
+    sink.finish()
+    assert (response.status_code, response.body) == (200, None)
+    assert file.hash.digest() == hashlib.sha256(IMAGE).digest()
+    assert file.largest <= 64 * 1024 # RECV_BUFFER_SIZE씩 풀어서 씀 (body 전체를 메모리에 만들지 않음)
+
+
+def test_identity_and_deflate(tmp_path):
+    for (coding, body) in ((b"", IMAGE), (b"Content-Encoding: deflate\r\n", zlib.compress(IMAGE))):
+        with open(tmp_path / "out", "wb") as file:
+            sink = DecodingSink(file)
+            read_response(_respond(b"HTTP/1.1 200 OK\r\n" + coding + f"Content-Length: {len(body)}\r\n\r\n".encode()
+                                   + body), sink=sink)
+            sink.finish()
+        assert (tmp_path / "out").read_bytes() == IMAGE
+
+
+@pytest.mark.parametrize("body", [gzip.compress(IMAGE)[:-100], b"not gzip data"])
+def test_invalid_gzip_body(tmp_path, body):
+    conn = _respond(_gzip_response(body) + b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n")
+    with open(tmp_path / "out", "wb") as file:
+        sink = DecodingSink(file)
+        read_response(conn, sink=sink)
+        with pytest.raises(ValueError):
+            sink.finish()
+    assert read_response(conn).status_code == 404 # 잘못된 body도 끝까지 읽어 다음 response를 읽을 수 있음
@@ -0,0 +1,100 @@
+import json
+import os
+import sys
+from unittest import mock
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+from conftest import send
+
+SIZE = 1000
+IMAGE = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 3 + bytes(SIZE - 8 - 768)
+
+
+@pytest.mark.parametrize(("header", "expected"), [
+    (None, None),
+    ("bytes=0-99", (0, 100)),
+    ("bytes=900-", (900, 100)), # open-ended
+    ("bytes=990-2000", (990, 10)), # 파일 끝에서 자름
+    ("bytes=-100", (900, 100)), # suffix
+    ("bytes=-5000", (0, SIZE)),
+    ("bytes=0-0,5-9", None), # 여러 구간 : 전체 전송
+    ("items=0-9", None),
+    ("bytes=9-0", None),
+    ("bytes=abc", None),
+])
+def test_byte_range(server, header, expected):
+    assert server._byte_range(header, SIZE) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=5000-6000", "bytes=-0"])
+def test_unsatisfiable_range(server, header):
+    with pytest.raises(ValueError):
+        server._byte_range(header, SIZE)
+
+
+@pytest.mark.parametrize(("if_none_match", "if_modified_since", "expected"), [
+    ('"abc"', None, True),
+    ('"x", "abc"', None, True),
+    ('W/"abc"', None, True), # weak ETag (압축한 응답)
+    ("*", None, True),
+    ('"other"', None, False),
+    ('"other"', "Thu, 01 Jan 2099 00:00:00 GMT", False), # If-None-Match가 있으면 날짜는 보지 않음
+    (None, "Thu, 01 Jan 2099 00:00:00 GMT", True),
+    (None, "Thu, 01 Jan 1970 00:00:00 GMT", False),
+    (None, "not a date", False),
+    (None, None, False),
+])
+def test_is_not_modified(server, if_none_match, if_modified_since, expected):
+    assert server._is_not_modified('"abc"', 1000, if_none_match, if_modified_since) == expected
+
+
+@pytest.fixture
+def image_server(server):
+    with open(os.path.join(server.catalog.root, "a.png"), "wb") as file:
+        file.write(IMAGE)
+    with mock.patch.object(server, "_authorize_images", lambda request, download: "alice"):
+        yield server
+
+
+def _get(server, headers : str="") -> tuple:
+    body = json.dumps({"url" : "a.png"})
+    return send(server, f"GET /images HTTP/1.1\r\nContent-Type: application/json\r\n{headers}"
+                        f"Content-Length: {len(body)}\r\n\r\n{body}")
+
+
+def test_full_response(image_server):
+    (status, headers, body) = _get(image_server)
+    assert (status, body, headers["Accept-Ranges"]) == ("200 OK", IMAGE, "bytes")
+
+
+def test_partial_response(image_server):
+    (status, headers, body) = _get(image_server, "Range: bytes=-100\r\n")
+    assert (status, headers["Content-Range"], body) == ("206 Partial Content", f"bytes 900-999/{SIZE}", IMAGE[900:])
+    (status, headers, body) = _get(image_server, "Range: bytes=10-\r\n")
+    assert (status, headers["Content-Length"], body) == ("206 Partial Content", str(SIZE - 10), IMAGE[10:])
+
+
+def test_multi_range_falls_back_to_full(image_server):
+    (status, _, body) = _get(image_server, "Range: bytes=0-9,20-29\r\n")
+    assert (status, body) == ("200 OK", IMAGE)
+
+
+def test_unsatisfiable_response(image_server):
+    (status, headers, _) = _get(image_server, f"Range: bytes={SIZE}-\r\n")
+    assert (status, headers["Content-Range"]) == ("416 Range Not Satisfiable", f"bytes */{SIZE}")
+
+
+def test_not_modified(image_server):
+    etag = _get(image_server)[1]["ETag"]
+    for value in (etag, f"W/{etag}", "*"):
+        (status, headers, body) = _get(image_server, f"If-None-Match: {value}\r\n")
+        assert (status, headers["ETag"], body) == ("304 Not Modified", etag, b"")
+    assert _get(image_server, 'If-None-Match: "other"\r\n')[0] == "200 OK"
+
+
+def test_if_range(image_server):
+    etag = _get(image_server)[1]["ETag"]
+    assert _get(image_server, f"Range: bytes=0-9\r\nIf-Range: {etag}\r\n")[0] == "206 Partial Content"
+    assert _get(image_server, 'Range: bytes=0-9\r\nIf-Range: "stale"\r\n')[0] == "200 OK" # 바뀐 파일 : 전체 전송
@@ -0,0 +1,28 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+from derivatives import DerivativeCache, RENDER_TIMEOUT
+
+
+def test_load_keeps_inflight_tmp(tmp_path):
+    (tmp_path / "a.jpg").write_bytes(b"x" * 10)
+    (tmp_path / "b.jpg.1.2.tmp").write_bytes(b"x") # 다른 worker가 변환 중
+    stale = tmp_path / "c.jpg.1.2.tmp" # 변환 도중 종료되어 남음
+    stale.write_bytes(b"x")
+    old = time.time() - RENDER_TIMEOUT - 1
+    os.utime(stale, (old, old))
+
+    cache = DerivativeCache(str(tmp_path), workers=0)
+    assert sorted(os.listdir(tmp_path)) == ["a.jpg", "b.jpg.1.2.tmp"]
+    assert cache.total_bytes == 10
+
+
+def test_evict_per_process(tmp_path):
+    for (i, name) in enumerate(["a.jpg", "b.jpg", "c.jpg"]):
+        (tmp_path / name).write_bytes(b"x" * 10)
+        os.utime(tmp_path / name, (i, i))
+    cache = DerivativeCache(str(tmp_path), max_bytes=20, workers=0)
+    assert sorted(os.listdir(tmp_path)) == ["b.jpg", "c.jpg"]
+    assert cache.total_bytes == 20
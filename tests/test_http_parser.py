@@ -0,0 +1,82 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+from http_parser import RequestParser, HttpParseError
+
+
+def test_content_length():
+    (request,) = RequestParser().feed(b"POST /login HTTP/1.1\r\nContent-Length: 4\r\n\r\nabcd")
+    assert request.body == b"abcd"
+
+
+@pytest.mark.parametrize("length", ["²", "1¹", "-1", "1a"])
+def test_invalid_content_length(length):
+    with pytest.raises(HttpParseError) as error:
+        RequestParser().feed(f"POST /login HTTP/1.1\r\nContent-Length: {length}\r\n\r\n".encode("latin-1")) # header는 latin-1로 decode함
+    assert error.value.status == "400 Bad Request"
+
+
+def test_repeated_equal_content_length():
+    (request,) = RequestParser().feed(b"POST /login HTTP/1.1\r\nContent-Length: 2\r\nContent-Length: 2\r\n\r\nab")
+    assert request.body == b"ab"
+
+
+@pytest.mark.parametrize("head", ["Content-Length: 2\r\nContent-Length: 3",
+                                  "Transfer-Encoding: chunked\r\nContent-Length: 2",
+                                  "Content-Length: 2\r\nTransfer-Encoding: gzip"])
+def test_ambiguous_body_length(head):
+    with pytest.raises(HttpParseError) as error:
+        RequestParser().feed(f"POST /login HTTP/1.1\r\n{head}\r\n\r\nabc".encode())
+    assert error.value.status == "400 Bad Request"
+
+
+def test_pipelined_requests_split_across_feeds():
+    data = (b"GET /a HTTP/1.1\r\nHost: x\r\n\r\n"
+            b"POST /b HTTP/1.1\r\nContent-Length: 3\r\n\r\nxyz"
+            b"GET /c HTTP/1.1\r\n\r\n")
+    parser = RequestParser()
+    requests = []
+    for i in range(0, len(data), 7):
+        requests += parser.feed(data[i:i + 7])
+    assert [(r.method, r.path, r.body) for r in requests] == [("GET", "/a", b""), ("POST", "/b", b"xyz"),
+                                                              ("GET", "/c", b"")]
+    assert requests[0].headers == {"host": "x"}
+    assert not parser.in_progress()
+
+
+def test_pipelined_requests_in_one_feed():
+    requests = RequestParser().feed(b"GET /a HTTP/1.1\r\n\r\nGET /b HTTP/1.1\r\n\r\nGET /c HTTP/1.1\r\n")
+    assert [r.path for r in requests] == ["/a", "/b"]
+
+
+def test_body_in_pieces():
+    parser = RequestParser()
+    assert parser.feed(b"POST /login HTTP/1.1\r\nContent-Length: 10\r\n\r\n0123") == []
+    assert parser.in_progress()
+    assert parser.feed(b"456") == []
+    (request,) = parser.feed(b"789GET")
+    assert request.body == b"0123456789"
+    assert parser.in_progress() # 다음 request의 일부
+
+
+def test_body_too_large():
+    with pytest.raises(HttpParseError) as error:
+        RequestParser(max_body_size=8).feed(b"POST /login HTTP/1.1\r\nContent-Length: 9\r\n\r\n")
+    assert error.value.status == "413 Content Too Large"
+
+
+def test_header_too_large():
+    with pytest.raises(HttpParseError) as error:
+        RequestParser(max_header_size=64).feed(b"GET / HTTP/1.1\r\nX-Long: " + b"a" * 100)
+    assert error.value.status == "431 Request Header Fields Too Large"
+
+
+@pytest.mark.parametrize("head", [b"GET /\r\n\r\n", b"GET / HTTP/1.1 extra\r\n\r\n", b"GET / FTP/1.1\r\n\r\n",
+                                  b"GET / HTTP/1.1\r\nNo colon\r\n\r\n"])
+def test_malformed_head(head):
+    with pytest.raises(HttpParseError) as error:
+        RequestParser().feed(head)
+    assert error.value.status == "400 Bad Request"
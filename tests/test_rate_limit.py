@@ -0,0 +1,66 @@
+import os
+import sys
+from unittest import mock
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+import rate_limit
+from rate_limit import TokenBuckets
+from conftest import send
+
+
+@pytest.fixture
+def clock():
+    now = [1000.0]
+    with mock.patch.object(rate_limit.time, "monotonic", lambda: now[0]):
+        yield now
+
+
+def test_burst_and_refill(clock):
+    buckets = TokenBuckets(rate=1, burst=3)
+    assert [buckets.acquire("a") for _ in range(3)] == [0, 0, 0]
+    assert buckets.acquire("a") == pytest.approx(1)
+    clock[0] += 1
+    assert buckets.acquire("a") == 0
+
+
+def test_refilled_buckets_are_removed(clock):
+    buckets = TokenBuckets(rate=1, burst=3)
+    buckets.acquire("a")
+    clock[0] += 2
+    buckets.acquire("b")
+    assert len(buckets) == 1
+
+
+def test_rotating_keys_do_not_reset_throttled_key(clock):
+    buckets = TokenBuckets(rate=1, burst=2, max_keys=3)
+    buckets.acquire("a")
+    buckets.acquire("a")
+    assert buckets.acquire("a") > 0
+    for key in ("b", "c", "d", "e"): # table이 차도 아직 차지 않은 "a"는 지우지 않음
+        buckets.acquire(key)
+    assert buckets.acquire("a") > 0
+    assert len(buckets) == 3
+
+
+def test_new_keys_share_overflow_bucket(clock):
+    buckets = TokenBuckets(rate=1, burst=2, max_keys=1)
+    assert buckets.acquire("a") == 0
+    assert buckets.acquire("b") == 0
+    assert buckets.acquire("c") == 0
+    assert buckets.acquire("d") > 0 # "b", "c", "d"는 공유 bucket 하나를 씀
+    assert buckets.acquire("a") == 0
+
+
+def _login(server, username : str, password : str, client : str) -> str:
+    body = f'{{"username": "{username}", "password": "{password}"}}'
+    raw = f"POST /login HTTP/1.1\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n{body}"
+    return send(server, raw, client)[0]
+
+
+def test_failed_logins_do_not_lock_out_other_clients(server):
+    server.register_handler("alice", "password1")
+    statuses = [_login(server, "alice", "wrong", "10.0.0.1") for _ in range(6)]
+    assert statuses[-1].startswith("429")
+    assert _login(server, "alice", "password1", "10.0.0.2").startswith("200")
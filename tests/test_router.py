@@ -0,0 +1,157 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+from http_parser import RequestParser
+from router import Router, HttpError
+import server as server_module
+from conftest import send
+
+
+def _error(target, error : HttpError) -> tuple:
+    return (error.status, error.headers, error.message)
+
+
+def _head(target, response : tuple) -> tuple:
+    return (response[0], None)
+
+
+def _request(method : str, path : str, body : str=""):
+    (request,) = RequestParser().feed(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n{body}".encode())
+    return request
+
+
+@pytest.fixture
+def router():
+    router = Router(_error, _head)
+    router.add("GET", "/items", lambda target, request: ("list", "body"))
+    router.add("POST", "/items", lambda target, request, name: ("create", name), fields=("name",))
+    router.add("GET", "/items/{id}", lambda target, request, id: ("item", id))
+    router.add("GET", "/files/{path:path}", lambda target, request, path: ("file", path))
+    router.add("PUT", "/upload", lambda target, request: ("upload", None))
+    return router
+
+
+def test_dispatch(router):
+    assert router.dispatch(None, _request("GET", "/items?page=2")) == ("list", "body")
+    assert router.dispatch(None, _request("POST", "/items", '{"name": "a"}')) == ("create", "a")
+    request = _request("GET", "/items/42")
+    assert router.dispatch(None, request) == ("item", "42")
+    assert request.route == "/items/{id}"
+    assert router.dispatch(None, _request("GET", "/files/a/b.png")) == ("file", "a/b.png")
+
+
+def test_not_found(router):
+    assert router.dispatch(None, _request("GET", "/nothing")) == ("404 Not Found", None, "Page not found")
+    assert router.dispatch(None, _request("GET", "/items/1/2"))[0] == "404 Not Found"
+
+
+def test_method_not_allowed(router):
+    assert router.dispatch(None, _request("DELETE", "/items")) == ("405 Method Not Allowed", ["Allow: GET, HEAD, POST"],
+                                                                    "Method not allowed")
+    assert router.dispatch(None, _request("HEAD", "/upload"))[1] == ["Allow: PUT"]
+
+
+@pytest.mark.parametrize("body", ["not json", "[1]", '{"other": "a"}', '{"name": 1}'])
+def test_invalid_fields(router, body):
+    assert router.dispatch(None, _request("POST", "/items", body))[0] == "400 Bad Request"
+
+
+def test_head_fallback(router):
+    assert router.dispatch(None, _request("HEAD", "/items")) == ("list", None)
+    router.add("HEAD", "/items", lambda target, request: ("head", None)) # HEAD route가 있으면 그 route
+    assert router.dispatch(None, _request("HEAD", "/items")) == ("head", None)
+
+
+def test_head_without_handler():
+    router = Router(_error)
+    router.add("GET", "/items", lambda target, request: ("list", "body"))
+    assert router.dispatch(None, _request("HEAD", "/items"))[:2] == ("405 Method Not Allowed", ["Allow: GET"])
+
+
+def test_duplicate_route(router):
+    router.add("GET", "/items", lambda target, request: None)
+    with pytest.raises(ValueError):
+        router.compile()
+
+
+def test_middleware_order(router):
+    calls = []
+
+    def middleware(name):
+        def wrap(target, request, call_next):
+            calls.append(f"{name} before")
+            response = call_next(target, request)
+            calls.append(f"{name} after")
+            return response
+        return wrap
+
+    router.middleware(middleware("outer"))
+    router.middleware(middleware("inner"))
+    assert router.dispatch(None, _request("GET", "/items")) == ("list", "body")
+    assert calls == ["outer before", "inner before", "inner after", "outer after"]
+
+
+def test_middleware_skip(router):
+    calls = []
+
+    def middleware(target, request, call_next):
+        calls.append(request.path)
+        return call_next(target, request)
+
+    router.middleware(middleware)
+    router.add("GET", "/internal", lambda target, request: ("internal", None), skip=(middleware,))
+    assert router.dispatch(None, _request("GET", "/internal?x=1")) == ("internal", None)
+    assert router.dispatch(None, _request("POST", "/internal"))[0] == "405 Method Not Allowed"
+    assert router.dispatch(None, _request("GET", "/items")) == ("list", "body")
+    assert calls == ["/items"]
+    with pytest.raises(ValueError): # route를 찾기 전에 고르므로 param pattern은 안 됨
+        router.add("GET", "/internal/{id}", lambda target, request, id: None, skip=(middleware,))
+
+
+def test_server_middleware_order():
+    names = [middleware.__name__ for middleware in server_module.router._middlewares]
+    assert names == ["_log_request", "_admission_control", "_compress_response"]
+
+
+def test_server_errors(server):
+    assert send(server, "GET /nothing HTTP/1.1\r\n\r\n")[0] == "404 Not Found"
+    (status, headers, body) = send(server, "DELETE /login HTTP/1.1\r\n\r\n")
+    assert (status, headers["Allow"], body) == ("405 Method Not Allowed", "POST", b"Method not allowed")
+    assert send(server, "POST /login HTTP/1.1\r\nContent-Length: 2\r\n\r\n{}")[0] == "400 Bad Request"
+
+
+def test_server_head_fallback(server):
+    (status, headers, body) = send(server, "GET /metrics HTTP/1.1\r\n\r\n")
+    (head_status, head_headers, head_body) = send(server, "HEAD /metrics HTTP/1.1\r\n\r\n")
+    assert (status, head_status, head_body) == ("200 OK", "200 OK", b"")
+    assert int(head_headers["Content-Length"]) > 0
+    assert len(body) == int(headers["Content-Length"])
+
+
+def test_server_admission_before_routing(server):
+    server.admission.ip.burst = 5
+    statuses = [send(server, "GET /nothing HTTP/1.1\r\n\r\n")[0] for _ in range(10)]
+    assert statuses[0] == "404 Not Found"
+    assert statuses[-1] == "429 Too Many Requests" # route를 찾기 전에 거절
+
+
+def test_server_metrics_access(server):
+    assert send(server, "GET /metrics HTTP/1.1\r\n\r\n", client="10.0.0.1")[0] == "404 Not Found"
+    assert send(server, "GET /metrics HTTP/1.1\r\n\r\n", client="127.0.0.2")[0] == "200 OK"
+    server.metrics_access = "public"
+    assert send(server, "GET /metrics HTTP/1.1\r\n\r\n", client="10.0.0.1")[0] == "200 OK"
+    server.metrics_access = "off"
+    assert send(server, "GET /metrics HTTP/1.1\r\n\r\n")[0] == "404 Not Found"
+
+
+def test_server_metrics_skips_admission_and_compression(server):
+    server.admission.ip.burst = 5
+    for _ in range(10):
+        (status, headers, body) = send(server, "GET /metrics HTTP/1.1\r\nAccept-Encoding: gzip\r\n\r\n")
+        assert status == "200 OK"
+        assert "Content-Encoding" not in headers and "Vary" not in headers
+    assert len(body) >= server.compressor.min_size # 다른 route였다면 압축할 크기
+    assert send(server, "GET /nothing HTTP/1.1\r\n\r\n")[0] == "404 Not Found" # scrape가 token을 쓰지 않음
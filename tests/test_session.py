@@ -0,0 +1,55 @@
+import os
+import sys
+from unittest import mock
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+import session
+from session import SessionTable
+
+
+@pytest.fixture
+def clock():
+    now = [1000.0]
+    with mock.patch.object(session.time, "time", lambda: now[0]):
+        yield now
+
+
+def test_lookup(clock):
+    table = SessionTable()
+    token = table.issue("alice", "session", 10)
+    assert table.lookup(token, "session") == "alice"
+    assert table.lookup(token, "key") is None # 다른 용도
+    assert table.lookup("unknown", "session") is None
+
+
+def test_expiry(clock):
+    table = SessionTable()
+    token = table.issue("alice", "session", 10)
+    clock[0] += 9.9
+    assert table.lookup(token, "session") == "alice"
+    clock[0] += 0.1
+    assert table.lookup(token, "session") is None
+
+
+def test_purge_on_issue(clock):
+    table = SessionTable()
+    expired = [table.issue(f"user{i}", "session", 10) for i in range(3)]
+    live = table.issue("bob", "key", 100)
+    assert len(table) == 4
+    clock[0] += 50
+    table.issue("carol", "session", 10) # 만료된 token만 지움
+    assert len(table) == 2
+    assert all(table.lookup(token, "session") is None for token in expired)
+    assert table.lookup(live, "key") == "bob"
+
+
+def test_revoke(clock):
+    table = SessionTable()
+    token = table.issue("alice", "session", 10)
+    table.revoke(token)
+    assert table.lookup(token, "session") is None
+    clock[0] += 20
+    table.issue("bob", "session", 10) # heap에 남은 revoke된 항목도 정리됨
+    assert len(table) == 1
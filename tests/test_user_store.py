@@ -0,0 +1,84 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+from user_store import JsonUserStore
+
+
+def _crash(store : JsonUserStore) -> None:
+    '''
+    snapshot을 쓰지 않고 writer thread만 멈춤 (journal append 후 snapshot 전에 종료된 process)'''
+    store._closed = True
+    store._wakeup.set()
+    store._writer.join()
+    store._journal.close()
+
+
+def test_reopen(tmp_path):
+    path = str(tmp_path / "users.json")
+    store = JsonUserStore(path, fsync=False)
+    assert store.create("alice", {"pw" : "a"})
+    assert not store.create("alice", {"pw" : "b"})
+    assert store.update("alice", {"key" : "k"})
+    assert not store.update("bob", {"key" : "k"})
+    store.close()
+    assert not os.path.exists(path + ".journal")
+
+    store = JsonUserStore(path, fsync=False)
+    assert store.get("alice") == {"pw" : "a", "key" : "k"}
+    store.close()
+
+
+def test_journal_replay_after_crash(tmp_path):
+    path = str(tmp_path / "users.json")
+    store = JsonUserStore(path, fsync=False)
+    store.create("alice", {"pw" : "a"})
+    store.close()
+
+    store = JsonUserStore(path, fsync=False)
+    store.create("bob", {"pw" : "b"})
+    store.update("alice", {"pw" : "a2"})
+    store.flush() # journal에 append
+    _crash(store)
+    with open(path) as file:
+        assert "bob" not in json.load(file) # snapshot은 아직 이전 상태
+    with open(path + ".journal", "a") as file:
+        file.write('{"id": "carol", "us') # 쓰는 도중 종료되어 잘린 줄
+
+    store = JsonUserStore(path, fsync=False)
+    assert (store.get("alice"), store.get("bob"), store.get("carol")) == ({"pw" : "a2"}, {"pw" : "b"}, None)
+    assert not os.path.exists(path + ".journal") or os.path.getsize(path + ".journal") == 0
+    with open(path) as file:
+        assert json.load(file)["bob"] == {"pw" : "b"} # replay한 내용을 snapshot에 합침
+    store.close()
+
+
+def test_compaction_recovers_old_journal(tmp_path):
+    path = str(tmp_path / "users.json")
+    with open(path, "w") as file:
+        json.dump({"alice" : {"pw" : "a"}}, file)
+    # compaction 도중 종료 : journal을 .old로 옮기고 새 journal에 쓰기 시작했지만 snapshot은 쓰지 못함
+    with open(path + ".journal.old", "w") as file:
+        file.write(json.dumps({"id" : "bob", "user" : {"pw" : "b"}}) + "\n")
+        file.write(json.dumps({"id" : "alice", "user" : {"pw" : "old"}}) + "\n")
+    with open(path + ".journal", "w") as file:
+        file.write(json.dumps({"id" : "alice", "user" : {"pw" : "new"}}) + "\n")
+
+    store = JsonUserStore(path, fsync=False)
+    assert (store.get("alice"), store.get("bob")) == ({"pw" : "new"}, {"pw" : "b"}) # .old 다음에 journal을 replay
+    assert not os.path.exists(path + ".journal.old")
+    store.close()
+
+
+def test_compaction_threshold(tmp_path):
+    path = str(tmp_path / "users.json")
+    store = JsonUserStore(path, compact_threshold=3, fsync=False)
+    for i in range(3):
+        store.create(f"user{i}", {"pw" : str(i)})
+    store.flush()
+    assert os.path.getsize(path + ".journal") == 0
+    assert not os.path.exists(path + ".journal.old")
+    with open(path) as file:
+        assert len(json.load(file)) == 3
+    store.close()